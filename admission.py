@@ -0,0 +1,93 @@
+import time
+import threading
+
+
+class Overloaded(Exception):
+    """Raised by AdmissionControl.acquire() when a caller is turned away"""
+
+    def __init__(self, message, reason):
+        super().__init__(message)
+        self.reason = reason
+
+
+class AdmissionControl:
+    """Semaphore with a short, bounded wait queue in front of the database.
+
+    At most `limit` callers hold a slot at once. Up to `queue_size` more may
+    wait for one, each for at most `timeout` seconds; anyone beyond that is
+    rejected straight away, so a spike is shed quickly instead of piling up
+    workers that would time out on the database anyway. A limit of 0
+    admits everyone.
+    """
+
+    def __init__(self, limit, queue_size=0, timeout=0.5):
+        self.limit = limit
+        self.queue_size = queue_size
+        self.timeout = timeout
+
+        self._cond = threading.Condition()
+        self._active = 0
+        self._waiting = 0
+
+        self._admitted = 0
+        self._waits = 0
+        self._wait_time = 0.0
+        self._rejected = {'queue_full': 0, 'timeout': 0}
+
+    def acquire(self):
+        """Take a slot; returns the seconds spent waiting or raises Overloaded"""
+        if not self.limit:
+            return 0.0
+        start = time.monotonic()
+        with self._cond:
+            if self._active < self.limit and not self._waiting:
+                self._active += 1
+                self._admitted += 1
+                return 0.0
+            if self._waiting >= self.queue_size:
+                self._rejected['queue_full'] += 1
+                raise Overloaded("Too many requests waiting for the database", 'queue_full')
+            self._waiting += 1
+            try:
+                while self._active >= self.limit:
+                    remaining = self.timeout - (time.monotonic() - start)
+                    if remaining <= 0:
+                        self._rejected['timeout'] += 1
+                        raise Overloaded(
+                            f"Timed out after {self.timeout}s waiting for a database slot", 'timeout'
+                        )
+                    self._cond.wait(remaining)
+            except BaseException:
+                # A waiter that leaves may have been woken for a free slot; wake the next one instead
+                if self._active < self.limit:
+                    self._cond.notify()
+                raise
+            finally:
+                self._waiting -= 1
+            self._active += 1
+            self._admitted += 1
+            waited = time.monotonic() - start
+            self._waits += 1
+            self._wait_time += waited
+            return waited
+
+    def release(self):
+        if not self.limit:
+            return
+        with self._cond:
+            self._active -= 1
+            self._cond.notify()
+
+    def stats(self):
+        """Snapshot of admission counters"""
+        with self._cond:
+            return {
+                'limit': self.limit,
+                'queue_size': self.queue_size,
+                'active': self._active,
+                'waiting': self._waiting,
+                'admitted': self._admitted,
+                'waits': self._waits,
+                'wait_time': round(self._wait_time, 6),
+                'rejected': dict(self._rejected),
+            }
@@ -1,358 +1,1225 @@
 import os
+import hmac
 import json
+import time
+import zlib
+import random
+import threading
 import configparser
-import mysql.connector
-# Remove the pooling import since we're not using connection pools
-# from mysql.connector import pooling
-from flask import Flask, render_template, request, jsonify, redirect, url_for
+import click
+from contextlib import contextmanager
+from jinja2.utils import htmlsafe_json_dumps
+from flask import Blueprint, Flask, abort, current_app, render_template, request, jsonify, url_for, g, stream_with_context
+import assets
+import metrics
+import encoding
+import profiling
+from admission import AdmissionControl, Overloaded
+from catalog import INGREDIENT_CATEGORIES, category_key
+import ndjson_io
+from cache import TTLCache, SingleFlight, SingleFlightTimeout
+from ingredient_index import IngredientIndex
+from menus import build_shopping_list, compact_ingredient_map, updated_menu
+from jobs import JobStore, JobQueue, JobQueueFull
+from staging import StagingStore
+from storage import StorageError, MySQLBackend, SQLiteBackend, MemoryBackend, parse_ingredients
+from suggestions import SuggestionIndex
 
-app = Flask(__name__)
+# Routes are registered on the app by create_app()
+bp = Blueprint('recipes', __name__, cli_group=None)
 
-# Get the absolute path to the config file
 basedir = os.path.abspath(os.path.dirname(__file__))
-config_path = os.path.join(basedir, 'config.ini')
-config = configparser.ConfigParser()
-
-# Read the config file
-if not os.path.exists(config_path):
-    raise FileNotFoundError(
-        f"Configuration file not found at {config_path}. "
-        "Please create config.ini file as described in README.md"
-    )
 
-config.read(config_path)
+# Endpoints that never use the storage backend; admission control lets them through
+ADMISSION_EXEMPT_ENDPOINTS = frozenset({
+    'static', 'recipes.recipe_manager', 'recipes.add_recipe', 'recipes.add_recipes', 'recipes.delete_recipe',
+    'recipes.job_status', 'recipes.debug_slow', 'recipes.pool_stats', 'recipes.cache_stats',
+    'recipes.metrics_route'
+})
 
-# Add error checking for the MySQL section
-if 'MYSQL' not in config:
-    raise ValueError("MYSQL section not found in config.ini. Please check README.md for the correct format.")
+# Recipes per page on /view_db (optional [VIEW_DB] section)
+VIEW_DB_MAX_PAGE_SIZE = 500
 
-# Database configuration - PythonAnywhere MySQL
-db_config = {
-    'host': config['MYSQL']['HOST'],
-    'user': config['MYSQL']['USER'],
-    'password': config['MYSQL']['PASSWORD'],
-    'database': config['MYSQL']['DATABASE']
-}
+# Recipes per /delete_and_export_recipes request
+DELETE_BATCH_MAX = 1000
+
+# Recipes per /add_recipes request
+ADD_BATCH_MAX = 1000
+
+# Recipes per saved menu
+MENU_MAX_RECIPES = 100
+
+# Recipes per /ingredient_map chunk, loaded by selector pages too large for the embedded map
+INGREDIENT_MAP_CHUNK = 500
 
-# Ingredient category mapping
-INGREDIENT_CATEGORIES = {
-    "droge-waren": "Droge waren",
-    "verse-groenten-fruit": "Verse groenten en fruit",
-    "vlees-vis": "Vlees en vis",
-    "zuivel": "Zuivel",
-    "brood-bakkerij": "Brood en bakkerij",
-    "diepvries": "Diepvries",
-    "conserven": "Conserven",
-    "dranken": "Dranken",
-    "snacks": "Snacks",
-    "ontbijt": "Ontbijt",
-    "broodbeleg": "Broodbeleg",
-    "baby": "Baby",
-    "kruiden": "Kruiden",
-    "non-food": "Non-food",
-    "overig": "Overig"
+# Changed recipes per /changes response; beyond this the client reloads the full list
+CHANGES_MAX = 1000
+
+# Results per page on /search
+SEARCH_DEFAULT_LIMIT = 20
+SEARCH_MAX_LIMIT = 100
+
+# Common Dutch recipes and their ingredients, used for suggestions
+DEFAULT_RECIPE_INGREDIENTS = {
+    'pannenkoeken': ['bloem', 'melk', 'eieren', 'zout'],
+    'stamppot': ['aardappelen', 'boerenkool', 'rookworst', 'spekjes'],
+    'erwtensoep': ['spliterwten', 'varkensvlees', 'prei', 'wortel'],
+    'bitterballen': ['rundvlees', 'bouillon', 'bloem', 'paneermeel'],
+    'hutspot': ['aardappelen', 'wortelen', 'uien', 'rundvlees'],
+    'poffertjes': ['bloem', 'gist', 'melk', 'boter'],
+    'boerenkool': ['boerenkool', 'aardappelen', 'rookworst', 'spekjes'],
+    'appeltaart': ['appels', 'bloem', 'boter', 'kaneel']
 }
 
-# Helper function for database connections
-def get_db_connection():
-    """Get a database connection"""
+# Recipes the in-memory backend starts with in development mode (ids 1-9)
+SAMPLE_RECIPES = [
+    {'name': 'Pannenkoeken', 'ingredients': [{'name': 'bloem', 'category': 'droge-waren'}, {'name': 'melk', 'category': 'zuivel'}, {'name': 'eieren', 'category': 'zuivel'}, {'name': 'zout', 'category': 'kruiden'}]},
+    {'name': 'Stamppot', 'ingredients': [{'name': 'aardappelen', 'category': 'verse-groenten-fruit'}, {'name': 'boerenkool', 'category': 'verse-groenten-fruit'}, {'name': 'rookworst', 'category': 'vlees-vis'}, {'name': 'spekjes', 'category': 'vlees-vis'}]},
+    {'name': 'Erwtensoep', 'ingredients': [{'name': 'spliterwten', 'category': 'droge-waren'}, {'name': 'varkensvlees', 'category': 'vlees-vis'}, {'name': 'prei', 'category': 'verse-groenten-fruit'}, {'name': 'wortel', 'category': 'verse-groenten-fruit'}]},
+    {'name': 'Bitterballen', 'ingredients': [{'name': 'rundvlees', 'category': 'vlees-vis'}, {'name': 'bouillon', 'category': 'droge-waren'}, {'name': 'bloem', 'category': 'droge-waren'}, {'name': 'paneermeel', 'category': 'brood-bakkerij'}]},
+    {'name': 'Hutspot', 'ingredients': [{'name': 'aardappelen', 'category': 'verse-groenten-fruit'}, {'name': 'wortelen', 'category': 'verse-groenten-fruit'}, {'name': 'uien', 'category': 'verse-groenten-fruit'}, {'name': 'rundvlees', 'category': 'vlees-vis'}]},
+    {'name': 'Poffertjes', 'ingredients': [{'name': 'bloem', 'category': 'droge-waren'}, {'name': 'gist', 'category': 'droge-waren'}, {'name': 'melk', 'category': 'zuivel'}, {'name': 'boter', 'category': 'zuivel'}]},
+    {'name': 'Appeltaart', 'ingredients': [{'name': 'appels', 'category': 'verse-groenten-fruit'}, {'name': 'bloem', 'category': 'droge-waren'}, {'name': 'boter', 'category': 'zuivel'}, {'name': 'kaneel', 'category': 'kruiden'}]},
+    {'name': 'Pasta Carbonara', 'ingredients': [{'name': 'pasta', 'category': 'droge-waren'}, {'name': 'eieren', 'category': 'zuivel'}, {'name': 'pancetta', 'category': 'vlees-vis'}, {'name': 'parmezaan', 'category': 'zuivel'}]},
+    {'name': 'Chocolate Cake', 'ingredients': [{'name': 'bloem', 'category': 'droge-waren'}, {'name': 'suiker', 'category': 'droge-waren'}, {'name': 'cacao', 'category': 'droge-waren'}, {'name': 'eieren', 'category': 'zuivel'}, {'name': 'boter', 'category': 'zuivel'}]}
+]
+
+def load_config(config_path=None):
+    """Read config.ini next to this file, or the file named by config_path or RECIPES_CONFIG"""
+    config_path = config_path or os.environ.get('RECIPES_CONFIG') or os.path.join(basedir, 'config.ini')
+    config = configparser.ConfigParser()
+    if not config.read(config_path):
+        print(f"Configuration file not found at {config_path}, using defaults")
+    return config
+
+def create_storage(config, default_backend='mysql', observe=None, sample_recipes=()):
+    """Create the storage backend chosen by [STORAGE] BACKEND (mysql, sqlite or memory)"""
+    backend = config.get('STORAGE', 'BACKEND', fallback=default_backend).strip().lower()
+
+    # Connection pool settings (optional [POOL] section)
+    pool_config = {
+        'size': config.getint('POOL', 'SIZE', fallback=5),
+        'max_overflow': config.getint('POOL', 'MAX_OVERFLOW', fallback=5),
+        'timeout': config.getfloat('POOL', 'TIMEOUT', fallback=10.0),
+        'validate_on_borrow': config.getboolean('POOL', 'VALIDATE_ON_BORROW', fallback=True),
+        'recycle': config.getint('POOL', 'RECYCLE_SECONDS', fallback=3600)
+    }
+
+    if backend == 'mysql':
+        if 'MYSQL' not in config:
+            raise ValueError(
+                "MYSQL section not found in config.ini. "
+                "Please create config.ini as described in README.md"
+            )
+        # Database configuration - PythonAnywhere MySQL
+        db_config = {
+            'host': config['MYSQL']['HOST'],
+            'user': config['MYSQL']['USER'],
+            'password': config['MYSQL']['PASSWORD'],
+            'database': config['MYSQL']['DATABASE']
+        }
+        return MySQLBackend(db_config, pool_config, observe=observe)
+    if backend == 'sqlite':
+        path = os.path.join(basedir, config.get('STORAGE', 'PATH', fallback='recipes.db'))
+        return SQLiteBackend(path, pool_config, observe=observe)
+    if backend == 'memory':
+        return MemoryBackend(sample_recipes)
+    raise ValueError(f"Unknown storage backend '{backend}' in [STORAGE] BACKEND, use mysql, sqlite or memory")
+
+class AppState:
+    """Storage, caches and metrics of one app created by create_app()"""
+
+    def __init__(self, config, storage=None, development=False):
+        # Number of staged recipes written per INSERT statement in save_to_db
+        self.save_chunk_size = config.getint('SAVE', 'CHUNK_SIZE', fallback=500)
+        self.view_db_page_size = config.getint('VIEW_DB', 'PAGE_SIZE', fallback=50)
+        # Up to this many recipes the selector page embeds every recipe's ingredients,
+        # so toggling recipes needs no requests; larger catalogs load them in chunks
+        self.embed_map_max_recipes = config.getint('INDEX', 'EMBED_MAX_RECIPES', fallback=2000)
+
+        # Response compression (optional [COMPRESSION] section); smaller bodies are sent as they are
+        self.compress_min_size = config.getint('COMPRESSION', 'MIN_SIZE', fallback=1024)
+        self.compress_level = config.getint('COMPRESSION', 'LEVEL', fallback=6)
+
+        # Read cache for the recipe list and per-recipe ingredients (optional [CACHE] section)
+        self.recipe_cache = TTLCache(
+            maxsize=config.getint('CACHE', 'MAX_ENTRIES', fallback=1024),
+            ttl=config.getint('CACHE', 'TTL_SECONDS', fallback=300)
+        )
+        # Identical concurrent cache misses share a single database read
+        self.recipe_reads = SingleFlight(timeout=config.getfloat('CACHE', 'COALESCE_TIMEOUT', fallback=10.0))
+
+        # Recipe-set version: the storage revision, which every process shares. Cache keys
+        # and ETags include it, so a save or delete by any worker invalidates every cached
+        # read. It is re-read at most every REVISION_CHECK_SECONDS, and right after this
+        # process writes to the recipes table.
+        self.recipe_set_lock = threading.Lock()
+        self.recipe_set = {'version': None, 'checked': None}
+        self.revision_check_seconds = config.getfloat('CACHE', 'REVISION_CHECK_SECONDS', fallback=1.0)
+
+        # Suggestion index over the default recipes and every saved recipe.
+        # Built on first use; when the recipe set changes it is rebuilt in the
+        # background while the previous index keeps serving requests.
+        self.suggestions = {'index': None, 'version': None, 'rebuilding': False}
+        self.suggestions_lock = threading.Lock()
+
+        # Inverted index from ingredient to saved recipes for /search. Built from
+        # storage on the first search, then brought up to the storage revision
+        # from the change feed, so writes by other workers are picked up too.
+        self.ingredient_index = None
+        self.ingredient_index_revision = None
+        self.ingredient_index_lock = threading.Lock()
+
+        # Metrics served at /metrics
+        self.metrics_registry = metrics.Registry()
+        self.http_request_seconds = metrics.Histogram(
+            'recipes_http_request_duration_seconds', 'Time spent handling requests, per endpoint',
+            ['endpoint', 'method'], registry=self.metrics_registry
+        )
+        self.http_requests = metrics.Counter(
+            'recipes_http_requests_total', 'Requests handled, per endpoint and status code',
+            ['endpoint', 'method', 'status'], registry=self.metrics_registry
+        )
+        self.http_response_bytes = metrics.Histogram(
+            'recipes_http_response_size_bytes', 'Size of non-streamed response bodies, per endpoint',
+            ['endpoint'], buckets=metrics.SIZE_BUCKETS, registry=self.metrics_registry
+        )
+        self.db_query_seconds = metrics.Histogram(
+            'recipes_db_query_duration_seconds', 'Database query latency, per query type',
+            ['query'], registry=self.metrics_registry
+        )
+        self.db_acquire_seconds = metrics.Histogram(
+            'recipes_db_connection_acquire_seconds', 'Time spent waiting for a pooled database connection',
+            registry=self.metrics_registry
+        )
+        self.staging_seconds = metrics.Histogram(
+            'recipes_staging_operation_duration_seconds', 'Staging store read and write latency',
+            ['operation'], registry=self.metrics_registry
+        )
+        self.admission_wait_seconds = metrics.Histogram(
+            'recipes_admission_wait_seconds', 'Time admitted requests waited for a database slot',
+            registry=self.metrics_registry
+        )
+        self.admission_rejections = metrics.Counter(
+            'recipes_admission_rejections_total', 'Requests turned away with 503, per endpoint and reason',
+            ['endpoint', 'reason'], registry=self.metrics_registry
+        )
+
+        # Admission control (optional [ADMISSION] section). By default as many requests
+        # may use the database at once as the pool has connections left after the
+        # job workers and a background index rebuild take theirs; a few more wait
+        # briefly for a slot and the rest get a 503 at once. MAX_CONCURRENT = 0 turns it off.
+        pool_capacity = config.getint('POOL', 'SIZE', fallback=5) + config.getint('POOL', 'MAX_OVERFLOW', fallback=5)
+        max_concurrent = config.getint(
+            'ADMISSION', 'MAX_CONCURRENT',
+            fallback=max(pool_capacity - config.getint('JOBS', 'WORKERS', fallback=1) - 1, 1)
+        )
+        self.admission = AdmissionControl(
+            max_concurrent,
+            queue_size=config.getint('ADMISSION', 'QUEUE_SIZE', fallback=max_concurrent),
+            timeout=config.getfloat('ADMISSION', 'WAIT_MS', fallback=500) / 1000
+        )
+        self.admission_retry_after = config.getint('ADMISSION', 'RETRY_AFTER', fallback=1)
+
+        # Profiling and the slow request log at /debug/slow (optional [PROFILING] section).
+        # Without a TOKEN nothing is profiled or kept and /debug/slow answers 404.
+        self.profile_token = config.get('PROFILING', 'TOKEN', fallback='')
+        self.profile_sample_rate = config.getfloat('PROFILING', 'SAMPLE_RATE', fallback=0.0)
+        self.profile_memory = config.getboolean('PROFILING', 'TRACEMALLOC', fallback=False)
+        self.profile_top_n = config.getint('PROFILING', 'TOP_N', fallback=20)
+        self.slow_request_seconds = config.getfloat('PROFILING', 'SLOW_THRESHOLD_MS', fallback=1000) / 1000
+        self.slow_requests = profiling.SlowRequestLog(config.getint('PROFILING', 'KEEP', fallback=50))
+
+        if storage is None:
+            storage = create_storage(
+                config,
+                default_backend='memory' if development else 'mysql',
+                observe=lambda event, seconds: self.db_acquire_seconds.observe(seconds),
+                sample_recipes=SAMPLE_RECIPES if development else ()
+            )
+        self.storage = storage
+        # Revisions of a non-durable backend repeat after a restart; ETags need more to tell boots apart
+        self.etag_nonce = '' if storage.durable else f'{random.getrandbits(32):08x}-'
+
+        # Staging store for recipes that have not been saved yet (optional [STAGING] section)
+        self.staging = StagingStore(
+            os.path.join(basedir, config.get('STAGING', 'PATH', fallback='staging.db')),
+            legacy_json_path=os.path.join(basedir, 'recipes.json'),
+            observe=lambda operation, seconds: self.staging_seconds.labels(operation).observe(seconds)
+        )
+
+        # Background saves (optional [JOBS] section). Jobs refer to staged entries,
+        # so they are kept in the staging database unless [JOBS] PATH says otherwise,
+        # and resumed by the first request after the app starts again.
+        self.save_in_background = config.getboolean('SAVE', 'BACKGROUND', fallback=False)
+        jobs_path = config.get('JOBS', 'PATH', fallback=None)
+        self.job_store = JobStore(os.path.join(basedir, jobs_path) if jobs_path else self.staging.path)
+        self.job_workers = config.getint('JOBS', 'WORKERS', fallback=1)
+        self.job_max_pending = config.getint('JOBS', 'MAX_PENDING', fallback=100)
+        self.jobs = None
+        self.jobs_resumed = False
+        self.jobs_resume_lock = threading.Lock()
+
+def create_app(config_path=None, storage=None, development=False):
+    """Create the Flask app.
+
+    The storage backend comes from [STORAGE] BACKEND and defaults to MySQL,
+    or to an in-memory backend with sample recipes in development mode;
+    pass storage to use a backend directly. No database connection is made
+    until a request needs one.
+    """
+    app = Flask(__name__)
+    app.json = encoding.FastJSONProvider(app)
+    app.extensions['recipes'] = AppState(load_config(config_path), storage, development)
+    app.extensions['recipes'].assets = assets.AssetManifest(app.static_folder)
+    app.register_blueprint(bp)
+    profiling.connect_template_timing(app)
+    init_jobs(app)
+    return app
+
+# Set up the background job queue of an app; workers start on first use
+def init_jobs(app):
+    state = app.extensions['recipes']
+    
+    def run(job, progress):
+        with app.app_context():
+            return run_save_job(job, progress)
+    
+    state.jobs = JobQueue(
+        state.job_store, run,
+        workers=state.job_workers,
+        max_pending=state.job_max_pending
+    )
+
+# Queue the jobs an earlier process left unfinished, once per app
+def resume_jobs(state):
+    with state.jobs_resume_lock:
+        if state.jobs_resumed:
+            return
+        state.jobs_resumed = True
+        try:
+            resumed = state.jobs.resume()
+        except Exception as e:
+            print(f"Error resuming background jobs: {e}")
+        else:
+            if resumed:
+                print(f"Resumed {resumed} background job(s)")
+
+def get_state():
+    """The AppState of the app handling the current request"""
+    return current_app.extensions['recipes']
+
+def get_recipe_set_version():
+    """Return the version of the recipe set.
+
+    The version is the storage revision, re-read once the last check is
+    older than [CACHE] REVISION_CHECK_SECONDS. If the read fails the
+    previous version is kept until the next check; it is None until a
+    read has succeeded.
+    """
+    state = get_state()
+    recipe_set = state.recipe_set
+    now = time.monotonic()
+    with state.recipe_set_lock:
+        if recipe_set['checked'] is not None and now - recipe_set['checked'] < state.revision_check_seconds:
+            return recipe_set['version']
+    
     try:
-        conn = mysql.connector.connect(**db_config)
-        return conn, None
-    except mysql.connector.Error as err:
-        print(f"Database connection error: {err}")
-        return None, str(err)
+        with query_timer('revision'):
+            revision = state.storage.revision()
+    except StorageError as e:
+        print(f"Error reading the recipe set revision: {str(e)}")
+        revision = None
+    with state.recipe_set_lock:
+        recipe_set['checked'] = now
+        if revision is not None:
+            recipe_set['version'] = revision
+        return recipe_set['version']
+
+def bump_recipe_set_version():
+    """Mark the recipe set as changed: the next read picks up the new storage revision"""
+    state = get_state()
+    with state.recipe_set_lock:
+        state.recipe_set['checked'] = None
 
-# Database setup
-def init_db():
+@contextmanager
+def query_timer(query):
+    """Context manager recording the latency of one storage call under a query type.
+
+    The time also counts towards the request's database phase on /debug/slow.
+    """
+    with get_state().db_query_seconds.labels(query).time(), profiling.phase('db'):
+        yield
+
+@bp.cli.command('init-db')
+def init_db_command():
+    """Create the database tables and migrate legacy JSON ingredients"""
     try:
-        conn, error = get_db_connection()
-        if error:
-            print(f"Critical error initializing database: {error}")
-            return
-            
-        cursor = conn.cursor()
-        
-        # Create recipes table if it doesn't exist
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS recipes (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            name VARCHAR(255) NOT NULL,
-            ingredients TEXT NOT NULL
-        )
-        ''')
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
+        get_state().storage.init_schema()
         print("Database initialized successfully")
-    except Exception as e:
+    except StorageError as e:
         print(f"Critical error initializing database: {e}")
 
-# Initialize JSON file for temporary storage
-def init_json():
-    if not os.path.exists('recipes.json'):
-        with open('recipes.json', 'w') as f:
-            json.dump([], f)
+@bp.cli.command('build-assets')
+def build_assets_command():
+    """Minify and fingerprint the CSS and JavaScript into static/dist"""
+    manifest = assets.build(current_app.static_folder)
+    get_state().assets = assets.AssetManifest(current_app.static_folder)
+    for name, built in manifest.items():
+        click.echo(f"{name} -> {built}")
+
+@bp.cli.command('export-recipes')
+@click.argument('output', type=click.File('w', encoding='utf-8'), default='-')
+@click.option('--after-id', type=int, help='Resume after this recipe id')
+def export_recipes_command(output, after_id):
+    """Write every saved recipe to OUTPUT (default stdout) as NDJSON"""
+    count = 0
+    for line in ndjson_io.export_lines(get_state().storage.iter_recipes('id', after_id)):
+        output.write(line)
+        count += 1
+        if count % 1000 == 0:
+            click.echo(f"Exported {count} recipes", err=True)
+    click.echo(f"Exported {count} recipes", err=True)
+
+@bp.cli.command('import-recipes')
+@click.argument('source', type=click.File('r', encoding='utf-8'), default='-')
+@click.option('--start-line', type=int, default=1, help='Resume from this line')
+@click.option('--batch-size', type=int, help='Recipes per transaction ([SAVE] CHUNK_SIZE by default)')
+def import_recipes_command(source, start_line, batch_size):
+    """Import NDJSON recipes from SOURCE (default stdin)"""
+    summary = import_recipes(source, start_line, batch_size or get_state().save_chunk_size, lambda summary: click.echo(
+        f"Line {summary['lines']}: {summary['imported']} imported, {summary['skipped']} skipped", err=True
+    ))
+    if 'error' in summary:
+        raise click.ClickException(f"{summary['error']} (resume with --start-line {summary['resume_line']})")
+    click.echo(f"Imported {summary['imported']} recipes, skipped {summary['skipped']} already imported", err=True)
+
+@bp.cli.command('reclassify-ingredients')
+@click.option('--batch-size', type=int, default=500, help='Catalog entries per transaction')
+def reclassify_ingredients_command(batch_size):
+    """Normalize and categorize ingredients saved before the catalog existed"""
+    try:
+        summary = get_state().storage.reclassify_ingredients(batch_size)
+        if summary['changed']:
+            bump_recipe_set_version()
+        # Renamed and merged ingredients invalidate the menus' lists as a whole
+        menus = rebuild_menus() if summary['changed'] else 0
+    except StorageError as e:
+        raise click.ClickException(str(e))
+    click.echo(
+        f"Checked {summary['ingredients']} ingredients: {summary['changed']} updated, {summary['merged']} merged, "
+        f"{menus} menus rebuilt"
+    )
+
+def import_recipes(lines, start_line, batch_size, progress=None):
+    """Import NDJSON recipe lines into storage; returns the ndjson_io.import_lines summary"""
+    state = get_state()
+
+    def save(chunk):
+        with query_timer('insert'):
+            saved = state.storage.save_recipes(chunk)
+        if saved:
+            bump_recipe_set_version()
+            update_menus(saved=saved)
+        return saved
+
+    return ndjson_io.import_lines(lines, save, INGREDIENT_CATEGORIES, batch_size, start_line, progress)
 
-# Get recipes from JSON file
+# Get recipes from the staging store
 def get_recipes():
+    return get_state().staging.all()
+
+def render_view_db_page(recipes, order, page_size):
+    """Render one page of view_db.html; recipes holds up to page_size + 1 rows"""
+    next_url = None
+    if len(recipes) > page_size:
+        recipes = recipes[:page_size]
+        last = recipes[-1]
+        next_url = url_for(
+            'recipes.view_db', order=order, page_size=page_size, after_id=last['id'],
+            after_name=last['name'] if order == 'name' else None
+        )
+    first_url = None
+    if request.args.get('after_id'):
+        first_url = url_for('recipes.view_db', order=order, page_size=page_size)
+    return render_template('view_db.html', recipes=recipes, next_url=next_url, first_url=first_url)
+
+def stream_view_db(recipes):
+    """Stream view_db.html so the first rows go out before the whole table is read"""
+    context = {'recipes': recipes}
+    current_app.update_template_context(context)
+    stream = current_app.jinja_env.get_template('view_db.html').stream(context)
+    stream.enable_buffering(20)
+    response = current_app.response_class(stream_with_context(stream), mimetype='text/html')
+    # Also release the database connection if the client goes away before the end
+    response.call_on_close(recipes.close)
+    return response
+
+def load_suggestion_recipes(storage):
+    """(name, ingredients) pairs to index, plus whether the database could be read"""
+    recipes = []
+    complete = True
     try:
-        with open('recipes.json', 'r') as f:
-            return json.load(f)
-    except (json.JSONDecodeError, FileNotFoundError):
-        return []
-
-# Save recipes to JSON file
-def save_recipes(recipes):
-    with open('recipes.json', 'w') as f:
-        json.dump(recipes, f, indent=4)
-
-# Get default ingredients (mock data in Dutch)
-def get_default_ingredients(recipe_name):
-    # Dictionary of common Dutch recipes and their ingredients
-    recipe_ingredients = {
-        'pannenkoeken': ['bloem', 'melk', 'eieren', 'zout'],
-        'stamppot': ['aardappelen', 'boerenkool', 'rookworst', 'spekjes'],
-        'erwtensoep': ['spliterwten', 'varkensvlees', 'prei', 'wortel'],
-        'bitterballen': ['rundvlees', 'bouillon', 'bloem', 'paneermeel'],
-        'hutspot': ['aardappelen', 'wortelen', 'uien', 'rundvlees'],
-        'poffertjes': ['bloem', 'gist', 'melk', 'boter'],
-        'boerenkool': ['boerenkool', 'aardappelen', 'rookworst', 'spekjes'],
-        'appeltaart': ['appels', 'bloem', 'boter', 'kaneel']
-    }
+        recipes.extend((recipe['name'], recipe['ingredients']) for recipe in storage.iter_recipes('id'))
+    except StorageError as err:
+        print(f"Error loading recipes for suggestions: {err}")
+        complete = False
+    # Database recipes come first so they win over a default with the same name
+    recipes.extend(DEFAULT_RECIPE_INGREDIENTS.items())
+    return recipes, complete
+
+def rebuild_suggestion_index(state, version):
+    try:
+        recipes, complete = load_suggestion_recipes(state.storage)
+        index = SuggestionIndex(recipes)
+        with state.suggestions_lock:
+            state.suggestions['index'] = index
+            # An incomplete index is retried on the next request
+            state.suggestions['version'] = version if complete else None
+    finally:
+        with state.suggestions_lock:
+            state.suggestions['rebuilding'] = False
+
+def get_suggestion_index():
+    """Get the suggestion index, rebuilding it when the recipe set has changed"""
+    state = get_state()
+    version = get_recipe_set_version()
+    with state.suggestions_lock:
+        index = state.suggestions['index']
+        if index is not None and state.suggestions['version'] != version and not state.suggestions['rebuilding']:
+            state.suggestions['rebuilding'] = True
+            threading.Thread(target=rebuild_suggestion_index, args=(state, version), daemon=True).start()
+    if index is None:
+        rebuild_suggestion_index(state, version)
+        index = state.suggestions['index']
+    return index
+
+def ingredient_index_entry(recipe):
+    """(id, name, ingredient names) of a stored recipe, as IngredientIndex takes them"""
+    return recipe['id'], recipe['name'], [ingredient['name'] for ingredient in recipe['ingredients']]
+
+def get_ingredient_index():
+    """Return (index, error) for the current recipe set.
+
+    The index is built from storage on first use. When the storage revision
+    moves on, the recipes saved and deleted since the revision the index
+    reflects are read from storage.changes() and applied; if too many
+    changed the index is rebuilt instead.
+    """
+    state = get_state()
+    version = get_recipe_set_version()
+    with state.ingredient_index_lock:
+        index = state.ingredient_index
+        if index is not None and (version is None or state.ingredient_index_revision >= version):
+            return index, None
+        try:
+            if index is not None:
+                with query_timer('changes'):
+                    changed = state.storage.changes(state.ingredient_index_revision, CHANGES_MAX)
+                if 'recipes' in changed and changed['revision'] >= state.ingredient_index_revision:
+                    for recipe_id in changed['deleted']:
+                        index.remove(recipe_id)
+                    for recipe in changed['recipes']:
+                        index.add(*ingredient_index_entry(recipe))
+                    state.ingredient_index_revision = changed['revision']
+                    return index, None
+            # Read the revision first: a write during the build is applied again later
+            with query_timer('revision'):
+                revision = state.storage.revision()
+            with query_timer('list'):
+                index = IngredientIndex(
+                    ingredient_index_entry(recipe) for recipe in state.storage.iter_recipes('id')
+                )
+        except StorageError as err:
+            if state.ingredient_index is not None:
+                # Keep serving the index we have until storage is back
+                print(f"Error refreshing the ingredient index: {str(err)}")
+                return state.ingredient_index, None
+            return None, str(err)
+        state.ingredient_index, state.ingredient_index_revision = index, revision
+        return index, None
+
+def update_menus(saved=(), removed=()):
+    """Apply saved and deleted recipes to the shopping lists of saved menus.
+
+    Saving recipes can change the category of ingredients that menus
+    already contain; deleted recipes leave the menus they were part of.
+    Only the affected menus are read and rewritten.
+    """
+    categories = {}
+    for recipe in saved:
+        for ingredient in recipe['ingredients']:
+            categories[ingredient['name']] = ingredient['category']
+    removed = list(removed)
+    if not categories and not removed:
+        return
+    try:
+        with query_timer('menus'):
+            get_state().storage.update_menus(
+                lambda menu: updated_menu(menu, removed, categories),
+                recipe_ids=removed, ingredient_names=list(categories)
+            )
+    except StorageError as e:
+        print(f"Error updating menus: {str(e)}")
+
+def rebuild_menus():
+    """Recompute the shopping list of every saved menu from its recipes; returns how many changed"""
+    storage = get_state().storage
+    with query_timer('menus'):
+        menus = storage.list_menus()
+    recipe_ids = list(dict.fromkeys(recipe_id for menu in menus for recipe_id in menu['recipe_ids']))
+    if not recipe_ids:
+        return 0
+    with query_timer('list'):
+        existing = {recipe['id'] for recipe in storage.list_recipes()}
+    with query_timer('ingredients'):
+        ingredients_by_recipe = storage.recipe_ingredients([recipe_id for recipe_id in recipe_ids if recipe_id in existing])
     
-    # Convert recipe name to lowercase for case-insensitive matching
-    recipe_name_lower = recipe_name.lower()
+    def rebuild(menu):
+        kept = [recipe_id for recipe_id in menu['recipe_ids'] if recipe_id in existing]
+        categories, text = build_shopping_list(kept, ingredients_by_recipe)
+        shopping_list = {'categories': categories, 'text': text}
+        if kept == menu['recipe_ids'] and shopping_list == menu['shopping_list']:
+            return None
+        return kept, shopping_list
     
-    # Check if the recipe name exactly matches one of our known recipes
-    if recipe_name_lower in recipe_ingredients:
-        return recipe_ingredients[recipe_name_lower]
+    with query_timer('menus'):
+        return storage.update_menus(rebuild, recipe_ids=recipe_ids)
+
+def get_recipe_ingredients(recipe_ids):
+    """Get {recipe_id: ingredients} for several recipes, reading only cache misses from the database"""
+    state = get_state()
+    version = get_recipe_set_version()
+    ingredients_by_recipe = {}
+    missing = []
+    for recipe_id in recipe_ids:
+        ingredients = state.recipe_cache.get(('ingredients', version, recipe_id))
+        if ingredients is None:
+            missing.append(recipe_id)
+        else:
+            ingredients_by_recipe[recipe_id] = ingredients
+    
+    if missing:
+        try:
+            fetched, error = state.recipe_reads.do(
+                ('ingredients', version, tuple(sorted(missing))),
+                lambda: load_recipe_ingredients(version, missing)
+            )
+        except SingleFlightTimeout as err:
+            return None, str(err)
+        if error:
+            return None, error
+        ingredients_by_recipe.update(fetched)
+    
+    return ingredients_by_recipe, None
+
+def load_recipe_ingredients(version, recipe_ids):
+    """Read ingredients from the database and cache them under the given version"""
+    state = get_state()
+    try:
+        with query_timer('ingredients'):
+            fetched = state.storage.recipe_ingredients(recipe_ids)
+    except StorageError as err:
+        return None, str(err)
+    for recipe_id, ingredients in fetched.items():
+        state.recipe_cache.set(('ingredients', version, recipe_id), ingredients)
+    return fetched, None
+
+def get_ingredient_payloads(recipe_ids):
+    """Get {recipe_id: JSON bytes} of each recipe's ingredients, encoded once per recipe-set version.
+
+    The bytes are the array items without the brackets, ready to be joined.
+    """
+    state = get_state()
+    version = get_recipe_set_version()
+    payloads = {}
+    missing = []
+    for recipe_id in recipe_ids:
+        payload = state.recipe_cache.get(('ingredients_json', version, recipe_id))
+        if payload is None:
+            missing.append(recipe_id)
+        else:
+            payloads[recipe_id] = payload
     
-    # If no exact match is found, return None
+    if missing:
+        ingredients_by_recipe, error = get_recipe_ingredients(missing)
+        if error:
+            return None, error
+        for recipe_id in missing:
+            payload = encoding.dumps_bytes(ingredients_by_recipe.get(recipe_id, []))[1:-1]
+            state.recipe_cache.set(('ingredients_json', version, recipe_id), payload)
+            payloads[recipe_id] = payload
+    
+    return payloads, None
+
+def recipe_set_not_modified(*key_parts):
+    """Conditional GET support for responses derived from the recipe set.
+
+    Registers an ETag for the current response and returns a 304 response
+    when the client's copy is still current, else None. There is no
+    Last-Modified: the revision, which every worker shares, says when the
+    recipe set changed, not the time. Without a version (storage could not
+    be read) the response gets no validator.
+    """
+    version = get_recipe_set_version()
+    if version is None:
+        return None
+    etag = f"recipes-{get_state().etag_nonce}{version}-{zlib.crc32(json.dumps(key_parts).encode()):08x}"
+    g.recipe_set_etag = etag
+    if request.if_none_match.contains_weak(etag):
+        return current_app.response_class(status=304)
+    return None
+
+# Read recipe_ids from a JSON request body; returns (ids without duplicates, error)
+def posted_recipe_ids():
+    data = request.get_json(silent=True)
+    recipe_ids = data.get('recipe_ids', []) if isinstance(data, dict) else None
+    if (not isinstance(recipe_ids, list)
+            or not all(isinstance(recipe_id, int) and not isinstance(recipe_id, bool) for recipe_id in recipe_ids)):
+        return None, 'recipe_ids must be a list of ids'
+    return list(dict.fromkeys(recipe_ids)), None
+
+# Whether the request carries the admin token of [PROFILING] TOKEN
+def is_admin_request():
+    state = get_state()
+    if not state.profile_token:
+        return False
+    # Only as a header: query strings end up in access logs and the slow request log
+    supplied = request.headers.get('X-Admin-Token', '')
+    return hmac.compare_digest(supplied.encode('utf-8'), state.profile_token.encode('utf-8'))
+
+@bp.before_app_request
+def start_request_profile():
+    """Time the request's phases and profile it when sampled or asked for"""
+    state = get_state()
+    if not state.profile_token or request.endpoint in ('static', 'recipes.debug_slow'):
+        return
+    profile = g.request_profile = profiling.RequestProfile()
+    if (request.args.get('profile') == '1' or request.headers.get('X-Profile') == '1') and is_admin_request():
+        profile.start_profiling('admin', state.profile_memory)
+    elif state.profile_sample_rate and random.random() < state.profile_sample_rate:
+        profile.start_profiling('sampled', state.profile_memory)
+
+@bp.after_app_request
+def finish_request_profile(response):
+    """Keep slow and profiled-on-demand requests in the slow request log.
+
+    Registered before the other after-request hooks, so it runs last and
+    the time they take is included.
+    """
+    profile = g.get('request_profile')
+    if profile is None:
+        return response
+    if response.is_streamed:
+        # The body is generated after this hook; the request is recorded once
+        # the stream ends, in finish_streamed_request_profile
+        g.request_profile_status = response.status_code
+        return response
+    g.pop('request_profile')
+    record_id = record_request_profile(profile, response.status_code)
+    if record_id is not None and profile.trigger == 'admin':
+        response.headers['X-Profile-Id'] = str(record_id)
+    return response
+
+@bp.teardown_app_request
+def finish_streamed_request_profile(exc):
+    """Record a streamed request once its body is sent, or drop a failed request's profile.
+
+    The request context of a streamed response stays until the stream ends,
+    so this runs after the last chunk. After-request hooks are skipped when
+    a request fails; never leave the profiler running.
+    """
+    profile = g.pop('request_profile', None)
+    if profile is None:
+        return
+    status = g.pop('request_profile_status', None)
+    if exc is None and status is not None:
+        record_request_profile(profile, status)
+    else:
+        profile.discard()
+
+def record_request_profile(profile, status):
+    """Stop profiling and keep the request if it was slow or profiled on demand; returns its log id or None"""
+    state = get_state()
+    functions, allocations = profile.stop_profiling(state.profile_top_n)
+    if profile.trigger != 'admin' and time.perf_counter() - profile.started < state.slow_request_seconds:
+        return None
+    return state.slow_requests.add(profiling.request_record(
+        profile, request.method, request.full_path.rstrip('?'), request.endpoint or 'unmatched',
+        status, functions, allocations
+    ))
+
+@bp.before_app_request
+def resume_background_jobs():
+    # Not in create_app(), so importing or building the app starts no threads
+    state = get_state()
+    if not state.jobs_resumed:
+        resume_jobs(state)
+
+@bp.before_app_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@bp.before_app_request
+def admit_request():
+    """Hold a database slot for the request, or turn it away with 503 when overloaded"""
+    if request.endpoint is None or request.endpoint in ADMISSION_EXEMPT_ENDPOINTS:
+        return None
+    state = get_state()
+    try:
+        waited = state.admission.acquire()
+    except Overloaded as e:
+        state.admission_rejections.labels(request.endpoint, e.reason).inc()
+        response = jsonify({'success': False, 'error': str(e)})
+        response.headers['Retry-After'] = str(state.admission_retry_after)
+        return response, 503
+    g.admission_slot = True
+    state.admission_wait_seconds.observe(waited)
     return None
 
+@bp.teardown_app_request
+def release_request_slot(exc):
+    # Teardown also runs after a streamed body like /export has been sent
+    if g.pop('admission_slot', False):
+        get_state().admission.release()
+
+@bp.after_app_request
+def record_request_metrics(response):
+    started = g.pop('request_started', None)
+    if started is None:
+        return response
+    state = get_state()
+    endpoint = request.endpoint or 'unmatched'
+    state.http_request_seconds.labels(endpoint, request.method).observe(time.perf_counter() - started)
+    state.http_requests.labels(endpoint, request.method, response.status_code).inc()
+    # Streamed bodies have no length until they have been sent
+    if response.content_length is not None:
+        state.http_response_bytes.labels(endpoint).observe(response.content_length)
+    return response
+
+@bp.after_app_request
+def add_recipe_set_validators(response):
+    etag = g.pop('recipe_set_etag', None)
+    if etag and response.status_code in (200, 304):
+        response.set_etag(etag, weak=True)
+        # Let browsers keep the copy but always revalidate it
+        response.cache_control.no_cache = True
+    return response
+
+@bp.after_app_request
+def compress_response(response):
+    """Gzip or Brotli-compress text and JSON bodies the client accepts.
+
+    Registered after the metrics hook; after-request hooks run in reverse
+    order, so the metrics record the compressed size.
+    """
+    if not encoding.is_compressible(response.mimetype):
+        return response
+    response.vary.add('Accept-Encoding')
+    if (request.method == 'HEAD' or response.status_code != 200 or response.direct_passthrough
+            or 'Content-Encoding' in response.headers):
+        return response
+    state = get_state()
+    chosen = encoding.negotiate_encoding(request.accept_encodings, streamed=response.is_streamed)
+    if chosen is None:
+        return response
+    
+    if response.is_streamed:
+        response.response = encoding.gzip_stream(response.response, state.compress_level)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < state.compress_min_size:
+            return response
+        response.set_data(encoding.compress(data, chosen, state.compress_level))
+    response.headers['Content-Encoding'] = chosen
+    return response
+
+@bp.app_template_global()
+def asset_url(name):
+    """URL of a static asset: its fingerprinted build if there is one"""
+    filename, args = get_state().assets.path(name)
+    return url_for('static', filename=filename, **args)
+
+@bp.after_app_request
+def cache_static_assets(response):
+    # A fingerprinted file never changes under the same name
+    if (request.endpoint == 'static' and response.status_code == 200
+            and assets.is_fingerprinted(request.view_args.get('filename', ''))):
+        response.cache_control.public = True
+        response.cache_control.max_age = assets.IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+        response.cache_control.no_cache = None
+    return response
+
 def get_all_recipes():
     """Helper function to get all recipes from database"""
-    if __name__ == "__main__":  # Development mode
-        print("Running in development mode - using mock data")
-        # Return test recipes for development
-        test_recipes = [
-            {'id': 1, 'name': 'Pannenkoeken'},
-            {'id': 2, 'name': 'Stamppot'},
-            {'id': 3, 'name': 'Erwtensoep'},
-            {'id': 4, 'name': 'Bitterballen'},
-            {'id': 5, 'name': 'Hutspot'},
-            {'id': 6, 'name': 'Poffertjes'},
-            {'id': 7, 'name': 'Appeltaart'},
-            {'id': 8, 'name': 'Pasta Carbonara'},
-            {'id': 9, 'name': 'Chocolate Cake'}
-        ]
-        return test_recipes, None
+    state = get_state()
+    version = get_recipe_set_version()
+    recipes = state.recipe_cache.get(('recipes', version))
+    if recipes is not None:
+        return recipes, None
     
-    conn, error = get_db_connection()
-    if error:
-        return None, error
+    try:
+        return state.recipe_reads.do(('recipes', version), lambda: load_all_recipes(version))
+    except SingleFlightTimeout as err:
+        return None, str(err)
+
+def load_all_recipes(version):
+    """Read the recipe list from the database and cache it under the given version"""
+    state = get_state()
+    try:
+        with query_timer('list'):
+            recipes = state.storage.list_recipes()
+    except StorageError as err:
+        return None, str(err)
+    state.recipe_cache.set(('recipes', version), recipes)
+    return recipes, None
+
+def get_embedded_ingredient_map():
+    """The compact ingredient map of every recipe as HTML-safe JSON, cached per recipe-set version"""
+    state = get_state()
+    version = get_recipe_set_version()
+    ingredient_map = state.recipe_cache.get(('ingredient_map', version))
+    if ingredient_map is not None:
+        return ingredient_map, None
     
     try:
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute('SELECT id, name FROM recipes ORDER BY name')
-        recipes = cursor.fetchall()
-        return recipes, None
-    except mysql.connector.Error as err:
+        return state.recipe_reads.do(('ingredient_map', version), lambda: load_ingredient_map(version))
+    except SingleFlightTimeout as err:
         return None, str(err)
-    finally:
-        cursor.close()
-        conn.close()
 
-@app.route('/')
+def load_ingredient_map(version):
+    """Build the embedded ingredient map from the database and cache it under the given version"""
+    state = get_state()
+    try:
+        with query_timer('list'):
+            recipes = list(state.storage.iter_recipes('id'))
+    except StorageError as err:
+        return None, str(err)
+    ingredient_map = htmlsafe_json_dumps(compact_ingredient_map(recipes), separators=(',', ':'))
+    state.recipe_cache.set(('ingredient_map', version), ingredient_map)
+    return ingredient_map, None
+
+@bp.route('/')
 def index():
     """Default route - shows recipe selector"""
+    not_modified = recipe_set_not_modified('index')
+    if not_modified:
+        return not_modified
+    
+    # Read before the list, so /changes from this revision covers anything the list missed
+    revision = get_recipe_set_version()
     recipes, error = get_all_recipes()
     if error:
         return render_template('error.html', error=error)
-    return render_template('index.html', recipes=recipes or [])
+    recipes = recipes or []
+    
+    ingredient_map = None
+    if len(recipes) <= get_state().embed_map_max_recipes:
+        ingredient_map, error = get_embedded_ingredient_map()
+        if error:
+            # The page loads the map in chunks instead
+            print(f"Error building ingredient map: {error}")
+    return render_template(
+        'index.html', recipes=recipes, revision=revision, ingredient_map=ingredient_map
+    )
 
-@app.route('/recipe_manager')
+@bp.route('/recipe_manager')
 def recipe_manager():
     """Route for the recipe manager page"""
     recipes = get_recipes()
     return render_template('recipe_manager.html', recipes=recipes, categories=INGREDIENT_CATEGORIES)
 
-@app.route('/add_recipe', methods=['POST'])
+# Validate a recipe posted to the manager; returns (recipe to stage, error)
+def staged_recipe(data):
+    if not isinstance(data, dict):
+        return None, 'Expected a recipe object'
+    name = data.get('name')
+    if not isinstance(name, str) or not name.strip():
+        return None, 'Recipe name is required'
+    ingredients = data.get('ingredients', [])
+    if not isinstance(ingredients, list) or not all(isinstance(item, (str, dict)) for item in ingredients):
+        return None, 'Ingredients must be a list of names or objects'
+    
+    # Normalized once here; save_to_db fills in categories from the catalog
+    staged = []
+    for ingredient_name, category in parse_ingredients(ingredients):
+        key = category_key(category)
+        if category and key is None:
+            return None, f"Unknown category '{category}' for ingredient '{ingredient_name}'"
+        staged.append({'name': ingredient_name, 'category': key})
+    return {'name': name.strip(), 'ingredients': staged}, None
+
+@bp.route('/add_recipe', methods=['POST'])
 def add_recipe():
-    data = request.get_json()
-    recipes = get_recipes()
-    recipes.append({
-        'name': data['name'],
-        'ingredients': data['ingredients']
-    })
-    save_recipes(recipes)
+    recipe, error = staged_recipe(request.get_json(silent=True))
+    if error:
+        return jsonify({'success': False, 'error': error}), 400
+    get_state().staging.append(recipe)
     return jsonify({'success': True})
 
-@app.route('/delete_recipe/<int:index>', methods=['DELETE'])
+@bp.route('/add_recipes', methods=['POST'])
+def add_recipes():
+    """
+    Validate a batch of recipes and stage the valid ones in one write
+    
+    Accepts a JSON array of recipes or {'recipes': [...]} and reports a
+    result per recipe, in the order they were given.
+    """
+    data = request.get_json(silent=True)
+    recipes = data.get('recipes') if isinstance(data, dict) else data
+    if not isinstance(recipes, list) or not recipes:
+        return jsonify({'success': False, 'error': 'Expected a non-empty list of recipes'}), 400
+    if len(recipes) > ADD_BATCH_MAX:
+        return jsonify({'success': False, 'error': f'At most {ADD_BATCH_MAX} recipes per request'}), 400
+    
+    valid = []
+    results = []
+    for index, item in enumerate(recipes):
+        recipe, error = staged_recipe(item)
+        if error:
+            results.append({'index': index, 'success': False, 'error': error})
+        else:
+            valid.append(recipe)
+            results.append({'index': index, 'success': True})
+    
+    if valid:
+        try:
+            get_state().staging.extend(valid)
+        except Exception as e:
+            print(f"Error in add_recipes: {str(e)}")
+            return jsonify({'success': False, 'error': str(e)}), 500
+    
+    return jsonify({
+        'success': len(valid) == len(recipes),
+        'added': len(valid),
+        'results': results
+    }), 200 if valid else 400
+
+@bp.route('/delete_recipe/<int:index>', methods=['DELETE'])
 def delete_recipe(index):
-    recipes = get_recipes()
-    if 0 <= index < len(recipes):
-        del recipes[index]
-        save_recipes(recipes)
+    if get_state().staging.delete_at(index):
         return jsonify({'success': True})
     return jsonify({'success': False, 'error': 'Recipe not found'})
 
-@app.route('/save_to_db', methods=['POST'])
-def save_to_db():
-    recipes = get_recipes()
-    
-    if __name__ == "__main__":
-        print("Running in development mode - skipping database operations")
-        return jsonify({'success': True, 'message': 'Development mode - database operations skipped'})
-    
+# Save staged entries to the database chunk by chunk; returns the save_to_db summary
+def commit_staged(entries, progress=None):
+    state = get_state()
+    chunks = []
+    inserted = 0
+    rows_written = 0
+    all_saved = []
     try:
-        conn, error = get_db_connection()
-        if error:
-            return jsonify({'success': False, 'error': error})
+        # Each chunk is its own transaction and leaves staging once committed.
+        # If the process dies halfway, a retry skips what was already saved
+        # thanks to the idempotency keys.
+        for start in range(0, len(entries), state.save_chunk_size):
+            chunk = entries[start:start + state.save_chunk_size]
+            started = time.perf_counter()
+            with query_timer('insert'):
+                saved = state.storage.save_recipes([(key, recipe) for _, key, recipe in chunk])
+            state.staging.remove([entry_id for entry_id, _, _ in chunk])
+            all_saved.extend(saved)
             
-        cursor = conn.cursor()
-        
-        for recipe in recipes:
-            cursor.execute(
-                'INSERT INTO recipes (name, ingredients) VALUES (%s, %s)',
-                (recipe['name'], json.dumps(recipe['ingredients']))
-            )
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
-        
-        # Clear the temporary storage
-        save_recipes([])
+            inserted += len(saved)
+            rows_written += len(chunk)
+            chunks.append({
+                'rows': len(chunk),
+                'inserted': len(saved),
+                'seconds': round(time.perf_counter() - started, 4)
+            })
+            if progress is not None:
+                progress({'rows_written': rows_written, 'inserted': inserted, 'chunks': chunks})
         
-        return jsonify({'success': True})
+        return {
+            'success': True,
+            'inserted': inserted,
+            'skipped': len(entries) - inserted,
+            'chunks': chunks
+        }
     except Exception as e:
         print(f"Unexpected error: {e}")
-        return jsonify({'success': False, 'error': str(e)})
+        return {'success': False, 'error': str(e), 'inserted': inserted, 'chunks': chunks}
+    finally:
+        if inserted:
+            bump_recipe_set_version()
+            update_menus(saved=all_saved)
+
+# Job handler for background saves: commits the staged entries the job was created for
+def run_save_job(job, progress):
+    wanted = set(job['payload']['entry_ids'])
+    # Entries committed before a restart have left staging already
+    entries = [entry for entry in get_state().staging.entries() if entry[0] in wanted]
+    progress({'rows': len(entries), 'rows_written': 0, 'inserted': 0, 'chunks': []})
+    return commit_staged(entries, progress)
+
+@bp.route('/save_to_db', methods=['POST'])
+def save_to_db():
+    """
+    Save the staged recipes to the database
+    
+    With ?background=1 (or [SAVE] BACKGROUND = true) the save is queued for
+    a background worker instead and the response holds a job id to poll at
+    /jobs/<id>.
+    """
+    state = get_state()
+    entries = state.staging.entries()
+    background = request.args.get('background')
+    if background is None:
+        background = state.save_in_background
+    else:
+        background = background.lower() in ('1', 'true', 'yes')
+    if not background:
+        return jsonify(commit_staged(entries))
+    
+    try:
+        job_id = state.jobs.submit('save_to_db', {'entry_ids': [entry_id for entry_id, _, _ in entries]})
+    except JobQueueFull as e:
+        response = jsonify({'success': False, 'error': str(e)})
+        response.headers['Retry-After'] = '30'
+        return response, 503
+    status_url = url_for('recipes.job_status', job_id=job_id)
+    response = jsonify({'success': True, 'job_id': job_id, 'rows': len(entries), 'status_url': status_url})
+    response.headers['Location'] = status_url
+    return response, 202
+
+@bp.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = get_state().job_store.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    job.pop('payload')
+    return jsonify({'success': True, 'job': job})
+
+@bp.route('/export')
+def export():
+    """Stream every saved recipe as NDJSON, resuming after ?after_id= if given"""
+    recipes = get_state().storage.iter_recipes('id', request.args.get('after_id', type=int))
+    response = current_app.response_class(
+        stream_with_context(ndjson_io.export_lines(recipes)), mimetype=ndjson_io.CONTENT_TYPE
+    )
+    response.headers['Content-Disposition'] = 'attachment; filename=recipes.ndjson'
+    response.call_on_close(recipes.close)
+    return response
+
+@bp.route('/import', methods=['POST'])
+def import_route():
+    """Import an NDJSON request body in transactional batches.
 
-@app.route('/get_default_ingredients', methods=['POST'])
+    ?start_line= resumes a failed import; ?batch_size= sets the recipes per
+    transaction. Recipes that were imported before are skipped.
+    """
+    state = get_state()
+    start_line = max(request.args.get('start_line', 1, type=int), 1)
+    batch_size = min(max(request.args.get('batch_size', state.save_chunk_size, type=int), 1), 5000)
+    summary = import_recipes(request.stream, start_line, batch_size, lambda summary: print(
+        f"Import: line {summary['lines']}, {summary['imported']} imported, {summary['skipped']} skipped"
+    ))
+    if 'error' in summary:
+        print(f"Import stopped: {summary['error']}")
+        return jsonify({'success': False, **summary}), 400 if 'bad_line' in summary else 500
+    return jsonify({'success': True, **summary})
+
+@bp.route('/debug/slow')
+def debug_slow():
+    """Recent slow and profiled requests; admin only"""
+    if not is_admin_request():
+        abort(404)
+    state = get_state()
+    requests_logged = state.slow_requests.recent()
+    if request.args.get('format') == 'json':
+        return jsonify({
+            'success': True,
+            'threshold_seconds': state.slow_request_seconds,
+            'requests': requests_logged
+        })
+    return render_template(
+        'debug_slow.html', requests=requests_logged,
+        threshold_ms=round(state.slow_request_seconds * 1000)
+    )
+
+@bp.route('/pool_stats')
+def pool_stats():
+    """Storage backend statistics, connection pool usage for the SQL backends and admission control"""
+    state = get_state()
+    return jsonify({'backend': state.storage.name, **state.storage.stats(), 'admission': state.admission.stats()})
+
+@bp.route('/cache_stats')
+def cache_stats():
+    """Recipe cache hit/miss and request coalescing statistics"""
+    state = get_state()
+    stats = state.recipe_cache.stats()
+    stats['single_flight'] = state.recipe_reads.stats()
+    stats['recipe_set_version'] = get_recipe_set_version()
+    return jsonify(stats)
+
+@bp.route('/metrics')
+def metrics_route():
+    """Request, query and staging metrics in the Prometheus text format"""
+    return current_app.response_class(get_state().metrics_registry.render(), content_type=metrics.CONTENT_TYPE)
+
+@bp.route('/get_default_ingredients', methods=['POST'])
 def default_ingredients_route():
-    data = request.get_json()
+    data = request.get_json() or {}
     recipe_name = data.get('recipe_name', '')
-    ingredients = get_default_ingredients(recipe_name)
-    return jsonify({'ingredients': ingredients})
+    limit = data.get('limit', 5)
+    if not isinstance(recipe_name, str):
+        return jsonify({'success': False, 'error': 'recipe_name must be a string'}), 400
+    if not isinstance(limit, int) or isinstance(limit, bool) or limit < 1:
+        return jsonify({'success': False, 'error': 'limit must be a positive integer'}), 400
+    index = get_suggestion_index()
+    return jsonify({
+        'ingredients': index.lookup(recipe_name),
+        'suggestions': index.suggest(recipe_name, limit=min(limit, 20))
+    })
 
-@app.route('/view_db')
+@bp.route('/view_db')
 def view_db():
+    """Database view, one keyset page at a time or streamed with ?stream=1"""
+    state = get_state()
+    order = 'name' if request.args.get('order') == 'name' else 'id'
+    page_size = request.args.get('page_size', state.view_db_page_size, type=int)
+    page_size = min(max(page_size, 1), VIEW_DB_MAX_PAGE_SIZE)
+    after_id = request.args.get('after_id', type=int)
+    after_name = request.args.get('after_name', '')
     
-    if __name__ == "__main__":
-        
-        print("Running in development mode - skipping database operations")
-        
-        # Create mock test data for the database view
-        test_recipes = [
-            {
-                'id': 1,
-                'name': 'Chocolate Cake',
-                'ingredients': ['Flour', 'Sugar', 'Cocoa', 'Eggs']
-            },
-            {
-                'id': 2,
-                'name': 'Pasta Carbonara',
-                'ingredients': ['Pasta', 'Eggs', 'Pancetta', 'Parmesan']
-            }
-        ]
-        return render_template('view_db.html', recipes=test_recipes)
+    if request.args.get('stream') == '1':
+        return stream_view_db(state.storage.iter_recipes(order, after_id, after_name))
     
     try:
-        conn, error = get_db_connection()
-        if error:
-            return f"Database connection error: {error}"
-            
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT * FROM recipes')
-        recipe_data = cursor.fetchall()
-        
-        cursor.close()
-        conn.close()
-        
-        recipes = []
-        for row in recipe_data:
-            id, name, ingredients_json = row
-            ingredients = json.loads(ingredients_json)
-            recipes.append({
-                'id': id,
-                'name': name,
-                'ingredients': ingredients
-            })
-        
-        return render_template('view_db.html', recipes=recipes)
-    except Exception as e:
-        print(f"Unexpected error: {e}")
-        return f"Error: {str(e)}"
+        # One row more than the page size tells us whether there is a next page
+        with query_timer('list'):
+            recipes = state.storage.recipe_page(order, after_id, after_name, page_size + 1)
+    except StorageError as e:
+        print(f"Database error: {e}")
+        return f"Database error: {str(e)}"
+    
+    return render_view_db_page(recipes, order, page_size)
 
-@app.route('/get_ingredients', methods=['POST'])
+@bp.route('/get_ingredients', methods=['POST'])
 def get_ingredients():
     """API endpoint to get ingredients for selected recipes"""
+    recipe_ids, error = posted_recipe_ids()
+    if error:
+        return jsonify({'success': False, 'error': error}), 400
     
-    # Check if running in development mode
-    if __name__ == "__main__":
-        print("Running in development mode - using mock data")
-        
-        data = request.get_json()
-        recipe_ids = data.get('recipe_ids', [])
-        
-        # Test recipe ingredients mapping with categories
-        test_recipe_ingredients = {
-            1: [{'name': 'bloem', 'category': 'droge-waren'}, {'name': 'melk', 'category': 'zuivel'}, {'name': 'eieren', 'category': 'zuivel'}, {'name': 'zout', 'category': 'kruiden'}],  # Pannenkoeken
-            2: [{'name': 'aardappelen', 'category': 'verse-groenten-fruit'}, {'name': 'boerenkool', 'category': 'verse-groenten-fruit'}, {'name': 'rookworst', 'category': 'vlees-vis'}, {'name': 'spekjes', 'category': 'vlees-vis'}],  # Stamppot
-            3: [{'name': 'spliterwten', 'category': 'droge-waren'}, {'name': 'varkensvlees', 'category': 'vlees-vis'}, {'name': 'prei', 'category': 'verse-groenten-fruit'}, {'name': 'wortel', 'category': 'verse-groenten-fruit'}],  # Erwtensoep
-            4: [{'name': 'rundvlees', 'category': 'vlees-vis'}, {'name': 'bouillon', 'category': 'droge-waren'}, {'name': 'bloem', 'category': 'droge-waren'}, {'name': 'paneermeel', 'category': 'brood-bakkerij'}],  # Bitterballen
-            5: [{'name': 'aardappelen', 'category': 'verse-groenten-fruit'}, {'name': 'wortelen', 'category': 'verse-groenten-fruit'}, {'name': 'uien', 'category': 'verse-groenten-fruit'}, {'name': 'rundvlees', 'category': 'vlees-vis'}],  # Hutspot
-            6: [{'name': 'bloem', 'category': 'droge-waren'}, {'name': 'gist', 'category': 'droge-waren'}, {'name': 'melk', 'category': 'zuivel'}, {'name': 'boter', 'category': 'zuivel'}],  # Poffertjes
-            7: [{'name': 'appels', 'category': 'verse-groenten-fruit'}, {'name': 'bloem', 'category': 'droge-waren'}, {'name': 'boter', 'category': 'zuivel'}, {'name': 'kaneel', 'category': 'kruiden'}],  # Appeltaart
-            8: [{'name': 'pasta', 'category': 'droge-waren'}, {'name': 'eieren', 'category': 'zuivel'}, {'name': 'pancetta', 'category': 'vlees-vis'}, {'name': 'parmezaan', 'category': 'zuivel'}],  # Pasta Carbonara
-            9: [{'name': 'bloem', 'category': 'droge-waren'}, {'name': 'suiker', 'category': 'droge-waren'}, {'name': 'cacao', 'category': 'droge-waren'}, {'name': 'eieren', 'category': 'zuivel'}, {'name': 'boter', 'category': 'zuivel'}]  # Chocolate Cake
-        }
-        
-        all_ingredients = []
-        for recipe_id in recipe_ids:
-            if recipe_id in test_recipe_ingredients:
-                all_ingredients.extend(test_recipe_ingredients[recipe_id])
-        
-        return jsonify({
-            'success': True,
-            'ingredients': all_ingredients
-        })
+    not_modified = recipe_set_not_modified('ingredients', recipe_ids)
+    if not_modified:
+        return not_modified
     
     try:
-        data = request.get_json()
-        recipe_ids = data.get('recipe_ids', [])
-        
-        conn, error = get_db_connection()
+        payloads, error = get_ingredient_payloads(recipe_ids)
         if error:
             return jsonify({'success': False, 'error': error}), 500
-            
-        cursor = conn.cursor(dictionary=True)
         
-        cursor.execute(
-            'SELECT ingredients FROM recipes WHERE id IN (%s)' % ','.join(['%s'] * len(recipe_ids)),
-            recipe_ids
+        # Same document as jsonify({'success': True, 'ingredients': [...]}),
+        # assembled from the cached per-recipe bytes
+        items = b','.join(payloads[recipe_id] for recipe_id in recipe_ids if payloads[recipe_id])
+        return current_app.response_class(
+            b'{"ingredients":[' + items + b'],"success":true}\n', mimetype='application/json'
         )
         
-        results = cursor.fetchall()
-        all_ingredients = []
-        
-        for result in results:
-            ingredients = json.loads(result['ingredients'])
-            all_ingredients.extend(ingredients)
-            
-        cursor.close()
-        conn.close()
-        
-        return jsonify({
-            'success': True,
-            'ingredients': all_ingredients
-        })
-        
     except Exception as e:
         print(f"Error in get_ingredients: {str(e)}")
         return jsonify({
@@ -360,54 +1227,290 @@ def get_ingredients():
             'error': str(e)
         }), 500
 
-@app.route('/delete_and_export_recipe/<int:recipe_id>', methods=['POST'])
-def delete_and_export_recipe(recipe_id):
+@bp.route('/ingredient_map')
+def ingredient_map_route():
+    """The compact ingredient map of the recipes after ?after_id=, one chunk at a time.
+
+    For selector pages whose catalog is too large to embed the map;
+    next_after_id is None on the last chunk.
     """
-    Delete a recipe from the database and export it to the recipe manager JSON
+    after_id = request.args.get('after_id', type=int)
+    not_modified = recipe_set_not_modified('ingredient_map', after_id)
+    if not_modified:
+        return not_modified
+    
+    state = get_state()
+    version = get_recipe_set_version()
+    chunk = state.recipe_cache.get(('ingredient_map_chunk', version, after_id))
+    if chunk is None:
+        try:
+            with query_timer('list'):
+                recipes = state.storage.recipe_page('id', after_id, '', INGREDIENT_MAP_CHUNK + 1)
+        except StorageError as e:
+            print(f"Error in ingredient_map: {str(e)}")
+            return jsonify({'success': False, 'error': str(e)}), 500
+        chunk = compact_ingredient_map(recipes[:INGREDIENT_MAP_CHUNK])
+        chunk['next_after_id'] = recipes[INGREDIENT_MAP_CHUNK - 1]['id'] if len(recipes) > INGREDIENT_MAP_CHUNK else None
+        state.recipe_cache.set(('ingredient_map_chunk', version, after_id), chunk)
+    return jsonify({'success': True, **chunk})
+
+@bp.route('/shopping_list', methods=['POST'])
+def shopping_list():
+    """API endpoint returning the merged shopping list for a whole selection of recipes"""
+    recipe_ids, error = posted_recipe_ids()
+    if error:
+        return jsonify({'success': False, 'error': error}), 400
+    
+    not_modified = recipe_set_not_modified('shopping_list', recipe_ids)
+    if not_modified:
+        return not_modified
+    
+    try:
+        ingredients_by_recipe, error = get_recipe_ingredients(recipe_ids)
+        if error:
+            return jsonify({'success': False, 'error': error}), 500
+    except Exception as e:
+        print(f"Error in shopping_list: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+    
+    categories, text = build_shopping_list(recipe_ids, ingredients_by_recipe)
+    return jsonify({
+        'success': True,
+        'recipe_ids': recipe_ids,
+        'categories': categories,
+        'text': text
+    })
+
+@bp.route('/menus')
+def menus_route():
+    """Saved menus, without their shopping lists"""
+    try:
+        with query_timer('menus'):
+            menus = get_state().storage.list_menus()
+    except StorageError as e:
+        print(f"Error in menus: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+    return jsonify({'success': True, 'menus': menus})
+
+@bp.route('/menus', methods=['POST'])
+def create_menu_route():
     """
-    if __name__ == "__main__":
-        print("Remove recipe button clicked. Running in development mode - skipping database operations")
-        return jsonify({'success': True, 'message': 'Development mode - database operations skipped'})
+    Save a selection of recipes as a menu, with its shopping list materialized
+    """
+    data = request.get_json(silent=True) or {}
+    name = data.get('name')
+    recipe_ids = data.get('recipe_ids')
+    if not isinstance(name, str) or not name.strip():
+        return jsonify({'success': False, 'error': 'Menu name is required'}), 400
+    if (not isinstance(recipe_ids, list) or not recipe_ids
+            or not all(isinstance(recipe_id, int) and not isinstance(recipe_id, bool) for recipe_id in recipe_ids)):
+        return jsonify({'success': False, 'error': 'recipe_ids must be a non-empty list of ids'}), 400
+    if len(recipe_ids) > MENU_MAX_RECIPES:
+        return jsonify({'success': False, 'error': f'At most {MENU_MAX_RECIPES} recipes per menu'}), 400
+    
+    recipes, error = get_all_recipes()
+    if error:
+        return jsonify({'success': False, 'error': error}), 500
+    existing = {recipe['id'] for recipe in recipes}
+    missing = [recipe_id for recipe_id in recipe_ids if recipe_id not in existing]
+    if missing:
+        return jsonify({'success': False, 'error': f'Unknown recipe ids: {missing}'}), 400
+    recipe_ids = list(dict.fromkeys(recipe_ids))
     
     try:
-        # Get database connection
-        conn, error = get_db_connection()
+        ingredients_by_recipe, error = get_recipe_ingredients(recipe_ids)
         if error:
-            return jsonify({'success': False, 'error': error})
-        
-        cursor = conn.cursor(dictionary=True)
-        
-        # Fetch the recipe details before deleting
-        cursor.execute('SELECT name, ingredients FROM recipes WHERE id = %s', (recipe_id,))
-        recipe = cursor.fetchone()
+            return jsonify({'success': False, 'error': error}), 500
+        categories, text = build_shopping_list(recipe_ids, ingredients_by_recipe)
+        with query_timer('menus'):
+            menu_id = get_state().storage.create_menu(
+                name.strip(), recipe_ids, {'categories': categories, 'text': text}
+            )
+    except StorageError as e:
+        print(f"Error in create_menu: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+    
+    return jsonify({
+        'success': True,
+        'id': menu_id,
+        'name': name.strip(),
+        'recipe_ids': recipe_ids,
+        'categories': categories,
+        'text': text
+    }), 201
+
+@bp.route('/menus/<int:menu_id>')
+def menu_route(menu_id):
+    """A saved menu with its shopping list, read as it was materialized"""
+    try:
+        with query_timer('menus'):
+            menu = get_state().storage.get_menu(menu_id)
+    except StorageError as e:
+        print(f"Error in menu: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+    if menu is None:
+        return jsonify({'success': False, 'error': 'Menu not found'}), 404
+    return jsonify({
+        'success': True,
+        'id': menu['id'],
+        'name': menu['name'],
+        'recipe_ids': menu['recipe_ids'],
+        'categories': menu['shopping_list']['categories'],
+        'text': menu['shopping_list']['text']
+    })
+
+@bp.route('/menus/<int:menu_id>', methods=['DELETE'])
+def delete_menu_route(menu_id):
+    try:
+        with query_timer('menus'):
+            deleted = get_state().storage.delete_menu(menu_id)
+    except StorageError as e:
+        print(f"Error in delete_menu: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+    if not deleted:
+        return jsonify({'success': False, 'error': 'Menu not found'}), 404
+    return jsonify({'success': True})
+
+@bp.route('/changes')
+def changes():
+    """Recipes saved and deleted after revision ?since=, for clients that keep a copy of the list.
+
+    Apply 'recipes' (upserts) before 'deleted' and poll again with the
+    returned revision. A response with 'reset' means too much changed, or
+    the database was replaced: reload the full list instead.
+    """
+    since = request.args.get('since', type=int)
+    if since is None or since < 0:
+        return jsonify({'success': False, 'error': 'since must be a revision number'}), 400
+    try:
+        with query_timer('changes'):
+            changed = get_state().storage.changes(since, CHANGES_MAX)
+    except StorageError as e:
+        print(f"Error in changes: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+    if 'recipes' not in changed or since > changed['revision']:
+        return jsonify({'success': True, 'reset': True, 'revision': changed['revision']})
+    return jsonify({'success': True, **changed})
+
+@bp.route('/search')
+def search():
+    """Saved recipes ranked by how many of the given ingredients they use.
+
+    Ingredients are passed as repeated ?ingredient= parameters and/or a
+    comma-separated ?ingredients= list; ?match=all only returns recipes
+    that use all of them. Paginated with ?limit= and ?offset=.
+    """
+    terms = request.args.getlist('ingredient')
+    for value in request.args.getlist('ingredients'):
+        terms.extend(value.split(','))
+    terms = list(dict.fromkeys(term.strip() for term in terms if term.strip()))
+    limit = min(max(request.args.get('limit', SEARCH_DEFAULT_LIMIT, type=int), 1), SEARCH_MAX_LIMIT)
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    match_all = request.args.get('match') == 'all'
+    if not terms:
+        return jsonify({'success': False, 'error': 'No ingredients given'}), 400
+    
+    not_modified = recipe_set_not_modified('search', terms, limit, offset, match_all)
+    if not_modified:
+        return not_modified
+    
+    index, error = get_ingredient_index()
+    if error:
+        return jsonify({'success': False, 'error': error}), 500
+    total, results = index.search(terms, limit=limit, offset=offset, match_all=match_all)
+    return jsonify({
+        'success': True,
+        'ingredients': terms,
+        'total': total,
+        'results': results,
+        'next_offset': offset + limit if offset + limit < total else None
+    })
+
+@bp.route('/delete_and_export_recipe/<int:recipe_id>', methods=['POST'])
+def delete_and_export_recipe(recipe_id):
+    """
+    Delete a recipe from the database and export it to the recipe manager staging store
+    """
+    state = get_state()
+    try:
+        # Fetches the recipe with its ingredients and deletes it in one transaction
+        with query_timer('delete'):
+            recipe = state.storage.pop_recipe(recipe_id)
         
         if not recipe:
             return jsonify({'success': False, 'error': 'Recipe not found'})
+        bump_recipe_set_version()
+        update_menus(removed=[recipe_id])
         
-        # Delete the recipe from the database
-        cursor.execute('DELETE FROM recipes WHERE id = %s', (recipe_id,))
-        conn.commit()
-        
-        # Load existing recipes from JSON
-        recipes = get_recipes()
-        
-        # Add the deleted recipe to the JSON
-        recipes.append({
+        # Add the deleted recipe to the staging store
+        state.staging.append({
             'name': recipe['name'],
-            'ingredients': json.loads(recipe['ingredients'])
+            'ingredients': recipe['ingredients']
         })
         
-        # Save updated recipes to JSON
-        save_recipes(recipes)
-        
-        cursor.close()
-        conn.close()
-        
         return jsonify({'success': True, 'recipe': recipe})
     except Exception as e:
         print(f"Error in delete_and_export_recipe: {str(e)}")
         return jsonify({'success': False, 'error': str(e)})
 
+@bp.route('/delete_and_export_recipes', methods=['POST'])
+def delete_and_export_recipes():
+    """
+    Delete several recipes in one transaction and export them to the staging store in one write
+    """
+    state = get_state()
+    data = request.get_json() or {}
+    recipe_ids = data.get('recipe_ids')
+    if (not isinstance(recipe_ids, list) or not recipe_ids
+            or not all(isinstance(recipe_id, int) and not isinstance(recipe_id, bool) for recipe_id in recipe_ids)):
+        return jsonify({'success': False, 'error': 'recipe_ids must be a non-empty list of ids'}), 400
+    if len(recipe_ids) > DELETE_BATCH_MAX:
+        return jsonify({'success': False, 'error': f'At most {DELETE_BATCH_MAX} recipes per request'}), 400
+    recipe_ids = list(dict.fromkeys(recipe_ids))
+    
+    try:
+        with query_timer('delete'):
+            recipes = state.storage.pop_recipes(recipe_ids)
+    except StorageError as e:
+        print(f"Error in delete_and_export_recipes: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+    
+    if recipes:
+        bump_recipe_set_version()
+        update_menus(removed=list(recipes))
+        try:
+            state.staging.extend([
+                {'name': recipe['name'], 'ingredients': recipe['ingredients']} for recipe in recipes.values()
+            ])
+        except Exception as e:
+            # The recipes are gone from the database; return them so they are not lost
+            print(f"Error staging exported recipes: {str(e)}")
+            return jsonify({'success': False, 'error': str(e), 'recipes': list(recipes.values())}), 500
+    
+    return jsonify({
+        'success': True,
+        'deleted': len(recipes),
+        'results': [
+            {'id': recipe_id, 'success': True, 'recipe': recipes[recipe_id]} if recipe_id in recipes
+            else {'id': recipe_id, 'success': False, 'error': 'Recipe not found'}
+            for recipe_id in recipe_ids
+        ]
+    })
+
+# Module-level app for WSGI files that do `from app import app`. Built from
+# config.ini on first access, so importing this module has no side effects.
+_default_app = None
+_default_app_lock = threading.Lock()
+
+def __getattr__(name):
+    global _default_app
+    if name != 'app':
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    with _default_app_lock:
+        if _default_app is None:
+            _default_app = create_app()
+    return _default_app
+
 if __name__ == '__main__':
-    init_json()
-    app.run(debug=True, host='0.0.0.0', port=8080)
+    # Development server: in-memory sample recipes unless config.ini picks a backend
+    create_app(development=True).run(debug=True, host='0.0.0.0', port=8080)
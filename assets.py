@@ -0,0 +1,238 @@
+"""Static asset pipeline: minify, fingerprint and look up CSS and JavaScript.
+
+build() writes a minified copy of every file in ASSETS to static/dist with
+a content hash in its name, plus a manifest mapping the source name to the
+built file:
+
+    flask --app app build-assets
+
+Templates link assets with asset_url('js/index.js'). Built files never
+change under the same name, so they are served with an immutable one-year
+Cache-Control; without a build the source file is linked instead, with its
+hash as a query string.
+"""
+import os
+import re
+import json
+import hashlib
+
+# Source files under static/ that are built
+ASSETS = ['css/styles.css', 'js/script.js', 'js/index.js', 'js/view_db.js']
+
+DIST_DIR = 'dist'
+MANIFEST = 'manifest.json'
+
+IMMUTABLE_MAX_AGE = 31536000
+
+# JavaScript punctuation that never needs surrounding spaces. '+', '-' and
+# '/' are left alone: 'a - -b' and 'a / /re/.x' depend on the spacing.
+_JS_TIGHT = set('{}()[];,:=<>!&|?*')
+
+# A '/' after one of these characters or keywords starts a regex literal, not a division
+_JS_REGEX_AFTER = set('({[,;:=<>!&|?+-*%~^')
+_JS_REGEX_KEYWORD = re.compile(r'(?<![\w$])(?:return|typeof|case|do|else|in|of|new|delete|void|throw|yield|await)$')
+
+
+def minify_js(source):
+    """Conservative JavaScript minifier.
+
+    Drops comments, indentation and blank lines and the spaces around
+    punctuation, without touching string, template and regex literal
+    contents. Line breaks are kept so automatic semicolon insertion still
+    applies.
+    """
+    out = []
+    n = len(source)
+    depth = 0
+    # Brace depths at which a ${...} substitution returns to its template literal
+    substitutions = []
+
+    def string_end(start, quote):
+        j = start + 1
+        while j < n and source[j] != quote:
+            j += 2 if source[j] == '\\' else 1
+        return j + 1
+
+    def regex_end(start):
+        """End of the regex literal at start, flags included, or None if there is none"""
+        # The output just before it is enough to tell
+        tail, k = '', len(out)
+        while k and len(tail.strip()) < 12:
+            k -= 1
+            tail = out[k] + tail
+        tail = tail.rstrip()
+        if tail and tail[-1] not in _JS_REGEX_AFTER and not _JS_REGEX_KEYWORD.search(tail):
+            return None
+        j, in_class = start + 1, False
+        while j < n and source[j] != '\n':
+            if source[j] == '\\':
+                j += 1
+            elif source[j] == '[':
+                in_class = True
+            elif source[j] == ']':
+                in_class = False
+            elif source[j] == '/' and not in_class:
+                j += 1
+                while j < n and (source[j].isalnum() or source[j] == '_'):
+                    j += 1
+                return j
+            j += 1
+        return None
+
+    def template_end(j):
+        """End of the template literal text from j, and whether a substitution starts there"""
+        while j < n:
+            if source[j] == '\\':
+                j += 2
+            elif source[j] == '`':
+                return j + 1, False
+            elif source.startswith('${', j):
+                return j + 2, True
+            else:
+                j += 1
+        return n, False
+
+    i = 0
+    while i < n:
+        char = source[i]
+        if source.startswith('//', i):
+            i = source.find('\n', i)
+            if i == -1:
+                break
+            continue
+        if source.startswith('/*', i):
+            end = source.find('*/', i + 2)
+            i = n if end == -1 else end + 2
+            continue
+        if char in '\'"':
+            end = string_end(i, char)
+            out.append(source[i:end])
+            i = end
+            continue
+        end = regex_end(i) if char == '/' else None
+        if end is not None:
+            out.append(source[i:end])
+            i = end
+            continue
+        if char == '`' or (char == '}' and substitutions and substitutions[-1] == depth):
+            if char == '}':
+                substitutions.pop()
+                depth -= 1
+            end, substitution = template_end(i + 1)
+            if substitution:
+                depth += 1
+                substitutions.append(depth)
+            out.append(source[i:end])
+            i = end
+            continue
+
+        if char == '{':
+            depth += 1
+        elif char == '}':
+            depth -= 1
+        if char == '\n':
+            while out and out[-1] == ' ':
+                out.pop()
+            if out and out[-1] != '\n':
+                out.append('\n')
+        elif char in ' \t\r':
+            if out and out[-1] not in ' \n' and out[-1][-1] not in _JS_TIGHT:
+                out.append(' ')
+        else:
+            if char in _JS_TIGHT and out and out[-1] == ' ':
+                out.pop()
+            out.append(char)
+        i += 1
+    return ''.join(out).strip() + '\n'
+
+
+def minify_css(source):
+    """Drop comments and the whitespace CSS does not need"""
+    source = re.sub(r'/\*.*?\*/', '', source, flags=re.S)
+    source = re.sub(r'\s+', ' ', source)
+    source = re.sub(r'\s*([{};,>])\s*', r'\1', source)
+    # Only after a colon: a space before one separates a descendant ':hover'
+    source = re.sub(r':\s+', ':', source)
+    return source.replace(';}', '}').strip() + '\n'
+
+
+def minify(name, source):
+    if name.endswith('.js'):
+        return minify_js(source)
+    if name.endswith('.css'):
+        return minify_css(source)
+    return source
+
+
+def fingerprint(data):
+    return hashlib.sha256(data).hexdigest()[:12]
+
+
+def build(static_dir, assets=ASSETS):
+    """Minify and fingerprint assets into static_dir/dist and write the manifest.
+
+    Returns the manifest: {source name: built name}, both relative to
+    static_dir. Files of earlier builds are kept, so pages rendered before
+    a deploy can still load them.
+    """
+    dist = os.path.join(static_dir, DIST_DIR)
+    manifest = {}
+    for name in assets:
+        with open(os.path.join(static_dir, name), encoding='utf-8') as f:
+            data = minify(name, f.read()).encode('utf-8')
+        stem, ext = os.path.splitext(name)
+        built = f'{DIST_DIR}/{stem}.{fingerprint(data)}.min{ext}'
+        path = os.path.join(static_dir, built)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if not os.path.exists(path):
+            _write_atomic(path, data)
+        manifest[name] = built
+
+    _write_atomic(os.path.join(dist, MANIFEST), json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
+    return manifest
+
+
+def _write_atomic(path, data):
+    # Workers may be serving the old files while a build runs
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+class AssetManifest:
+    """Maps source asset names to the URLs templates should link.
+
+    Reads static_dir/dist/manifest.json once. Names missing from it (or
+    every name, when there has been no build) map to the source file with
+    its content hash as a ?v= query string.
+    """
+
+    def __init__(self, static_dir):
+        self.static_dir = static_dir
+        self.built = {}
+        path = os.path.join(static_dir, DIST_DIR, MANIFEST)
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self.built = json.load(f)
+        self._versions = {}
+
+    def path(self, name):
+        """(filename under static/, query args) for an asset"""
+        built = self.built.get(name)
+        if built is not None:
+            return built, {}
+        version = self._versions.get(name)
+        if version is None:
+            try:
+                with open(os.path.join(self.static_dir, name), 'rb') as f:
+                    version = fingerprint(f.read())
+            except OSError:
+                version = ''
+            self._versions[name] = version
+        return name, {'v': version} if version else {}
+
+
+def is_fingerprinted(filename):
+    """Whether a static filename is a built, content-addressed file"""
+    return filename.startswith(DIST_DIR + '/') and not filename.endswith(MANIFEST)
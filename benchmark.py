@@ -0,0 +1,266 @@
+"""HTTP load benchmark for the recipe app.
+
+Runs the Flask app in-process on the SQLite backend (which shares its SQL
+with the MySQL backend) or the in-memory backend, so it needs neither
+network access nor a database server. The store is seeded with a
+configurable number of recipes and ingredients per recipe, each route is
+driven at a configurable concurrency, and the results are written as JSON
+so runs can be compared:
+
+    python3 benchmark.py --recipes 1000 --ingredients 8 --output results.json
+    python3 benchmark.py --compare benchmark_baseline.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import threading
+import uuid
+from datetime import datetime, timezone
+
+ROUTES = ['index', 'get_ingredients', 'view_db', 'add_recipe', 'save_to_db']
+
+INGREDIENT_WORDS = [
+    'bloem', 'melk', 'eieren', 'zout', 'aardappelen', 'boerenkool', 'rookworst',
+    'spekjes', 'prei', 'wortel', 'uien', 'rundvlees', 'gist', 'boter', 'appels',
+    'kaneel', 'pasta', 'kaas', 'tomaten', 'knoflook', 'rijst', 'kip', 'paprika'
+]
+
+
+# The revision is only re-read after writes, so storage calls per request do
+# not depend on how long a run takes; the periodic check is one call per second
+def write_config(workdir, args):
+    path = os.path.join(workdir, 'config.ini')
+    with open(path, 'w') as f:
+        f.write(f"""[STORAGE]
+BACKEND = {args.backend}
+PATH = {os.path.join(workdir, 'recipes.db')}
+
+[POOL]
+SIZE = {args.concurrency}
+MAX_OVERFLOW = {args.concurrency}
+
+[STAGING]
+PATH = {os.path.join(workdir, 'staging.db')}
+
+[CACHE]
+REVISION_CHECK_SECONDS = 3600
+""")
+    return path
+
+
+def seed(storage, recipes, ingredients_per_recipe, rng):
+    """Save recipes drawn from a catalog of ingredients_per_recipe * 4 names per word"""
+    catalog = [f'{word}-{n}' for n in range(max(1, ingredients_per_recipe * 4)) for word in INGREDIENT_WORDS]
+    categories = {name: rng.choice(['zuivel', 'droge-waren', 'vlees-vis', None]) for name in catalog}
+    chunk = []
+    for recipe_id in range(1, recipes + 1):
+        names = rng.sample(catalog, min(ingredients_per_recipe, len(catalog)))
+        chunk.append((uuid.uuid4().hex, {
+            'name': f'Recept {recipe_id:06d}',
+            'ingredients': [{'name': name, 'category': categories[name]} for name in names]
+        }))
+        if len(chunk) == 500 or recipe_id == recipes:
+            storage.save_recipes(chunk)
+            chunk = []
+
+
+def storage_calls(state):
+    """Storage calls recorded so far, over every query type of the latency histogram"""
+    return sum(child.count for _, child in state.db_query_seconds.children())
+
+
+def random_recipe(rng, ingredients_per_recipe):
+    return {
+        'name': f'Benchmark {rng.randrange(10 ** 9)}',
+        'ingredients': [
+            {'name': rng.choice(INGREDIENT_WORDS), 'category': 'overig'}
+            for _ in range(ingredients_per_recipe)
+        ]
+    }
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(fraction * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def run_route(app, route, args, seed):
+    """Drive one route with args.requests requests; returns its result summary"""
+    # save_to_db commits everything that is staged, so its requests run one
+    # at a time, each after staging a fresh batch outside the timed section
+    concurrency = 1 if route == 'save_to_db' else args.concurrency
+    per_worker = [args.requests // concurrency + (1 if n < args.requests % concurrency else 0)
+                  for n in range(concurrency)]
+    latencies, errors = [], []
+    lock = threading.Lock()
+    state = app.extensions['recipes']
+    calls_before = storage_calls(state)
+
+    def worker(count, worker_seed):
+        rng = random.Random(worker_seed)
+        client = app.test_client()
+        for _ in range(count):
+            if route == 'save_to_db':
+                state.staging.extend([
+                    random_recipe(rng, args.ingredients) for _ in range(args.save_batch)
+                ])
+            started = time.perf_counter()
+            if route == 'index':
+                response = client.get('/')
+            elif route == 'get_ingredients':
+                recipe_ids = rng.sample(range(1, args.recipes + 1), min(3, args.recipes))
+                response = client.post('/get_ingredients', json={'recipe_ids': recipe_ids})
+            elif route == 'view_db':
+                response = client.get('/view_db')
+            elif route == 'add_recipe':
+                response = client.post('/add_recipe', json=random_recipe(rng, args.ingredients))
+            else:
+                response = client.post('/save_to_db')
+            elapsed = time.perf_counter() - started
+
+            failed = response.status_code >= 400
+            if response.is_json and response.get_json().get('success') is False:
+                failed = True
+            with lock:
+                latencies.append(elapsed)
+                if failed:
+                    errors.append(response.status_code)
+
+    threads = [
+        threading.Thread(target=worker, args=(count, seed * 1000 + n))
+        for n, count in enumerate(per_worker) if count
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall_time = time.perf_counter() - started
+
+    latencies.sort()
+    requests = len(latencies)
+    timed = wall_time if route != 'save_to_db' else sum(latencies)
+    return {
+        'requests': requests,
+        'errors': len(errors),
+        'concurrency': concurrency,
+        'requests_per_second': round(requests / timed, 2) if timed else 0.0,
+        'mean_ms': round(1000 * sum(latencies) / requests, 3) if requests else 0.0,
+        'p50_ms': round(1000 * percentile(latencies, 0.50), 3),
+        'p95_ms': round(1000 * percentile(latencies, 0.95), 3),
+        'p99_ms': round(1000 * percentile(latencies, 0.99), 3),
+        'storage_calls_per_request': round((storage_calls(state) - calls_before) / requests, 2) if requests else 0.0,
+    }
+
+
+def run(args):
+    """Run the configured benchmark and return the results document"""
+    workdir = tempfile.mkdtemp(prefix='recipes-bench-')
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from app import create_app, get_recipe_set_version
+
+    app = create_app(write_config(workdir, args))
+    storage = app.extensions['recipes'].storage
+    seed(storage, args.recipes, args.ingredients, random.Random(args.seed))
+    # Read the seeded revision before the first timed route
+    with app.app_context():
+        get_recipe_set_version()
+
+    results = {}
+    try:
+        for route in args.routes:
+            results[route] = run_route(app, route, args, args.seed)
+            print(f"{route:16} {results[route]['requests_per_second']:>9.1f} req/s  "
+                  f"p50 {results[route]['p50_ms']:>8.2f} ms  p95 {results[route]['p95_ms']:>8.2f} ms  "
+                  f"p99 {results[route]['p99_ms']:>8.2f} ms  "
+                  f"{results[route]['storage_calls_per_request']:>6.2f} storage calls/req  "
+                  f"{results[route]['errors']} errors", file=sys.stderr)
+    finally:
+        storage.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'config': {
+            'backend': args.backend,
+            'recipes': args.recipes,
+            'ingredients_per_recipe': args.ingredients,
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+            'save_batch': args.save_batch,
+            'seed': args.seed,
+        },
+        'routes': results,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """List p95 latency and throughput regressions beyond tolerance (a fraction)"""
+    regressions = []
+    for route, current in results['routes'].items():
+        previous = baseline.get('routes', {}).get(route)
+        if not previous:
+            continue
+        if previous['p95_ms'] and current['p95_ms'] > previous['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{route}: p95 {previous['p95_ms']} -> {current['p95_ms']} ms")
+        if current['requests_per_second'] < previous['requests_per_second'] * (1 - tolerance):
+            regressions.append(
+                f"{route}: {previous['requests_per_second']} -> {current['requests_per_second']} req/s"
+            )
+        if current['storage_calls_per_request'] > previous.get('storage_calls_per_request', float('inf')):
+            regressions.append(
+                f"{route}: storage calls/request {previous['storage_calls_per_request']} -> {current['storage_calls_per_request']}"
+            )
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backend', choices=['sqlite', 'memory'], default='sqlite',
+                        help='storage backend to run against (default sqlite)')
+    parser.add_argument('--recipes', type=int, default=1000, help='recipes to seed (default 1000)')
+    parser.add_argument('--ingredients', type=int, default=8, help='ingredients per recipe (default 8)')
+    parser.add_argument('--requests', type=int, default=200, help='requests per route (default 200)')
+    parser.add_argument('--concurrency', type=int, default=4, help='concurrent clients (default 4)')
+    parser.add_argument('--save-batch', type=int, default=20, help='recipes staged before each save_to_db')
+    parser.add_argument('--routes', default=','.join(ROUTES), help='comma-separated routes to run')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='write the JSON results to this file instead of stdout')
+    parser.add_argument('--compare', help='baseline JSON file to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed slowdown before --compare reports a regression (default 0.25)')
+    args = parser.parse_args(argv)
+    args.routes = [route for route in args.routes.split(',') if route]
+    unknown = set(args.routes) - set(ROUTES)
+    if unknown:
+        parser.error(f"unknown routes: {', '.join(sorted(unknown))}")
+
+    results = run(args)
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,132 @@
+import time
+import threading
+from collections import OrderedDict
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after `ttl` seconds.
+
+    Holds at most `maxsize` entries; the least recently used entry is evicted
+    first. Hit, miss, expiry and eviction counters are kept for stats().
+    """
+
+    def __init__(self, maxsize=1024, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._expired = 0
+        self._evictions = 0
+
+    def get(self, key, default=None):
+        """Return the cached value for key, or default if it is missing or expired"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._data.move_to_end(key)
+                    self._hits += 1
+                    return value
+                del self._data[key]
+                self._expired += 1
+            self._misses += 1
+            return default
+
+    def set(self, key, value):
+        """Store a value, evicting the least recently used entries if full"""
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self._evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        """Snapshot of cache counters"""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'entries': len(self._data),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_ratio': round(self._hits / lookups, 4) if lookups else 0.0,
+                'expired': self._expired,
+                'evictions': self._evictions,
+            }
+
+
+class SingleFlightTimeout(Exception):
+    """Raised to a waiter when the in-flight call it joined takes too long"""
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesce concurrent identical calls into one execution.
+
+    The first caller for a key runs the function; callers that arrive while
+    it is still running wait for that result instead of running it again.
+    Exceptions are re-raised in every waiter. Waiters give up after
+    `timeout` seconds with SingleFlightTimeout.
+    """
+
+    def __init__(self, timeout=10.0):
+        self.timeout = timeout
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._executed = 0
+        self._coalesced = 0
+        self._timeouts = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self._coalesced += 1
+
+        if leader:
+            try:
+                call.result = fn()
+            except BaseException as err:
+                call.error = err
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                    self._executed += 1
+                call.done.set()
+        elif not call.done.wait(self.timeout):
+            with self._lock:
+                self._timeouts += 1
+            raise SingleFlightTimeout(f"Timed out after {self.timeout}s waiting for an in-flight call")
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def stats(self):
+        with self._lock:
+            return {
+                'in_flight': len(self._calls),
+                'executed': self._executed,
+                'coalesced': self._coalesced,
+                'timeouts': self._timeouts,
+            }
@@ -0,0 +1,100 @@
+from suggestions import normalize_name
+
+# Ingredient category mapping
+INGREDIENT_CATEGORIES = {
+    "droge-waren": "Droge waren",
+    "verse-groenten-fruit": "Verse groenten en fruit",
+    "vlees-vis": "Vlees en vis",
+    "zuivel": "Zuivel",
+    "brood-bakkerij": "Brood en bakkerij",
+    "diepvries": "Diepvries",
+    "conserven": "Conserven",
+    "dranken": "Dranken",
+    "snacks": "Snacks",
+    "ontbijt": "Ontbijt",
+    "broodbeleg": "Broodbeleg",
+    "baby": "Baby",
+    "kruiden": "Kruiden",
+    "non-food": "Non-food",
+    "overig": "Overig"
+}
+
+DEFAULT_CATEGORY = 'overig'
+
+# Categories of common ingredients, used until a recipe assigns one
+KNOWN_INGREDIENTS = {
+    'aardappelen': 'verse-groenten-fruit',
+    'appels': 'verse-groenten-fruit',
+    'bloem': 'droge-waren',
+    'boerenkool': 'verse-groenten-fruit',
+    'boter': 'zuivel',
+    'bouillon': 'droge-waren',
+    'cacao': 'droge-waren',
+    'eieren': 'zuivel',
+    'gist': 'droge-waren',
+    'kaas': 'zuivel',
+    'kaneel': 'kruiden',
+    'kip': 'vlees-vis',
+    'knoflook': 'verse-groenten-fruit',
+    'melk': 'zuivel',
+    'pancetta': 'vlees-vis',
+    'paneermeel': 'brood-bakkerij',
+    'paprika': 'verse-groenten-fruit',
+    'parmezaan': 'zuivel',
+    'pasta': 'droge-waren',
+    'peper': 'kruiden',
+    'prei': 'verse-groenten-fruit',
+    'rijst': 'droge-waren',
+    'rookworst': 'vlees-vis',
+    'rundvlees': 'vlees-vis',
+    'spekjes': 'vlees-vis',
+    'spliterwten': 'droge-waren',
+    'suiker': 'droge-waren',
+    'tomaten': 'verse-groenten-fruit',
+    'uien': 'verse-groenten-fruit',
+    'varkensvlees': 'vlees-vis',
+    'wortel': 'verse-groenten-fruit',
+    'wortelen': 'verse-groenten-fruit',
+    'zout': 'kruiden',
+}
+
+_LABELS = {normalize_name(label): key for key, label in INGREDIENT_CATEGORIES.items()}
+
+
+def category_key(category):
+    """The INGREDIENT_CATEGORIES key for a category given as a key or a label, or None"""
+    if not category:
+        return None
+    text = normalize_name(category)
+    key = text.replace(' ', '-')
+    if key in INGREDIENT_CATEGORIES:
+        return key
+    return _LABELS.get(text)
+
+
+def chosen_category(category):
+    """The category key a recipe picked, or None when the catalog should decide.
+
+    'overig' is what an unclassified ingredient gets, so it never overrides
+    a category the catalog already knows.
+    """
+    key = category_key(category)
+    return None if key == DEFAULT_CATEGORY else key
+
+
+def resolve_categories(items, stored):
+    """Resolve the category of every ingredient once, when it is written.
+
+    items holds (normalized name, category as given) pairs and stored the
+    categories the catalog already has for those names. A category picked
+    by a recipe wins, then the stored one, then KNOWN_INGREDIENTS, then
+    'overig'. Returns {name: category key} for every name in items.
+    """
+    resolved = {}
+    for name, category in items:
+        chosen = chosen_category(category)
+        if chosen:
+            resolved[name] = chosen
+        elif name not in resolved:
+            resolved[name] = chosen_category(stored.get(name)) or KNOWN_INGREDIENTS.get(name, DEFAULT_CATEGORY)
+    return resolved
@@ -0,0 +1,181 @@
+import time
+import threading
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no connection becomes available within the pool timeout"""
+
+
+class PooledConnection:
+    """Wrapper around a raw connection that hands it back to the pool on close()"""
+
+    def __init__(self, pool, raw, created_at):
+        self._pool = pool
+        self._raw = raw
+        self._created_at = created_at
+        self._released = False
+
+    def __getattr__(self, name):
+        # Everything except close() is delegated to the real connection
+        return getattr(self._raw, name)
+
+    def close(self):
+        """Return the connection to the pool (safe to call more than once)"""
+        if not self._released:
+            self._released = True
+            self._pool._release(self._raw, self._created_at)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class ConnectionPool:
+    """Thread-safe pool of reusable database connections.
+
+    Keeps up to `size` idle connections around and allows `max_overflow` extra
+    connections under load; overflow connections are closed again once they are
+    returned. Connections are validated when borrowed (if enabled) and replaced
+    once they are older than `recycle` seconds.
+    """
+
+    def __init__(self, connect, size=5, max_overflow=5, timeout=10.0,
+                 validate_on_borrow=True, recycle=3600):
+        self._connect = connect
+        self.size = size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.validate_on_borrow = validate_on_borrow
+        self.recycle = recycle
+
+        self._cond = threading.Condition()
+        self._idle = []  # (raw connection, created_at) pairs, most recent last
+        self._open = 0
+
+        self._acquired = 0
+        self._waits = 0
+        self._wait_time = 0.0
+        self._timeouts = 0
+        self._recycled = 0
+        self._invalidated = 0
+
+    def acquire(self):
+        """Borrow a connection, waiting up to `timeout` seconds if the pool is exhausted"""
+        start = time.monotonic()
+        waited = False
+        with self._cond:
+            while True:
+                if self._idle:
+                    raw, created_at = self._idle.pop()
+                    break
+                if self._open < self.size + self.max_overflow:
+                    # Reserve a slot and open the connection outside the lock
+                    self._open += 1
+                    raw, created_at = None, None
+                    break
+                remaining = self.timeout - (time.monotonic() - start)
+                if remaining <= 0:
+                    self._timeouts += 1
+                    self._record_wait(start, waited)
+                    raise PoolTimeoutError(
+                        f"Timed out after {self.timeout}s waiting for a database connection"
+                    )
+                waited = True
+                self._cond.wait(remaining)
+            self._record_wait(start, waited)
+
+        try:
+            if raw is not None:
+                raw, created_at = self._checkout(raw, created_at)
+            if raw is None:
+                raw, created_at = self._connect(), time.monotonic()
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            raise
+
+        with self._cond:
+            self._acquired += 1
+        return PooledConnection(self, raw, created_at)
+
+    def _record_wait(self, start, waited):
+        # Called with the condition held
+        if waited:
+            self._waits += 1
+            self._wait_time += time.monotonic() - start
+
+    def _checkout(self, raw, created_at):
+        """Recycle or validate an idle connection; returns (None, None) if it was discarded"""
+        if self.recycle and time.monotonic() - created_at > self.recycle:
+            self._discard(raw)
+            with self._cond:
+                self._recycled += 1
+            return None, None
+        if self.validate_on_borrow and not self._is_alive(raw):
+            self._discard(raw)
+            with self._cond:
+                self._invalidated += 1
+            return None, None
+        return raw, created_at
+
+    @staticmethod
+    def _is_alive(raw):
+        try:
+            return raw.is_connected()
+        except Exception:
+            return False
+
+    @staticmethod
+    def _discard(raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def _release(self, raw, created_at):
+        # Never hand out a connection with a half-finished transaction
+        try:
+            raw.rollback()
+            reusable = True
+        except Exception:
+            reusable = False
+
+        with self._cond:
+            if reusable and len(self._idle) < self.size:
+                self._idle.append((raw, created_at))
+                raw = None
+            else:
+                self._open -= 1
+            self._cond.notify()
+
+        if raw is not None:
+            self._discard(raw)
+
+    def close_all(self):
+        """Close every idle connection; borrowed connections are closed when returned"""
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+        for raw, _ in idle:
+            self._discard(raw)
+
+    def stats(self):
+        """Snapshot of pool usage counters"""
+        with self._cond:
+            idle = len(self._idle)
+            return {
+                'size': self.size,
+                'max_overflow': self.max_overflow,
+                'open': self._open,
+                'idle': idle,
+                'in_use': self._open - idle,
+                'acquired': self._acquired,
+                'waits': self._waits,
+                'wait_time': round(self._wait_time, 6),
+                'timeouts': self._timeouts,
+                'recycled': self._recycled,
+                'invalidated': self._invalidated,
+            }
@@ -0,0 +1,124 @@
+import gzip
+import json
+import zlib
+
+from flask.json.provider import DefaultJSONProvider
+
+from profiling import phase
+
+try:
+    import orjson
+except ImportError:  # optional: the standard library encoder is used instead
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # optional: responses are gzipped instead
+    brotli = None
+
+# Mimetypes worth compressing; images and archives are compressed already
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/x-ndjson', 'application/javascript', 'image/svg+xml')
+
+# Uncompressed bytes gathered before a streamed response is flushed to the client
+STREAM_FLUSH_SIZE = 16384
+
+if orjson is not None:
+    # Datetimes and dataclasses go through Flask's default() so the output
+    # matches the standard library provider
+    ORJSON_OPTIONS = (
+        orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS
+        | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+    )
+
+
+def dumps_bytes(obj):
+    """Compact UTF-8 JSON, with orjson when it is installed"""
+    with phase('json'):
+        if orjson is not None:
+            return orjson.dumps(obj, default=DefaultJSONProvider.default, option=ORJSON_OPTIONS)
+        return json.dumps(
+            obj, default=DefaultJSONProvider.default, ensure_ascii=False, sort_keys=True, separators=(',', ':')
+        ).encode('utf-8')
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that encodes with orjson when it is installed.
+
+    Falls back to the standard library for anything orjson rejects and for
+    calls with json.dumps options, such as indented debug output. Encoding
+    and decoding count towards the request's JSON phase on /debug/slow.
+    """
+
+    def dumps(self, obj, **kwargs):
+        with phase('json'):
+            if orjson is None or kwargs:
+                return super().dumps(obj, **kwargs)
+            try:
+                return orjson.dumps(obj, default=self.default, option=ORJSON_OPTIONS).decode('utf-8')
+            except orjson.JSONEncodeError:
+                return super().dumps(obj)
+
+    def loads(self, s, **kwargs):
+        with phase('json'):
+            return super().loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        with phase('json'):
+            if orjson is None or self.compact is False or (self.compact is None and self._app.debug):
+                return super().response(*args, **kwargs)
+            obj = self._prepare_response_obj(args, kwargs)
+            try:
+                body = orjson.dumps(obj, default=self.default, option=ORJSON_OPTIONS | orjson.OPT_APPEND_NEWLINE)
+            except orjson.JSONEncodeError:
+                return super().response(*args, **kwargs)
+            return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def is_compressible(mimetype):
+    return bool(mimetype) and mimetype.startswith(COMPRESSIBLE_TYPES)
+
+
+def negotiate_encoding(accept_encodings, streamed=False):
+    """'br', 'gzip' or None for a request's Accept-Encoding.
+
+    Streamed responses are only gzipped, which can be flushed as it goes.
+    """
+    if brotli is not None and not streamed and accept_encodings['br']:
+        return 'br'
+    if accept_encodings['gzip']:
+        return 'gzip'
+    return None
+
+
+def compress(data, encoding, level=6):
+    if encoding == 'br':
+        # Brotli quality runs 0-11; level is on gzip's 1-9 scale
+        return brotli.compress(data, quality=min(11, level + 1))
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def gzip_stream(chunks, level=6):
+    """Gzip an iterable of str or bytes chunks, flushing every STREAM_FLUSH_SIZE bytes.
+
+    Closing the stream closes chunks too, so a response body that ends
+    its request on close (stream_with_context) still does when compressed.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    compressed = []
+    pending = 0
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            compressed.append(compressor.compress(chunk))
+            pending += len(chunk)
+            if pending >= STREAM_FLUSH_SIZE:
+                compressed.append(compressor.flush(zlib.Z_SYNC_FLUSH))
+                yield b''.join(compressed)
+                compressed = []
+                pending = 0
+        compressed.append(compressor.flush())
+        yield b''.join(compressed)
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
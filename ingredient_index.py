@@ -0,0 +1,166 @@
+import bisect
+import heapq
+import threading
+from itertools import islice
+from collections import Counter
+
+from suggestions import normalize_name
+
+
+class IngredientIndex:
+    """Inverted index from ingredient name to the recipes that use it.
+
+    Answers "what can I make with ..." queries from the postings of the
+    queried ingredients only. Every posting list is also kept sorted by the
+    recipes' tie-break order, so the many recipes that share just one
+    common ingredient are paged straight from the list instead of being
+    ranked. Recipes are added and removed one at a time, so the index can
+    follow writes without being rebuilt.
+    """
+
+    def __init__(self, recipes=()):
+        """recipes: iterable of (recipe_id, name, ingredient names) to start from"""
+        self._postings = {}  # normalized ingredient name -> set of recipe ids
+        self._ordered = {}  # normalized ingredient name -> sorted order keys of those recipes
+        self._recipes = {}  # recipe id -> (name, frozenset of ingredient names, order key)
+        self._lock = threading.Lock()
+
+        # Bulk load: append everything, then sort each posting list once
+        for recipe_id, name, ingredients in recipes:
+            keys, order_key = self._entry(recipe_id, name, ingredients)
+            self._recipes[recipe_id] = (name, keys, order_key)
+            for key in keys:
+                self._postings.setdefault(key, set()).add(recipe_id)
+                self._ordered.setdefault(key, []).append(order_key)
+        for ordered in self._ordered.values():
+            ordered.sort()
+
+    def __len__(self):
+        return len(self._recipes)
+
+    @staticmethod
+    def _entry(recipe_id, name, ingredients):
+        keys = frozenset(
+            key for key in (normalize_name(ingredient) for ingredient in ingredients) if key
+        )
+        # Among recipes matching equally many query ingredients, those with the
+        # fewest ingredients of their own (highest coverage) come first
+        return keys, (len(keys), normalize_name(name), recipe_id)
+
+    def add(self, recipe_id, name, ingredients):
+        """Index a recipe, replacing any earlier version with the same id"""
+        keys, order_key = self._entry(recipe_id, name, ingredients)
+        with self._lock:
+            self._remove(recipe_id)
+            self._recipes[recipe_id] = (name, keys, order_key)
+            for key in keys:
+                self._postings.setdefault(key, set()).add(recipe_id)
+                bisect.insort(self._ordered.setdefault(key, []), order_key)
+
+    def remove(self, recipe_id):
+        with self._lock:
+            self._remove(recipe_id)
+
+    def _remove(self, recipe_id):
+        # Called with the lock held
+        entry = self._recipes.pop(recipe_id, None)
+        if entry is None:
+            return
+        _, keys, order_key = entry
+        for key in keys:
+            postings = self._postings[key]
+            postings.discard(recipe_id)
+            ordered = self._ordered[key]
+            del ordered[bisect.bisect_left(ordered, order_key)]
+            if not postings:
+                del self._postings[key]
+                del self._ordered[key]
+
+    def search(self, ingredients, limit=20, offset=0, match_all=False):
+        """Recipes containing the most of the given ingredients.
+
+        Ranked by how many query ingredients a recipe contains, then by the
+        share of its own ingredients the query covers, then by name. With
+        match_all only recipes containing every query ingredient are returned.
+        Returns (total, results) where results is one page of
+        {'id', 'name', 'matched', 'ingredient_count'} dicts.
+        """
+        terms = list(dict.fromkeys(key for key in map(normalize_name, ingredients) if key))
+        if not terms:
+            return 0, []
+        wanted = offset + limit
+
+        with self._lock:
+            by_size = sorted(terms, key=lambda term: len(self._postings.get(term, ())))
+            if match_all:
+                total, ranked = self._search_all(by_size, wanted)
+            else:
+                total, ranked = self._search_any(by_size, wanted)
+
+            results = []
+            for order_key in ranked[offset:wanted]:
+                name, keys, _ = self._recipes[order_key[-1]]
+                results.append({
+                    'id': order_key[-1],
+                    'name': name,
+                    'matched': [term for term in terms if term in keys],
+                    'ingredient_count': len(keys),
+                })
+        return total, results
+
+    def _search_all(self, by_size, wanted):
+        """Walk the rarest ingredient's ordered postings, keeping recipes that have the rest too"""
+        rarest = self._postings.get(by_size[0], set())
+        others = [self._postings.get(term, set()) for term in by_size[1:]]
+        total = len(rarest.intersection(*others))
+        matches = (
+            order_key for order_key in self._ordered.get(by_size[0], ())
+            if all(order_key[-1] in recipe_ids for recipe_ids in others)
+        )
+        return total, list(islice(matches, wanted))
+
+    def _search_any(self, by_size, wanted):
+        """Recipes with the most query ingredients first.
+
+        With up to two ingredients there are only two groups, recipes with
+        both and recipes with one, and each is paged lazily from the ordered
+        postings. Longer queries count matches over every posting list
+        except the largest one: recipes that only appear in the largest list
+        match exactly one ingredient, so they are merged in, in order,
+        straight from its ordered postings.
+        """
+        postings = [self._postings.get(term, set()) for term in by_size]
+        if len(by_size) <= 2:
+            total = len(set().union(*postings))
+            _, ranked = self._search_all(by_size, wanted)
+            if len(ranked) < wanted:
+                singles = (
+                    order_key for order_key in heapq.merge(*(self._ordered.get(term, ()) for term in by_size))
+                    if not all(order_key[-1] in recipe_ids for recipe_ids in postings)
+                )
+                ranked.extend(islice(singles, wanted - len(ranked)))
+            return total, ranked
+
+        largest_term, largest = by_size[-1], postings[-1]
+        counts = Counter()
+        for recipe_ids in postings[:-1]:
+            counts.update(recipe_ids)
+        in_largest = counts.keys() & largest
+        for recipe_id in in_largest:
+            counts[recipe_id] += 1
+        total = len(counts) + len(largest) - len(in_largest)
+
+        ranked = heapq.nsmallest(wanted, (
+            (-count, self._recipes[recipe_id][2]) for recipe_id, count in counts.items() if count > 1
+        ))
+        ranked = [order_key for _, order_key in ranked]
+        if len(ranked) < wanted:
+            singles = heapq.nsmallest(wanted - len(ranked), (
+                self._recipes[recipe_id][2] for recipe_id, count in counts.items() if count == 1
+            ))
+            rest = (
+                order_key for order_key in self._ordered.get(largest_term, ())
+                if order_key[-1] not in counts
+            )
+            ranked.extend(islice(heapq.merge(singles, rest), wanted - len(ranked)))
+        return total, ranked
@@ -0,0 +1,243 @@
+import os
+import json
+import time
+import uuid
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# Finished jobs are kept this long for /jobs/<id>
+JOB_RETENTION_SECONDS = 7 * 24 * 3600
+
+
+class JobQueueFull(Exception):
+    """Raised by JobQueue.submit() when too many jobs are waiting"""
+
+
+class JobStore:
+    """Background jobs and their progress, kept in a local SQLite file.
+
+    A job is queued, running, done or failed. Running jobs record the pid of
+    the process that claimed them, so a job whose process died can be run
+    again. Like the staging store it opens a connection per operation and
+    is safe to share between threads and worker processes.
+    """
+
+    def __init__(self, path, timeout=10.0):
+        self.path = path
+        self.timeout = timeout
+        self._initialized = False
+        self._init_lock = threading.Lock()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+        if not self._initialized:
+            with self._init_lock:
+                if not self._initialized:
+                    conn.execute('PRAGMA journal_mode=WAL')
+                    conn.execute('''
+                    CREATE TABLE IF NOT EXISTS jobs (
+                        id TEXT PRIMARY KEY,
+                        kind TEXT NOT NULL,
+                        status TEXT NOT NULL,
+                        payload TEXT NOT NULL,
+                        progress TEXT NOT NULL,
+                        error TEXT,
+                        owner INTEGER,
+                        created_at REAL NOT NULL,
+                        started_at REAL,
+                        finished_at REAL
+                    )
+                    ''')
+                    self._initialized = True
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield conn
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            conn.execute('COMMIT')
+        finally:
+            conn.close()
+
+    def create(self, kind, payload):
+        """Store a new queued job and return its id"""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                'DELETE FROM jobs WHERE finished_at < ?', (now - JOB_RETENTION_SECONDS,)
+            )
+            conn.execute(
+                "INSERT INTO jobs (id, kind, status, payload, progress, created_at) VALUES (?, ?, 'queued', ?, '{}', ?)",
+                (job_id, kind, json.dumps(payload), now)
+            )
+        return job_id
+
+    def delete(self, job_id):
+        with self._transaction() as conn:
+            conn.execute('DELETE FROM jobs WHERE id = ?', (job_id,))
+
+    def get(self, job_id):
+        """The job as a dict, or None"""
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                'SELECT id, kind, status, payload, progress, error, created_at, started_at, finished_at '
+                'FROM jobs WHERE id = ?', (job_id,)
+            ).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return None
+        job_id, kind, status, payload, progress, error, created_at, started_at, finished_at = row
+        return {
+            'id': job_id,
+            'kind': kind,
+            'status': status,
+            'payload': json.loads(payload),
+            'progress': json.loads(progress),
+            'error': error,
+            'created_at': created_at,
+            'started_at': started_at,
+            'finished_at': finished_at,
+        }
+
+    def claim(self, job_id):
+        """Mark a queued job as running in this process; False if another process has it"""
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = 'running', owner = ?, started_at = ? WHERE id = ? AND status = 'queued'",
+                (os.getpid(), time.time(), job_id)
+            )
+            return cursor.rowcount > 0
+
+    def update_progress(self, job_id, progress):
+        with self._transaction() as conn:
+            conn.execute('UPDATE jobs SET progress = ? WHERE id = ?', (json.dumps(progress), job_id))
+
+    def finish(self, job_id, progress, error=None):
+        with self._transaction() as conn:
+            conn.execute(
+                'UPDATE jobs SET status = ?, progress = ?, error = ?, owner = NULL, finished_at = ? WHERE id = ?',
+                ('failed' if error else 'done', json.dumps(progress), error, time.time(), job_id)
+            )
+
+    def requeue_orphans(self):
+        """Queue running jobs again whose process is gone; returns the ids of all queued jobs"""
+        with self._transaction() as conn:
+            for job_id, owner in conn.execute("SELECT id, owner FROM jobs WHERE status = 'running'").fetchall():
+                # Nothing has been claimed by this process yet, so its own pid means an earlier one
+                if owner == os.getpid() or not _process_alive(owner):
+                    conn.execute("UPDATE jobs SET status = 'queued', owner = NULL WHERE id = ?", (job_id,))
+            rows = conn.execute("SELECT id FROM jobs WHERE status = 'queued' ORDER BY created_at").fetchall()
+        return [job_id for job_id, in rows]
+
+
+def _process_alive(pid):
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobQueue:
+    """Runs jobs from a JobStore on background worker threads.
+
+    run(job, progress) does the work for one job; progress(dict) records
+    how far it got. Ids wait in a bounded in-memory queue, so submit()
+    raises JobQueueFull rather than letting work pile up. The jobs
+    themselves live in the store: resume() picks up the ones a previous
+    process left queued or running, so a job must be safe to run again.
+    Workers start on first use.
+    """
+
+    def __init__(self, store, run, workers=1, max_pending=100):
+        self.store = store
+        self.run = run
+        self.workers = workers
+        self._pending = queue.Queue(maxsize=max_pending)
+        self._threads = []
+        self._start_lock = threading.Lock()
+
+    def _start(self):
+        with self._start_lock:
+            if self._threads:
+                return
+            for n in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f'job-worker-{n}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, kind, payload):
+        """Persist and queue a job; returns its id"""
+        if self._pending.full():
+            raise JobQueueFull(f'{self._pending.maxsize} jobs are already waiting')
+        job_id = self.store.create(kind, payload)
+        try:
+            self._pending.put_nowait(job_id)
+        except queue.Full:
+            self.store.delete(job_id)
+            raise JobQueueFull(f'{self._pending.maxsize} jobs are already waiting') from None
+        self._start()
+        return job_id
+
+    def resume(self):
+        """Queue the jobs an earlier process did not finish; returns how many"""
+        job_ids = self.store.requeue_orphans()
+        queued = 0
+        for job_id in job_ids:
+            try:
+                self._pending.put_nowait(job_id)
+            except queue.Full:
+                # Still queued in the store; the next restart picks them up
+                break
+            queued += 1
+        if queued:
+            self._start()
+        return queued
+
+    def _work(self):
+        while True:
+            job_id = self._pending.get()
+            try:
+                self._run_job(job_id)
+            except Exception as e:
+                print(f"Error running job {job_id}: {e}")
+            finally:
+                self._pending.task_done()
+
+    def _run_job(self, job_id):
+        if not self.store.claim(job_id):
+            return
+        job = self.store.get(job_id)
+        progress = dict(job['progress'])
+
+        def report(update):
+            progress.update(update)
+            self.store.update_progress(job_id, progress)
+
+        try:
+            result = self.run(job, report)
+        except Exception as e:
+            print(f"Job {job_id} failed: {e}")
+            self.store.finish(job_id, progress, error=str(e))
+            return
+        progress.update(result or {})
+        self.store.finish(job_id, progress, error=progress.get('error'))
+
+    def join(self):
+        """Wait until every queued job has run"""
+        self._pending.join()
@@ -0,0 +1,122 @@
+"""Shopping lists and saved menus.
+
+A menu is a saved selection of recipes together with its materialized
+shopping list, in the shape build_shopping_list() returns. The list is kept
+current by applying changes to it: updated_menu() drops recipes that were
+deleted and moves ingredients whose category changed, so a menu is never
+rebuilt from its recipes after it has been created.
+"""
+from catalog import INGREDIENT_CATEGORIES, DEFAULT_CATEGORY
+from storage import parse_ingredient
+
+
+def build_shopping_list(recipe_ids, ingredients_by_recipe):
+    """Merge the ingredients of several recipes into one deduplicated list.
+
+    Items are deduplicated on their case-folded name, grouped by category in
+    INGREDIENT_CATEGORIES order and record which recipes contributed them.
+    Returns (categories, text) where text is the copy/paste version of the list.
+    """
+    items = {}
+    for recipe_id in recipe_ids:
+        for ingredient in ingredients_by_recipe.get(recipe_id, []):
+            name, category = parse_ingredient(ingredient)
+            if not name:
+                continue
+            item = items.get(name.lower())
+            if item is None:
+                item = items[name.lower()] = {
+                    'name': name,
+                    # Resolved when the recipe was saved; rows from before the
+                    # catalog are fixed by the reclassify-ingredients command
+                    'category': category if category in INGREDIENT_CATEGORIES else DEFAULT_CATEGORY,
+                    'recipe_ids': []
+                }
+            if recipe_id not in item['recipe_ids']:
+                item['recipe_ids'].append(recipe_id)
+    return group_items(items.values())
+
+
+def group_items(items):
+    """Group shopping list items by category; returns (categories, text)"""
+    grouped = {}
+    for item in items:
+        item['count'] = len(item['recipe_ids'])
+        grouped.setdefault(item['category'], []).append(item)
+
+    categories = []
+    text_parts = []
+    for key, label in INGREDIENT_CATEGORIES.items():
+        if key not in grouped:
+            continue
+        category_items = sorted(grouped[key], key=lambda item: item['name'].lower())
+        categories.append({'key': key, 'name': label, 'items': category_items})
+        text_parts.append(label + '\n' + ''.join(f"- {item['name']}\n" for item in category_items))
+
+    return categories, '\n'.join(text_parts).strip()
+
+
+def updated_menu(menu, removed=(), categories=None):
+    """Apply deleted recipes and changed ingredient categories to a menu.
+
+    removed holds ids of recipes that no longer exist and categories maps
+    ingredient names to their current category. Returns the new
+    (recipe_ids, shopping_list) or None when the menu is unaffected.
+    """
+    removed = set(removed)
+    categories = categories or {}
+    changed = False
+    items = []
+    for category in menu['shopping_list']['categories']:
+        for item in category['items']:
+            recipe_ids = [recipe_id for recipe_id in item['recipe_ids'] if recipe_id not in removed]
+            if not recipe_ids:
+                changed = True
+                continue
+            new_category = categories.get(item['name'].lower(), item['category'])
+            if new_category not in INGREDIENT_CATEGORIES:
+                new_category = DEFAULT_CATEGORY
+            if recipe_ids != item['recipe_ids'] or new_category != item['category']:
+                changed = True
+            items.append({'name': item['name'], 'category': new_category, 'recipe_ids': recipe_ids})
+
+    recipe_ids = [recipe_id for recipe_id in menu['recipe_ids'] if recipe_id not in removed]
+    if not changed and recipe_ids == menu['recipe_ids']:
+        return None
+    grouped, text = group_items(items)
+    return recipe_ids, {'categories': grouped, 'text': text}
+
+
+def compact_ingredient_map(recipes):
+    """The ingredients of many recipes in a compact form, for merging lists client-side.
+
+    Every distinct ingredient is listed once in 'ingredients', with the index
+    of its category in 'categories' at the same position of 'category_codes';
+    'recipes' maps each recipe id to the indexes of its ingredients. Merging
+    the lists of a selection with the rules of build_shopping_list() gives
+    the same shopping list.
+    """
+    category_codes = {key: code for code, key in enumerate(INGREDIENT_CATEGORIES)}
+    indexes = {}
+    ingredients = []
+    codes = []
+    by_recipe = {}
+    for recipe in recipes:
+        recipe_indexes = []
+        for ingredient in recipe['ingredients']:
+            name, category = parse_ingredient(ingredient)
+            if not name:
+                continue
+            index = indexes.get(name.lower())
+            if index is None:
+                index = indexes[name.lower()] = len(ingredients)
+                ingredients.append(name)
+                codes.append(category_codes.get(category, category_codes[DEFAULT_CATEGORY]))
+            recipe_indexes.append(index)
+        by_recipe[str(recipe['id'])] = recipe_indexes
+    return {
+        'categories': list(INGREDIENT_CATEGORIES),
+        'ingredients': ingredients,
+        'category_codes': codes,
+        'recipes': by_recipe
+    }
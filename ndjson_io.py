@@ -0,0 +1,110 @@
+import json
+import hashlib
+
+CONTENT_TYPE = 'application/x-ndjson'
+
+
+def export_lines(recipes):
+    """Encode recipes as NDJSON, one {'id', 'name', 'ingredients'} object per line"""
+    for recipe in recipes:
+        yield json.dumps(
+            {'id': recipe['id'], 'name': recipe['name'], 'ingredients': recipe['ingredients']},
+            ensure_ascii=False, separators=(',', ':')
+        ) + '\n'
+
+
+def parse_recipe_line(line, categories):
+    """Validate one NDJSON line and return it as a recipe dict.
+
+    Ingredients may be names or {'name', 'category'} dicts; a category
+    must be empty or one of the keys of categories. Raises ValueError.
+    """
+    try:
+        data = json.loads(line)
+    except ValueError as err:
+        raise ValueError(f"invalid JSON: {err}") from None
+    if not isinstance(data, dict):
+        raise ValueError("expected a JSON object")
+    name = data.get('name')
+    if not isinstance(name, str) or not name.strip():
+        raise ValueError("'name' must be a non-empty string")
+    ingredients = data.get('ingredients', [])
+    if not isinstance(ingredients, list):
+        raise ValueError("'ingredients' must be a list")
+
+    parsed = []
+    for ingredient in ingredients:
+        if isinstance(ingredient, str):
+            ingredient = {'name': ingredient, 'category': None}
+        if not isinstance(ingredient, dict) or not isinstance(ingredient.get('name'), str):
+            raise ValueError("each ingredient must be a name or an object with a 'name'")
+        category = ingredient.get('category') or None
+        if category is not None and category not in categories:
+            raise ValueError(f"unknown category '{category}' for ingredient '{ingredient['name']}'")
+        if ingredient['name'].strip():
+            parsed.append({'name': ingredient['name'].strip(), 'category': category})
+    return {'name': name.strip(), 'ingredients': parsed}
+
+
+def recipe_key(recipe):
+    """Idempotency key derived from the recipe's content, so re-imported lines are skipped"""
+    canonical = json.dumps([recipe['name'], recipe['ingredients']], sort_keys=True, ensure_ascii=False)
+    return hashlib.md5(canonical.encode('utf-8')).hexdigest()
+
+
+def import_lines(lines, save, categories, batch_size=500, start_line=1, progress=None):
+    """Import NDJSON lines in batches, holding at most one batch in memory.
+
+    save(chunk) stores a list of (idempotency_key, recipe) pairs in one
+    transaction and returns the recipes it inserted; recipes already
+    imported are skipped, so an import can safely be repeated. Lines before
+    start_line and blank lines are skipped. progress(summary) is called
+    after every committed batch.
+
+    Returns a summary with the lines read, recipes imported and duplicates
+    skipped. If a line is invalid or a batch fails, every line before it
+    has been committed and the summary also holds 'error' and
+    'resume_line', the line to pass as start_line once it is fixed, plus
+    'bad_line' when the import stopped on an invalid line.
+    """
+    summary = {'lines': 0, 'imported': 0, 'skipped': 0, 'batches': 0}
+    batch = []
+
+    def flush():
+        try:
+            saved = save([(key, recipe) for _, key, recipe in batch])
+        except Exception as err:
+            summary['error'] = str(err)
+            summary['resume_line'] = batch[0][0]
+            return False
+        summary['imported'] += len(saved)
+        summary['skipped'] += len(batch) - len(saved)
+        summary['batches'] += 1
+        batch.clear()
+        if progress is not None:
+            progress(summary)
+        return True
+
+    for line_number, line in enumerate(lines, 1):
+        if line_number < start_line:
+            continue
+        if isinstance(line, bytes):
+            line = line.decode('utf-8', errors='replace')
+        summary['lines'] = line_number
+        if not line.strip():
+            continue
+        try:
+            recipe = parse_recipe_line(line, categories)
+        except ValueError as err:
+            if batch and not flush():
+                return summary
+            summary['error'] = f"line {line_number}: {err}"
+            summary['resume_line'] = summary['bad_line'] = line_number
+            return summary
+        batch.append((line_number, recipe_key(recipe), recipe))
+        if len(batch) >= batch_size and not flush():
+            return summary
+
+    if batch:
+        flush()
+    return summary
@@ -0,0 +1,202 @@
+"""Per-request timings, on-demand profiling and a log of slow requests.
+
+Every request records how long it spent in database calls, JSON encoding
+and decoding and template rendering (see phase()). A request can also be
+profiled with cProfile, and optionally tracemalloc: a sample of requests
+when a sample rate is configured, or a request an admin asks for.
+Requests slower than the threshold, and every request profiled on demand,
+are kept in a SlowRequestLog with their top functions and allocation
+sites.
+"""
+import io
+import time
+import pstats
+import cProfile
+import threading
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from flask import g, has_request_context
+
+PHASES = ('db', 'json', 'template')
+
+# cProfile cannot always profile two threads at once, so one request per
+# process is profiled at a time; others run unprofiled meanwhile
+_profiler_lock = threading.Lock()
+
+# tracemalloc traces the whole process; it runs while any request needs it
+_tracemalloc_lock = threading.Lock()
+_tracemalloc_users = 0
+
+
+class RequestProfile:
+    """Timings of one request, plus its cProfile/tracemalloc data when it is profiled"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.seconds = {phase: 0.0 for phase in PHASES}
+        self.calls = {phase: 0 for phase in PHASES}
+        self.trigger = None
+        self._active = set()
+        self._profiler = None
+        self._snapshot = None
+
+    def start_profiling(self, trigger, trace_memory=False):
+        """Profile the rest of the request; False if another request is being profiled"""
+        if not _profiler_lock.acquire(blocking=False):
+            return False
+        self.trigger = trigger
+        if trace_memory:
+            self._snapshot = _start_tracemalloc()
+        self._profiler = cProfile.Profile()
+        self._profiler.enable()
+        return True
+
+    @property
+    def profiled(self):
+        return self.trigger is not None
+
+    def stop_profiling(self, top_n):
+        """Stop profiling; returns (top functions, top allocation sites)"""
+        if self._profiler is None:
+            return [], []
+        self._profiler.disable()
+        _profiler_lock.release()
+        functions = top_functions(self._profiler, top_n)
+        allocations = []
+        if self._snapshot is not None:
+            allocations = top_allocations(self._snapshot, tracemalloc.take_snapshot(), top_n)
+            _stop_tracemalloc()
+        self._profiler = self._snapshot = None
+        return functions, allocations
+
+    def discard(self):
+        """Stop profiling without collecting results, e.g. when the request failed"""
+        if self._profiler is None:
+            return
+        self._profiler.disable()
+        _profiler_lock.release()
+        if self._snapshot is not None:
+            _stop_tracemalloc()
+        self._profiler = self._snapshot = None
+
+
+def _start_tracemalloc():
+    global _tracemalloc_users
+    with _tracemalloc_lock:
+        if _tracemalloc_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        _tracemalloc_users += 1
+    return tracemalloc.take_snapshot()
+
+
+def _stop_tracemalloc():
+    global _tracemalloc_users
+    with _tracemalloc_lock:
+        _tracemalloc_users -= 1
+        if _tracemalloc_users == 0:
+            tracemalloc.stop()
+
+
+@contextmanager
+def phase(name):
+    """Count the with block towards a phase of the current request, if there is one"""
+    profile = g.get('request_profile') if has_request_context() else None
+    # Nested blocks of the same phase, like dumps() inside response(), count once
+    if profile is None or name in profile._active:
+        yield
+        return
+    profile._active.add(name)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile._active.discard(name)
+        profile.seconds[name] += time.perf_counter() - started
+        profile.calls[name] += 1
+
+
+def connect_template_timing(app):
+    """Count template rendering towards the 'template' phase of app's requests"""
+    from flask import before_render_template, template_rendered
+
+    def started(sender, template, context, **extra):
+        g.template_started = time.perf_counter()
+
+    def rendered(sender, template, context, **extra):
+        profile = g.get('request_profile')
+        started_at = g.pop('template_started', None)
+        if profile is not None and started_at is not None:
+            profile.seconds['template'] += time.perf_counter() - started_at
+            profile.calls['template'] += 1
+
+    # Signals hold weak references by default; these closures live with the app
+    before_render_template.connect(started, app, weak=False)
+    template_rendered.connect(rendered, app, weak=False)
+
+
+def top_functions(profiler, limit):
+    """The functions with the most time of their own, as dicts"""
+    stats = pstats.Stats(profiler, stream=io.StringIO())
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:limit]
+    return [
+        {
+            'function': f'{filename}:{line}({name})',
+            'calls': calls,
+            'own_seconds': round(own, 6),
+            'cumulative_seconds': round(cumulative, 6),
+        }
+        for (filename, line, name), (_, calls, own, cumulative, _) in rows
+    ]
+
+
+def top_allocations(before, after, limit):
+    """The source lines that allocated the most memory between two snapshots"""
+    return [
+        {'location': str(stat.traceback), 'size_bytes': stat.size_diff, 'count': stat.count_diff}
+        for stat in after.compare_to(before, 'lineno')[:limit]
+        if stat.size_diff > 0
+    ]
+
+
+class SlowRequestLog:
+    """The most recent slow or profiled requests, newest first"""
+
+    def __init__(self, maxlen=50):
+        self._records = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+        self._next_id = 1
+
+    def add(self, record):
+        with self._lock:
+            record['id'] = self._next_id
+            self._next_id += 1
+            self._records.appendleft(record)
+        return record['id']
+
+    def recent(self):
+        with self._lock:
+            return list(self._records)
+
+
+def request_record(profile, method, path, endpoint, status, functions=(), allocations=()):
+    """What the slow request log keeps about a finished request"""
+    seconds = time.perf_counter() - profile.started
+    record = {
+        'time': datetime.now(timezone.utc).replace(microsecond=0).isoformat(),
+        'method': method,
+        'path': path,
+        'endpoint': endpoint,
+        'status': status,
+        'seconds': round(seconds, 6),
+        'trigger': profile.trigger,
+        'functions': list(functions),
+        'allocations': list(allocations),
+    }
+    for name in PHASES:
+        record[f'{name}_seconds'] = round(profile.seconds[name], 6)
+        record[f'{name}_calls'] = profile.calls[name]
+    record['other_seconds'] = round(max(0.0, seconds - sum(profile.seconds.values())), 6)
+    return record
@@ -0,0 +1,173 @@
+import os
+import json
+import uuid
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+
+class StagingStore:
+    """Recipes waiting to be committed to the database, kept in a local SQLite file.
+
+    Appends and deletes touch a single row instead of rewriting the whole
+    list, and SQLite's file locking makes the store safe to share between
+    threads and between WSGI worker processes. A legacy recipes.json file is
+    imported (and renamed to recipes.json.imported) the first time the store
+    is opened.
+
+    Every entry gets a random idempotency key when it is staged, so a commit
+    that is retried after a crash can recognise recipes it already saved.
+
+    If given, observe(operation, seconds) is called after every 'read' and
+    'write' so callers can record how long the store takes.
+    """
+
+    def __init__(self, path, legacy_json_path=None, timeout=10.0, observe=None):
+        self.path = path
+        self.legacy_json_path = legacy_json_path
+        self.timeout = timeout
+        self.observe = observe
+        self._initialized = False
+        self._init_lock = threading.Lock()
+
+    def _connect(self):
+        # A connection per operation: cheap for SQLite and safe across threads and forks
+        conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+        if not self._initialized:
+            with self._init_lock:
+                if not self._initialized:
+                    self._init_schema(conn)
+                    self._initialized = True
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        """Connection with a write transaction that commits on success"""
+        started = time.perf_counter()
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield conn
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            conn.execute('COMMIT')
+        finally:
+            conn.close()
+            self._observe('write', started)
+
+    def _observe(self, operation, started):
+        if self.observe is not None:
+            self.observe(operation, time.perf_counter() - started)
+
+    def _init_schema(self, conn):
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS staged_recipes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                ingredients TEXT NOT NULL,
+                idempotency_key TEXT
+            )
+            ''')
+            conn.execute('CREATE TABLE IF NOT EXISTS staging_meta (key TEXT PRIMARY KEY, value TEXT)')
+
+            # Stores created before idempotency keys existed get them backfilled
+            columns = [row[1] for row in conn.execute('PRAGMA table_info(staged_recipes)')]
+            if 'idempotency_key' not in columns:
+                conn.execute('ALTER TABLE staged_recipes ADD COLUMN idempotency_key TEXT')
+            conn.execute(
+                'UPDATE staged_recipes SET idempotency_key = lower(hex(randomblob(16))) '
+                'WHERE idempotency_key IS NULL'
+            )
+
+            imported = True
+            if self.legacy_json_path and os.path.exists(self.legacy_json_path):
+                imported = conn.execute(
+                    "SELECT 1 FROM staging_meta WHERE key = 'legacy_json_imported'"
+                ).fetchone()
+            if not imported:
+                try:
+                    with open(self.legacy_json_path, 'r') as f:
+                        recipes = json.load(f)
+                except (json.JSONDecodeError, FileNotFoundError):
+                    recipes = []
+                self._insert(conn, recipes)
+                conn.execute(
+                    "INSERT INTO staging_meta (key, value) VALUES ('legacy_json_imported', ?)",
+                    (str(len(recipes)),)
+                )
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+        if not imported:
+            try:
+                os.replace(self.legacy_json_path, self.legacy_json_path + '.imported')
+            except OSError:
+                pass
+            print(f"Imported {len(recipes)} staged recipes from {self.legacy_json_path}")
+
+    @staticmethod
+    def _insert(conn, recipes):
+        conn.executemany(
+            'INSERT INTO staged_recipes (name, ingredients, idempotency_key) VALUES (?, ?, ?)',
+            [
+                (recipe['name'], json.dumps(recipe['ingredients']), uuid.uuid4().hex)
+                for recipe in recipes
+            ]
+        )
+
+    def entries(self):
+        """All staged recipes as (entry_id, idempotency_key, recipe) in the order they were added"""
+        started = time.perf_counter()
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                'SELECT id, idempotency_key, name, ingredients FROM staged_recipes ORDER BY id'
+            ).fetchall()
+        finally:
+            conn.close()
+            self._observe('read', started)
+        return [
+            (entry_id, key, {'name': name, 'ingredients': json.loads(ingredients)})
+            for entry_id, key, name, ingredients in rows
+        ]
+
+    def all(self):
+        """All staged recipes in the order they were added"""
+        return [recipe for _, _, recipe in self.entries()]
+
+    def append(self, recipe):
+        """Stage one recipe"""
+        self.extend([recipe])
+
+    def extend(self, recipes):
+        """Stage several recipes in a single transaction"""
+        with self._transaction() as conn:
+            self._insert(conn, recipes)
+
+    def delete_at(self, index):
+        """Remove the recipe at a list position; returns False if there is none"""
+        if index < 0:
+            return False
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                'DELETE FROM staged_recipes WHERE id = '
+                '(SELECT id FROM staged_recipes ORDER BY id LIMIT 1 OFFSET ?)',
+                (index,)
+            )
+            return cursor.rowcount > 0
+
+    def remove(self, entry_ids):
+        """Remove specific entries, e.g. once they have been committed"""
+        with self._transaction() as conn:
+            conn.executemany(
+                'DELETE FROM staged_recipes WHERE id = ?',
+                [(entry_id,) for entry_id in entry_ids]
+            )
@@ -0,0 +1,547 @@
+document.addEventListener('DOMContentLoaded', function() {
+    const recipeButtonsContainer = document.querySelector('.recipe-buttons-container');
+    const recipeButtons = recipeButtonsContainer.getElementsByClassName('recipe-button'); // Live, follows syncRecipes()
+    // Update to select the new general ingredients container and its empty state
+    const ingredientsChipsGeneral = document.getElementById('ingredients-chips-overig');
+    const emptyStateGeneral = document.getElementById('empty-state-overig');
+
+    // Store all chips containers and empty states for easier management
+    const allIngredientsContainers = {
+        'verse-groenten-fruit': { chips: document.getElementById('ingredients-chips-verse-groenten-fruit'), emptyState: document.getElementById('empty-state-verse-groenten-fruit') },
+        'vlees-vis': { chips: document.getElementById('ingredients-chips-vlees-vis'), emptyState: document.getElementById('empty-state-vlees-vis') },
+        'zuivel': { chips: document.getElementById('ingredients-chips-zuivel'), emptyState: document.getElementById('empty-state-zuivel') },
+        'brood-bakkerij': { chips: document.getElementById('ingredients-chips-brood-bakkerij'), emptyState: document.getElementById('empty-state-brood-bakkerij') },
+        'diepvries': { chips: document.getElementById('ingredients-chips-diepvries'), emptyState: document.getElementById('empty-state-diepvries') },
+        'conserven': { chips: document.getElementById('ingredients-chips-conserven'), emptyState: document.getElementById('empty-state-conserven') },
+        'droge-waren': { chips: document.getElementById('ingredients-chips-droge-waren'), emptyState: document.getElementById('empty-state-droge-waren') },
+        'dranken': { chips: document.getElementById('ingredients-chips-dranken'), emptyState: document.getElementById('empty-state-dranken') },
+        'snacks': { chips: document.getElementById('ingredients-chips-snacks'), emptyState: document.getElementById('empty-state-snacks') },
+        'ontbijt': { chips: document.getElementById('ingredients-chips-ontbijt'), emptyState: document.getElementById('empty-state-ontbijt') },
+        'broodbeleg': { chips: document.getElementById('ingredients-chips-broodbeleg'), emptyState: document.getElementById('empty-state-broodbeleg') },
+        'baby': { chips: document.getElementById('ingredients-chips-baby'), emptyState: document.getElementById('empty-state-baby') },
+        'kruiden': { chips: document.getElementById('ingredients-chips-kruiden'), emptyState: document.getElementById('empty-state-kruiden') },
+        'non-food': { chips: document.getElementById('ingredients-chips-non-food'), emptyState: document.getElementById('empty-state-non-food') },
+        'overig': { chips: ingredientsChipsGeneral, emptyState: emptyStateGeneral }
+    };
+
+    const copyButton = document.getElementById('copy-button');
+    const clearAllButton = document.getElementById('clear-all-button');
+    const menuSelect = document.getElementById('menu-select');
+    const saveMenuButton = document.getElementById('save-menu-button');
+    const deleteMenuButton = document.getElementById('delete-menu-button');
+    let selectedRecipes = new Set();
+    let currentIngredients = new Map(); // Use a Map to store ingredient objects by name
+    let removedIngredients = new Set(); // Names removed by hand, kept out of later refreshes
+    let shoppingListRequestId = 0;
+
+    // Generate random gradient colors for buttons
+    function getRandomGradient() {
+        const colors = [
+            '#FF6B6B', '#4ECDC4', '#45B7D1', '#96CEB4', '#FFEEAD',
+            '#D4A5A5', '#9B59B6', '#3498DB', '#E67E22', '#2ECC71'
+        ];
+        const color1 = colors[Math.floor(Math.random() * colors.length)];
+        const color2 = colors[Math.floor(Math.random() * colors.length)];
+        return `linear-gradient(45deg, ${color1}, ${color2})`;
+    }
+
+    // Apply random gradients to buttons
+    Array.from(recipeButtons).forEach(button => {
+        button.style.background = getRandomGradient();
+    });
+
+    // Create ingredient chip
+    function createIngredientChip(ingredient) {
+        const chip = document.createElement('div');
+        chip.className = 'ingredient-chip';
+        chip.innerHTML = `
+            <span class="chip-text">${ingredient.name}</span>
+            <button class="chip-remove" data-ingredient-name="${ingredient.name}">×</button>
+        `;
+
+        // Add remove functionality
+        const removeBtn = chip.querySelector('.chip-remove');
+        removeBtn.addEventListener('click', function() {
+            const ingredientName = this.dataset.ingredientName;
+            currentIngredients.delete(ingredientName);
+            removedIngredients.add(ingredientName);
+            updateIngredientsDisplay();
+        });
+
+        return chip;
+    }
+
+    // Update ingredients display
+    function updateIngredientsDisplay() {
+        // Clear all chips from all containers
+        for (const category in allIngredientsContainers) {
+            const container = allIngredientsContainers[category];
+            container.chips.querySelectorAll('.ingredient-chip').forEach(c => c.remove());
+        }
+
+        // Repopulate chips based on current ingredients
+        currentIngredients.forEach(ingredient => {
+            // Categories are resolved to container keys by the server
+            const containerData = allIngredientsContainers[ingredient.category] || allIngredientsContainers['overig'];
+
+            if (containerData) {
+                const chip = createIngredientChip(ingredient);
+                // Add the new chip before the empty state message
+                containerData.chips.insertBefore(chip, containerData.emptyState);
+            }
+        });
+
+        // Update visibility of containers and empty states
+        const hasAnyIngredients = currentIngredients.size > 0;
+        for (const categoryKey in allIngredientsContainers) {
+            const mainContainer = document.getElementById(`${categoryKey}-ingredients-container`);
+            const containerData = allIngredientsContainers[categoryKey];
+            const hasChips = containerData.chips.querySelector('.ingredient-chip');
+
+            if (hasChips) {
+                mainContainer.style.display = 'block';
+                containerData.emptyState.style.display = 'none';
+            } else {
+                // This container is empty
+                if (categoryKey === 'overig' && !hasAnyIngredients) {
+                    // Special case for initial state: show the 'overig' container
+                    mainContainer.style.display = 'block';
+                    containerData.emptyState.style.display = 'block';
+                } else {
+                    // Otherwise, hide the empty container
+                    mainContainer.style.display = 'none';
+                }
+            }
+        }
+    }
+
+    // Show a shopping list as returned by /shopping_list or /menus/<id>
+    function showShoppingList(categories) {
+        currentIngredients.clear();
+        categories.forEach(category => {
+            category.items.forEach(item => {
+                if (!removedIngredients.has(item.name)) {
+                    currentIngredients.set(item.name, { name: item.name, category: category.key });
+                }
+            });
+        });
+        updateIngredientsDisplay();
+    }
+
+    // Ingredients per recipe id, from the map embedded in the page or loaded in chunks.
+    // A selection of recipes that are all in it is merged here, without a request.
+    const recipeIngredients = new Map();
+    let categoryOrder = [];
+
+    // Unpack a compact map from the page or /ingredient_map
+    function addIngredientMap(map) {
+        categoryOrder = map.categories;
+        const ingredients = map.ingredients.map((name, index) => ({
+            name: name,
+            category: map.categories[map.category_codes[index]]
+        }));
+        Object.entries(map.recipes).forEach(([recipeId, indexes]) => {
+            recipeIngredients.set(parseInt(recipeId), indexes.map(index => ingredients[index]));
+        });
+    }
+
+    // Catalogs too large to embed load the map in chunks in the background;
+    // until a recipe's chunk is in, selections with it go to /shopping_list
+    async function loadIngredientMap(afterId) {
+        try {
+            const response = await fetch(afterId === undefined ? '/ingredient_map' : `/ingredient_map?after_id=${afterId}`);
+            if (!response.ok) {
+                return;
+            }
+            const data = await response.json();
+            addIngredientMap(data);
+            if (data.next_after_id !== null) {
+                setTimeout(() => loadIngredientMap(data.next_after_id), 100);
+            }
+        } catch (error) {
+            console.error('Error loading ingredient map:', error);
+        }
+    }
+
+    // The same merge as build_shopping_list() on the server: deduplicated on the
+    // case-folded name, grouped in category order and sorted by name
+    function mergeShoppingList(recipeIds) {
+        const items = new Map();
+        recipeIds.forEach(recipeId => {
+            recipeIngredients.get(recipeId).forEach(ingredient => {
+                const key = ingredient.name.toLowerCase();
+                if (!items.has(key)) {
+                    items.set(key, ingredient);
+                }
+            });
+        });
+
+        const grouped = new Map(categoryOrder.map(key => [key, []]));
+        items.forEach(item => {
+            (grouped.get(item.category) || grouped.get('overig')).push(item);
+        });
+        return categoryOrder
+            .filter(key => grouped.get(key).length > 0)
+            .map(key => ({
+                key: key,
+                items: grouped.get(key).sort((a, b) => {
+                    const nameA = a.name.toLowerCase();
+                    const nameB = b.name.toLowerCase();
+                    return nameA < nameB ? -1 : nameA > nameB ? 1 : 0;
+                })
+            }));
+    }
+
+    // Show the merged shopping list for the whole selection, fetching it only
+    // when the ingredient map does not cover every selected recipe
+    async function refreshShoppingList() {
+        const requestId = ++shoppingListRequestId;
+
+        if (selectedRecipes.size === 0) {
+            currentIngredients.clear();
+            updateIngredientsDisplay();
+            return;
+        }
+
+        const recipeIds = Array.from(selectedRecipes);
+        if (categoryOrder.length > 0 && recipeIds.every(recipeId => recipeIngredients.has(recipeId))) {
+            showShoppingList(mergeShoppingList(recipeIds));
+            return;
+        }
+
+        try {
+            const response = await fetch('/shopping_list', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                },
+                body: JSON.stringify({
+                    recipe_ids: Array.from(selectedRecipes)
+                })
+            });
+
+            if (!response.ok) {
+                throw new Error(`HTTP error! status: ${response.status}`);
+            }
+
+            const data = await response.json();
+            if (data.success === false) {
+                throw new Error(data.error || 'Failed to fetch ingredients');
+            }
+
+            // A newer selection is already on its way; drop this stale answer
+            if (requestId !== shoppingListRequestId) {
+                return;
+            }
+
+            showShoppingList(data.categories);
+        } catch (error) {
+            console.error('Error fetching ingredients:', error);
+            // Display error in the overig ingredients box for now
+            allIngredientsContainers['overig'].chips.innerHTML = `<div class="error-message">Error: ${error.message}</div>`;
+        }
+    }
+
+    // Toggle button state and update ingredients
+    function toggleRecipe() {
+        const recipeId = parseInt(this.dataset.recipeId); // Convert string to integer
+
+        if (selectedRecipes.has(recipeId)) {
+            selectedRecipes.delete(recipeId);
+            this.classList.remove('selected');
+        } else {
+            selectedRecipes.add(recipeId);
+            this.classList.add('selected');
+        }
+        // The selection no longer matches the loaded menu
+        menuSelect.value = '';
+        refreshShoppingList();
+    }
+
+    Array.from(recipeButtons).forEach(button => {
+        button.addEventListener('click', toggleRecipe);
+    });
+
+    // Keep the recipe buttons in step with saves and deletes made elsewhere
+    const RECIPE_SYNC_INTERVAL = 60000;
+    let recipeRevision = recipeButtonsContainer.dataset.revision;
+
+    function addRecipeButton(recipe) {
+        const button = document.createElement('button');
+        button.className = 'recipe-button';
+        button.dataset.recipeId = recipe.id;
+        button.dataset.recipeName = recipe.name;
+        button.textContent = recipe.name;
+        button.style.background = getRandomGradient();
+        button.addEventListener('click', toggleRecipe);
+        // The list is ordered by name
+        const next = Array.from(recipeButtons).find(other => other.dataset.recipeName > recipe.name);
+        recipeButtonsContainer.insertBefore(button, next || null);
+    }
+
+    async function syncRecipes() {
+        if (recipeRevision === undefined || document.hidden) {
+            return;
+        }
+        try {
+            const response = await fetch(`/changes?since=${recipeRevision}`);
+            if (!response.ok) {
+                return; // e.g. 503 while the server is busy; the next round catches up
+            }
+            const data = await response.json();
+            if (data.reset) {
+                // Too much changed to patch; reload unless that would lose a selection
+                if (selectedRecipes.size === 0) {
+                    window.location.reload();
+                }
+                return;
+            }
+
+            let selectionChanged = false;
+            const buttonsById = new Map(Array.from(recipeButtons).map(button => [parseInt(button.dataset.recipeId), button]));
+            data.recipes.forEach(recipe => {
+                recipeIngredients.set(recipe.id, recipe.ingredients);
+                if (!buttonsById.has(recipe.id)) {
+                    addRecipeButton(recipe);
+                } else if (selectedRecipes.has(recipe.id)) {
+                    // Its ingredients changed
+                    selectionChanged = true;
+                }
+            });
+            data.deleted.forEach(recipeId => {
+                recipeIngredients.delete(recipeId);
+                const button = buttonsById.get(recipeId);
+                if (button) {
+                    button.remove();
+                }
+                if (selectedRecipes.delete(recipeId)) {
+                    selectionChanged = true;
+                }
+            });
+            recipeRevision = data.revision;
+            if (selectionChanged) {
+                refreshShoppingList();
+            }
+        } catch (error) {
+            console.error('Error syncing recipes:', error);
+        }
+    }
+
+    setInterval(syncRecipes, RECIPE_SYNC_INTERVAL);
+    document.addEventListener('visibilitychange', syncRecipes);
+
+    // Copy button functionality
+    copyButton.addEventListener('click', function() {
+        console.log('Copy button clicked');
+
+        if (currentIngredients.size === 0) {
+            console.log('No ingredients to copy');
+            return;
+        }
+
+        const ingredientsByCategory = {};
+        currentIngredients.forEach(ingredient => {
+            const categoryKey = ingredient.category || 'overig';
+            if (!ingredientsByCategory[categoryKey]) {
+                ingredientsByCategory[categoryKey] = [];
+            }
+            ingredientsByCategory[categoryKey].push(ingredient.name);
+        });
+
+        let outputParts = [];
+        for (const categoryKey in allIngredientsContainers) {
+            if (ingredientsByCategory[categoryKey] && ingredientsByCategory[categoryKey].length > 0) {
+                const mainContainer = document.getElementById(`${categoryKey}-ingredients-container`);
+                const headerText = mainContainer.querySelector('.ingredients-header h3').textContent;
+
+                outputParts.push(`${headerText}\n`);
+
+                const sortedIngredients = ingredientsByCategory[categoryKey].sort();
+                sortedIngredients.forEach(ingredientName => {
+                    outputParts.push(`- ${ingredientName}\n`);
+                });
+
+                outputParts.push('\n');
+            }
+        }
+
+        const ingredientsList = outputParts.join('').trim();
+        console.log('Ingredients to copy:', `\n${ingredientsList}`);
+
+        // Store the original text
+        const originalText = this.textContent;
+        console.log('Original button text:', originalText); // Debug log
+
+        // Function to show success state
+        const showSuccess = () => {
+            this.textContent = 'Gekopieerd!';
+            this.classList.add('copied');
+            console.log('Showing success state'); // Debug log
+            setTimeout(() => {
+                this.textContent = originalText;
+                this.classList.remove('copied');
+                console.log('Restored original state'); // Debug log
+            }, 2000);
+        };
+
+        // Try modern clipboard API first
+        if (navigator.clipboard && navigator.clipboard.writeText) {
+            console.log('Using modern clipboard API'); // Debug log
+            navigator.clipboard.writeText(ingredientsList).then(() => {
+                console.log('Modern clipboard API succeeded'); // Debug log
+                showSuccess();
+            }).catch((error) => {
+                console.log('Modern clipboard API failed, trying fallback:', error); // Debug log
+                // Fallback method
+                fallbackCopy(ingredientsList, showSuccess);
+            });
+        } else {
+            console.log('Modern clipboard API not available, using fallback'); // Debug log
+            // Fallback method
+            fallbackCopy(ingredientsList, showSuccess);
+        }
+    });
+
+    // Fallback copy method
+    function fallbackCopy(text, successCallback) {
+        try {
+            const textArea = document.createElement('textarea');
+            textArea.value = text;
+            textArea.style.position = 'fixed';
+            textArea.style.left = '-999999px';
+            textArea.style.top = '-999999px';
+            document.body.appendChild(textArea);
+            textArea.focus();
+            textArea.select();
+
+            const successful = document.execCommand('copy');
+            document.body.removeChild(textArea);
+
+            if (successful) {
+                console.log('Fallback copy succeeded'); // Debug log
+                successCallback();
+            } else {
+                console.log('Fallback copy failed'); // Debug log
+                alert('Kopiëren mislukt. Probeer handmatig te selecteren en kopiëren.');
+            }
+        } catch (error) {
+            console.log('Fallback copy error:', error); // Debug log
+            alert('Kopiëren mislukt. Probeer handmatig te selecteren en kopiëren.');
+        }
+    }
+
+    // Clear all button functionality
+    clearAllButton.addEventListener('click', function() {
+        selectedRecipes.clear();
+        currentIngredients.clear();
+        removedIngredients.clear();
+        shoppingListRequestId++;
+        menuSelect.value = '';
+        Array.from(recipeButtons).forEach(button => {
+            button.classList.remove('selected');
+        });
+        updateIngredientsDisplay(); // This will clear all new boxes and show their empty states.
+    });
+
+    // Saved menus: a selection of recipes with its shopping list kept on the server
+    async function loadMenus(selectedId) {
+        try {
+            const response = await fetch('/menus');
+            const data = await response.json();
+            if (!data.success) {
+                throw new Error(data.error || 'Failed to load menus');
+            }
+            menuSelect.querySelectorAll('option[value]:not([value=""])').forEach(option => option.remove());
+            data.menus.forEach(menu => {
+                const option = document.createElement('option');
+                option.value = menu.id;
+                option.textContent = menu.name;
+                menuSelect.appendChild(option);
+            });
+            menuSelect.value = selectedId ? String(selectedId) : '';
+        } catch (error) {
+            console.error('Error loading menus:', error);
+        }
+    }
+
+    // Loading a menu is one request for its precomputed shopping list
+    async function loadMenu(menuId) {
+        const requestId = ++shoppingListRequestId;
+        try {
+            const response = await fetch(`/menus/${menuId}`);
+            const data = await response.json();
+            if (!data.success) {
+                throw new Error(data.error || 'Failed to load menu');
+            }
+            if (requestId !== shoppingListRequestId) {
+                return;
+            }
+
+            selectedRecipes = new Set(data.recipe_ids);
+            removedIngredients.clear();
+            Array.from(recipeButtons).forEach(button => {
+                button.classList.toggle('selected', selectedRecipes.has(parseInt(button.dataset.recipeId)));
+            });
+            showShoppingList(data.categories);
+        } catch (error) {
+            console.error('Error loading menu:', error);
+            alert(`Menu laden mislukt: ${error.message}`);
+        }
+    }
+
+    menuSelect.addEventListener('change', function() {
+        if (this.value) {
+            loadMenu(this.value);
+        }
+    });
+
+    saveMenuButton.addEventListener('click', async function() {
+        if (selectedRecipes.size === 0) {
+            alert('Selecteer eerst recepten voor het menu.');
+            return;
+        }
+        const name = prompt('Naam van het menu:');
+        if (!name || !name.trim()) {
+            return;
+        }
+        try {
+            const response = await fetch('/menus', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                },
+                body: JSON.stringify({ name: name.trim(), recipe_ids: Array.from(selectedRecipes) })
+            });
+            const data = await response.json();
+            if (!data.success) {
+                throw new Error(data.error || 'Failed to save menu');
+            }
+            loadMenus(data.id);
+        } catch (error) {
+            console.error('Error saving menu:', error);
+            alert(`Menu opslaan mislukt: ${error.message}`);
+        }
+    });
+
+    deleteMenuButton.addEventListener('click', async function() {
+        if (!menuSelect.value || !confirm('Dit menu verwijderen?')) {
+            return;
+        }
+        try {
+            await fetch(`/menus/${menuSelect.value}`, { method: 'DELETE' });
+            loadMenus();
+        } catch (error) {
+            console.error('Error deleting menu:', error);
+        }
+    });
+
+    // Initialize display
+    const embeddedIngredientMap = document.getElementById('ingredient-map');
+    if (embeddedIngredientMap) {
+        addIngredientMap(JSON.parse(embeddedIngredientMap.textContent));
+    } else {
+        loadIngredientMap();
+    }
+    updateIngredientsDisplay();
+    loadMenus();
+});
@@ -10,6 +10,9 @@ document.addEventListener('DOMContentLoaded', function() {
     // Get categories from data attribute
     const categories = JSON.parse(ingredientsContainer.dataset.categories || '{}');
     
+    const recipeNameSuggestions = document.getElementById('recipe-name-suggestions');
+    let suggestTimer = null;
+    
     // Show/hide ingredients section based on recipe name input
     recipeNameInput.addEventListener('input', () => {
         if (recipeNameInput.value.trim() !== '') {
@@ -17,8 +20,40 @@ document.addEventListener('DOMContentLoaded', function() {
         } else {
             ingredientsSection.style.display = 'none';
         }
+        
+        // Suggest recipe names while typing, once the user pauses briefly
+        clearTimeout(suggestTimer);
+        suggestTimer = setTimeout(() => updateNameSuggestions(recipeNameInput.value.trim()), 150);
     });
     
+    // Fill the recipe name datalist with suggestions from the server
+    async function updateNameSuggestions(query) {
+        if (!recipeNameSuggestions || !query) return;
+        
+        try {
+            const response = await fetch('/get_default_ingredients', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json'
+                },
+                body: JSON.stringify({ recipe_name: query })
+            });
+            
+            const data = await response.json();
+            // Ignore answers for text the user has already changed
+            if (query !== recipeNameInput.value.trim()) return;
+            
+            recipeNameSuggestions.innerHTML = '';
+            (data.suggestions || []).forEach(suggestion => {
+                const option = document.createElement('option');
+                option.value = suggestion.name;
+                recipeNameSuggestions.appendChild(option);
+            });
+        } catch (error) {
+            console.error('Error fetching recipe suggestions:', error);
+        }
+    }
+    
     // Initialize ingredient fields
     initIngredientFields();
     
@@ -107,8 +142,15 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
     
+    // Recipes added in quick succession are sent to /add_recipes together
+    const ADD_BATCH_DELAY = 400;
+    const ADD_BATCH_MAX = 25;
+    let pendingRecipes = [];
+    let pendingTimer = null;
+    let flushing = Promise.resolve();
+    
     // Add a new recipe
-    async function addRecipe() {
+    function addRecipe() {
         const recipeName = recipeNameInput.value.trim();
         if (!recipeName) {
             alert('Please enter a recipe name');
@@ -130,46 +172,100 @@ document.addEventListener('DOMContentLoaded', function() {
             return;
         }
         
-        // Send data to server
+        // Show the recipe straight away; it is sent with the next batch
+        const recipeItem = addRecipeToUI(recipeName, ingredients, document.querySelectorAll('.recipe-item').length);
+        recipeItem.classList.add('pending');
+        pendingRecipes.push({ recipe: { name: recipeName, ingredients: ingredients }, item: recipeItem });
+        
+        clearTimeout(pendingTimer);
+        if (pendingRecipes.length >= ADD_BATCH_MAX) {
+            flushPendingRecipes();
+        } else {
+            pendingTimer = setTimeout(flushPendingRecipes, ADD_BATCH_DELAY);
+        }
+        
+        // Clear form, hide ingredients section, and reset fields
+        recipeNameInput.value = '';
+        ingredientsSection.style.display = 'none';
+        
+        // Reset ingredient fields
+        ingredientsContainer.innerHTML = '';
+        for (let i = 0; i < 5; i++) {
+            addIngredientField();
+        }
+    }
+    
+    // Send the queued recipes in one request. Batches go out one at a time,
+    // so the server stages recipes in the order they were added.
+    function flushPendingRecipes() {
+        clearTimeout(pendingTimer);
+        pendingTimer = null;
+        const batch = pendingRecipes;
+        pendingRecipes = [];
+        if (batch.length > 0) {
+            flushing = flushing.then(() => sendRecipes(batch));
+        }
+        return flushing;
+    }
+    
+    async function sendRecipes(batch) {
+        let results = null;
         try {
-            const response = await fetch('/add_recipe', {
+            const response = await fetch('/add_recipes', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json'
                 },
-                body: JSON.stringify({
-                    name: recipeName,
-                    ingredients: ingredients
-                })
+                body: JSON.stringify({ recipes: batch.map(entry => entry.recipe) })
             });
             
             const data = await response.json();
-            if (data.success) {
-                // Add recipe to UI
-                addRecipeToUI(recipeName, ingredients, document.querySelectorAll('.recipe-item').length);
-                
-                // Clear form, hide ingredients section, and reset fields
-                recipeNameInput.value = '';
-                ingredientsSection.style.display = 'none';
-                
-                // Reset ingredient fields
-                ingredientsContainer.innerHTML = '';
-                for (let i = 0; i < 5; i++) {
-                    addIngredientField();
-                }
-                
-                // Set default values for the first 4 fields based on the new recipe name
-                const newRecipeName = document.getElementById('recipe-name').value.trim();
-                if (newRecipeName) {
-                    setDefaultIngredients(newRecipeName);
-                }
-            }
+            results = data.results || null;
         } catch (error) {
-            console.error('Error adding recipe:', error);
-            alert('Failed to add recipe. Please try again.');
+            console.error('Error adding recipes:', error);
+        }
+        
+        const failed = [];
+        batch.forEach((entry, i) => {
+            const result = results && results[i];
+            if (result && result.success) {
+                entry.item.classList.remove('pending');
+            } else {
+                failed.push(`${entry.recipe.name}: ${result ? result.error : 'request failed'}`);
+                entry.item.remove();
+            }
+        });
+        
+        if (failed.length > 0) {
+            reindexRecipes();
+            alert(`Failed to add ${failed.length} recipe(s):\n${failed.join('\n')}`);
+        }
+    }
+    
+    // Keep data-index in line with the positions of the staged recipes
+    function reindexRecipes() {
+        const remainingRecipes = recipesContainer.querySelectorAll('.recipe-item');
+        remainingRecipes.forEach((item, i) => {
+            item.dataset.index = i;
+        });
+        
+        // Add "No recipes" message if no recipes left
+        if (remainingRecipes.length === 0 && !recipesContainer.querySelector('p')) {
+            const noRecipesMsg = document.createElement('p');
+            noRecipesMsg.textContent = 'No recipes added yet.';
+            recipesContainer.appendChild(noRecipesMsg);
         }
     }
     
+    // Send anything still queued when the page is closed
+    window.addEventListener('pagehide', () => {
+        if (pendingRecipes.length > 0) {
+            const body = JSON.stringify({ recipes: pendingRecipes.map(entry => entry.recipe) });
+            navigator.sendBeacon('/add_recipes', new Blob([body], { type: 'application/json' }));
+            pendingRecipes = [];
+        }
+    });
+    
     // Add recipe to UI
     function addRecipeToUI(name, ingredients, index) {
         const recipeItem = document.createElement('div');
@@ -206,11 +302,14 @@ document.addEventListener('DOMContentLoaded', function() {
         }
         
         recipesContainer.appendChild(recipeItem);
+        return recipeItem;
     }
     
     // Delete a recipe
     async function deleteRecipe(index) {
         try {
+            // Indices refer to staged recipes, so queued ones go first
+            await flushPendingRecipes();
             const response = await fetch(`/delete_recipe/${index}`, {
                 method: 'DELETE'
             });
@@ -221,19 +320,7 @@ document.addEventListener('DOMContentLoaded', function() {
                 const recipeItem = document.querySelector(`.recipe-item[data-index="${index}"]`);
                 if (recipeItem) {
                     recipesContainer.removeChild(recipeItem);
-                    
-                    // Update indices of remaining recipes
-                    const remainingRecipes = recipesContainer.querySelectorAll('.recipe-item');
-                    remainingRecipes.forEach((item, i) => {
-                        item.dataset.index = i;
-                    });
-                    
-                    // Add "No recipes" message if no recipes left
-                    if (remainingRecipes.length === 0) {
-                        const noRecipesMsg = document.createElement('p');
-                        noRecipesMsg.textContent = 'No recipes added yet.';
-                        recipesContainer.appendChild(noRecipesMsg);
-                    }
+                    reindexRecipes();
                 }
             }
         } catch (error) {
@@ -251,16 +338,28 @@ document.addEventListener('DOMContentLoaded', function() {
         }
         
         try {
+            await flushPendingRecipes();
             const response = await fetch('/save_to_db', {
                 method: 'POST'
             });
             
-            const data = await response.json();
+            let data = await response.json();
+            if (data.success && data.job_id) {
+                // Saved in the background: wait for the job to finish
+                saveDbBtn.disabled = true;
+                try {
+                    data = await waitForJob(data.status_url);
+                } finally {
+                    saveDbBtn.disabled = false;
+                }
+            }
             if (data.success) {
                 alert('Recipes saved to database successfully');
                 
                 // Clear UI
                 recipesContainer.innerHTML = '<p>No recipes added yet.</p>';
+            } else if (data.error) {
+                alert(`Failed to save recipes to database: ${data.error}`);
             }
         } catch (error) {
             console.error('Error saving to database:', error);
@@ -268,6 +367,21 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
     
+    // Poll a background job until it is done; resolves to {success, error}
+    async function waitForJob(statusUrl) {
+        while (true) {
+            await new Promise(resolve => setTimeout(resolve, 1000));
+            const response = await fetch(statusUrl);
+            const data = await response.json();
+            if (!data.success) {
+                return data;
+            }
+            if (data.job.status === 'done' || data.job.status === 'failed') {
+                return { success: data.job.status === 'done', error: data.job.error };
+            }
+        }
+    }
+    
     // Set default ingredients for a recipe
     async function setDefaultIngredients(recipeName) {
         const defaultIngredients = await getDefaultIngredients(recipeName);
@@ -0,0 +1,93 @@
+document.addEventListener('DOMContentLoaded', function() {
+    // Delete Recipe Button Handler
+    document.querySelectorAll('.delete-recipe-btn').forEach(button => {
+        button.addEventListener('click', function() {
+            const recipeId = this.getAttribute('data-recipe-id');
+
+            fetch(`/delete_and_export_recipe/${recipeId}`, {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json'
+                }
+            })
+            .then(response => response.json())
+            .then(data => {
+                if (data.success) {
+                    // Find and remove both the recipe details row and its ingredients row
+                    const currentRow = this.closest('tr');
+                    const ingredientsRow = currentRow.nextElementSibling;
+
+                    // Remove both rows
+                    currentRow.remove();
+                    if (ingredientsRow && ingredientsRow.querySelector('ul')) {
+                        ingredientsRow.remove();
+                    }
+
+                    // Refresh the page to update the recipe manager
+                    window.location.reload();
+                } else {
+                    alert('Error: ' + data.error);
+                }
+            })
+            .catch(error => {
+                console.error('Error:', error);
+                alert('An error occurred while deleting the recipe');
+            });
+        });
+    });
+
+    // Delete all selected recipes with one request
+    const deleteSelectedButton = document.getElementById('delete-selected-btn');
+    const selectedIds = () => Array.from(document.querySelectorAll('.select-recipe:checked'), box => Number(box.value));
+
+    document.querySelectorAll('.select-recipe').forEach(box => {
+        box.addEventListener('change', function() {
+            deleteSelectedButton.disabled = selectedIds().length === 0;
+        });
+    });
+
+    if (deleteSelectedButton) {
+        deleteSelectedButton.addEventListener('click', function() {
+            const recipeIds = selectedIds();
+            if (recipeIds.length === 0) {
+                return;
+            }
+            deleteSelectedButton.disabled = true;
+
+            fetch('/delete_and_export_recipes', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json'
+                },
+                body: JSON.stringify({ recipe_ids: recipeIds })
+            })
+            .then(response => response.json())
+            .then(data => {
+                if (!data.success) {
+                    alert('Error: ' + data.error);
+                    return;
+                }
+                const missing = data.results.filter(result => !result.success).map(result => result.id);
+                if (missing.length > 0) {
+                    alert(`Niet gevonden: ${missing.join(', ')}`);
+                }
+                window.location.reload();
+            })
+            .catch(error => {
+                console.error('Error:', error);
+                alert('An error occurred while deleting the recipes');
+            })
+            .finally(() => {
+                deleteSelectedButton.disabled = selectedIds().length === 0;
+            });
+        });
+    }
+
+    // Add Ingredient Button Handler (placeholder for now)
+    document.querySelectorAll('.add-ingredient-btn').forEach(button => {
+        button.addEventListener('click', function() {
+            const recipeId = this.getAttribute('data-recipe-id');
+            alert(`Add ingredient functionality for recipe ${recipeId} will be implemented later`);
+        });
+    });
+});
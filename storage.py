@@ -0,0 +1,1202 @@
+import json
+import time
+import bisect
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from catalog import chosen_category, resolve_categories, KNOWN_INGREDIENTS, DEFAULT_CATEGORY
+from db_pool import ConnectionPool, PoolTimeoutError
+from suggestions import normalize_name
+
+
+class StorageError(Exception):
+    """Raised by every backend when the underlying store fails"""
+
+
+def parse_ingredient(ingredient):
+    """Return (name, category) for an ingredient given as a dict or a plain string"""
+    if isinstance(ingredient, dict):
+        return str(ingredient.get('name', '')).strip(), ingredient.get('category') or None
+    return str(ingredient).strip(), None
+
+
+def parse_ingredients(ingredients):
+    """(normalized name, category) pairs for a recipe's ingredients, without blank names"""
+    items = [parse_ingredient(ingredient) for ingredient in ingredients]
+    return [(normalize_name(name), category) for name, category in items if name]
+
+
+def reclassified_catalog(rows):
+    """Plan a catalog reclassification from its (id, name, category) rows.
+
+    Rows whose names normalize to the same name are merged into one; the
+    row that already has the normalized name is kept if there is one.
+    Yields (keep_id, merged_ids, name, category) for every row that changes.
+    """
+    groups = {}
+    for row in rows:
+        groups.setdefault(normalize_name(row[1]), []).append(row)
+    for name, group in groups.items():
+        keep = next((row for row in group if row[1] == name), group[0])
+        merged = [row for row in group if row is not keep]
+        category = next(
+            (chosen for chosen in (chosen_category(row[2]) for row in [keep] + merged) if chosen),
+            KNOWN_INGREDIENTS.get(name, DEFAULT_CATEGORY)
+        )
+        if merged or keep[1] != name or keep[2] != category:
+            yield keep[0], [row[0] for row in merged], name, category
+
+
+class StorageBackend:
+    """Where saved recipes live.
+
+    Recipes are returned as {'id', 'name'} dicts and ingredients as
+    {'name', 'category'} dicts in their stored order. Ingredient names are
+    normalized and categories resolved against the ingredient catalog when
+    recipes are saved (see catalog.resolve_categories), so reads return
+    them as stored. Pages and iteration
+    are ordered by id, or by (name, id) when order is 'name'; the previous
+    page's last row is passed as after_id/after_name. Failures are raised
+    as StorageError.
+
+    Every write that saves or deletes recipes takes the next revision of
+    the recipe set. Saved recipes carry the revision they were written at
+    and deleted ones leave a tombstone, so changes() can tell a client
+    what changed since the revision it last saw. Recipes saved before
+    revisions existed have revision 0. A save that recategorizes an
+    ingredient also moves the recipes already using it to its revision.
+    Tombstones are kept for TOMBSTONE_REVISIONS revisions; changes() since
+    an older revision asks the client to reload.
+    """
+
+    name = None
+    # Whether revisions survive a restart, so that they can identify a version of the recipe set
+    durable = True
+    # Deletions are reported by changes() for this many revisions, then forgotten
+    TOMBSTONE_REVISIONS = 10000
+
+    def init_schema(self):
+        """Create or migrate the schema (a no-op where there is none)"""
+
+    def list_recipes(self):
+        """Every recipe as {'id', 'name'}, ordered by name"""
+        raise NotImplementedError
+
+    def recipe_ingredients(self, recipe_ids):
+        """{recipe_id: [ingredient, ...]} for the given recipes"""
+        raise NotImplementedError
+
+    def recipe_page(self, order, after_id, after_name, limit):
+        """Up to limit recipes with their ingredients following the keyset position"""
+        raise NotImplementedError
+
+    def iter_recipes(self, order='id', after_id=None, after_name=''):
+        """Generator over recipes with their ingredients; close() it to release resources early"""
+        raise NotImplementedError
+
+    def save_recipes(self, chunk):
+        """Save (idempotency_key, recipe) pairs in one transaction.
+
+        Recipes whose key was saved before are skipped. Returns the recipes
+        inserted as {'id', 'name', 'ingredients'}, with the ingredients as
+        they were stored.
+        """
+        raise NotImplementedError
+
+    def reclassify_ingredients(self, batch_size=500):
+        """Normalize and categorize ingredients saved before the catalog resolved them.
+
+        Commits every batch_size changed catalog entries and returns
+        {'ingredients', 'changed', 'merged'} counts.
+        """
+        raise NotImplementedError
+
+    def pop_recipe(self, recipe_id):
+        """Delete a recipe and return it with its ingredients, or None if there is none"""
+        return self.pop_recipes([recipe_id]).get(recipe_id)
+
+    def pop_recipes(self, recipe_ids):
+        """Delete several recipes in one transaction.
+
+        Returns {recipe_id: recipe with its ingredients} for the ones that
+        existed; missing ids are left out.
+        """
+        raise NotImplementedError
+
+    def revision(self):
+        """The current revision of the recipe set"""
+        raise NotImplementedError
+
+    def changes(self, since, limit):
+        """What changed after revision since.
+
+        Returns {'revision', 'recipes', 'deleted'}: the current revision,
+        the recipes saved (or whose ingredients changed) with their
+        ingredients in id order, and the ids of deleted recipes. When more
+        than limit recipes or deletions changed, or since is so old that
+        its deletions may have been pruned, only {'revision'} is returned,
+        and the client should reload the full list instead. The
+        revision is read first, so a change may be reported twice but
+        never missed.
+        """
+        raise NotImplementedError
+
+    def create_menu(self, name, recipe_ids, shopping_list):
+        """Save a menu with its materialized shopping list; returns its id"""
+        raise NotImplementedError
+
+    def list_menus(self):
+        """Every menu as {'id', 'name', 'recipe_ids'}, ordered by name"""
+        raise NotImplementedError
+
+    def get_menu(self, menu_id):
+        """The menu as {'id', 'name', 'recipe_ids', 'shopping_list'}, or None"""
+        raise NotImplementedError
+
+    def delete_menu(self, menu_id):
+        """Delete a menu; returns False if there is none"""
+        raise NotImplementedError
+
+    def update_menus(self, update, recipe_ids=(), ingredient_names=()):
+        """Rewrite the menus affected by a change to some recipes or ingredients.
+
+        Menus containing one of recipe_ids, or a recipe using one of
+        ingredient_names, are read and passed to update(menu) in one
+        transaction. update returns the new (recipe_ids, shopping_list) or
+        None to leave the menu as it is. Returns the number of menus updated.
+        """
+        raise NotImplementedError
+
+    def stats(self):
+        return {}
+
+    def close(self):
+        """Release connections; the backend reconnects if it is used again"""
+
+
+def recipe_keyset(order, after_id=None, after_name='', table=''):
+    """WHERE and ORDER BY clauses for keyset pagination over recipes.
+
+    Returns (where, params, order_by).
+    """
+    id_column, name_column = f'{table}id', f'{table}name'
+    if order == 'name':
+        order_by = f'{name_column}, {id_column}'
+        if after_id is None:
+            return '', [], order_by
+        where = f'WHERE ({name_column} > %s OR ({name_column} = %s AND {id_column} > %s))'
+        return where, [after_name, after_name, after_id], order_by
+    if after_id is None:
+        return '', [], id_column
+    return f'WHERE {id_column} > %s', [after_id], id_column
+
+
+class SQLBackend(StorageBackend):
+    """Shared implementation for the SQL backends.
+
+    Connections come from a ConnectionPool that is created, and connects,
+    on first use, so constructing a backend never touches the database.
+    Statements use %s placeholders; subclasses supply the connection
+    factory, the errors their driver raises and the dialect-specific
+    statements. If given, observe('acquire', seconds) is called after every
+    connection checkout.
+    """
+
+    UPSERT_INGREDIENTS = None
+    INSERT_IGNORE_RECIPE_INGREDIENTS = None
+    # Appended to SELECTs of rows a transaction is about to rewrite
+    LOCK_ROWS = ''
+    errors = ()
+
+    def __init__(self, pool_config=None, observe=None):
+        self.pool_config = pool_config or {}
+        self.observe = observe
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def connect(self):
+        raise NotImplementedError
+
+    @property
+    def pool(self):
+        """The connection pool, created on first use"""
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ConnectionPool(self.connect, **self.pool_config)
+        return self._pool
+
+    @contextmanager
+    def _connection(self):
+        """Borrow a pooled connection, translating driver errors to StorageError"""
+        started = time.perf_counter()
+        try:
+            conn = self.pool.acquire()
+        except self.errors + (PoolTimeoutError,) as err:
+            raise StorageError(str(err)) from err
+        finally:
+            if self.observe is not None:
+                self.observe('acquire', time.perf_counter() - started)
+        try:
+            yield conn
+        except self.errors as err:
+            raise StorageError(str(err)) from err
+        finally:
+            # Returns the connection to the pool (rolling back on failure)
+            conn.close()
+
+    def list_recipes(self):
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT id, name FROM recipes ORDER BY name')
+            rows = cursor.fetchall()
+            cursor.close()
+        return [{'id': recipe_id, 'name': name} for recipe_id, name in rows]
+
+    def recipe_ingredients(self, recipe_ids):
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            ingredients_by_recipe = self._fetch_ingredients(cursor, recipe_ids)
+            cursor.close()
+        return ingredients_by_recipe
+
+    def recipe_page(self, order, after_id, after_name, limit):
+        where, params, order_by = recipe_keyset(order, after_id, after_name)
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'SELECT id, name FROM recipes {where} ORDER BY {order_by} LIMIT %s', params + [limit])
+            rows = cursor.fetchall()
+            ingredients_by_recipe = self._fetch_ingredients(cursor, [row[0] for row in rows])
+            cursor.close()
+        return [
+            {'id': recipe_id, 'name': name, 'ingredients': ingredients_by_recipe[recipe_id]}
+            for recipe_id, name in rows
+        ]
+
+    def iter_recipes(self, order='id', after_id=None, after_name=''):
+        """Yield recipes with their ingredients from a single query.
+
+        Rows are pulled from the server in batches while the caller consumes
+        them, so memory use does not grow with the size of the table. The
+        connection is only borrowed once iteration starts.
+        """
+        where, params, order_by = recipe_keyset(order, after_id, after_name, table='r.')
+        with self._connection() as conn:
+            # mysql.connector cursors are unbuffered unless asked otherwise
+            cursor = conn.cursor()
+            cursor.execute(
+                'SELECT r.id, r.name, i.name, i.category FROM recipes r '
+                'LEFT JOIN recipe_ingredients ri ON ri.recipe_id = r.id '
+                'LEFT JOIN ingredients i ON i.id = ri.ingredient_id '
+                f'{where} ORDER BY {order_by}, ri.position',
+                params
+            )
+            recipe = None
+            while True:
+                rows = cursor.fetchmany(500)
+                if not rows:
+                    break
+                for recipe_id, name, ingredient_name, category in rows:
+                    if recipe is None or recipe['id'] != recipe_id:
+                        if recipe is not None:
+                            yield recipe
+                        recipe = {'id': recipe_id, 'name': name, 'ingredients': []}
+                    if ingredient_name is not None:
+                        recipe['ingredients'].append({'name': ingredient_name, 'category': category})
+            if recipe is not None:
+                yield recipe
+            cursor.close()
+
+    def save_recipes(self, chunk):
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            inserted = self._insert_recipes(cursor, chunk)
+            conn.commit()
+            cursor.close()
+        return inserted
+
+    def pop_recipes(self, recipe_ids):
+        recipe_ids = list(dict.fromkeys(recipe_ids))
+        if not recipe_ids:
+            return {}
+        placeholders = ','.join(['%s'] * len(recipe_ids))
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            # Two deletes of the same recipe must not both find it and write its tombstone
+            self._lock_revision(cursor)
+            cursor.execute(f'SELECT id, name FROM recipes WHERE id IN ({placeholders})', recipe_ids)
+            names = dict(cursor.fetchall())
+            if names:
+                ingredients_by_recipe = self._fetch_ingredients(cursor, list(names))
+                revision = self._next_revision(cursor)
+                # Their recipe_ingredients rows cascade
+                cursor.execute(
+                    'DELETE FROM recipes WHERE id IN (%s)' % ','.join(['%s'] * len(names)), list(names)
+                )
+                cursor.executemany(
+                    'INSERT INTO recipe_tombstones (recipe_id, revision) VALUES (%s, %s)',
+                    [(recipe_id, revision) for recipe_id in names]
+                )
+                self._prune_tombstones(cursor, revision)
+            conn.commit()
+            cursor.close()
+        return {
+            recipe_id: {'id': recipe_id, 'name': names[recipe_id], 'ingredients': ingredients_by_recipe[recipe_id]}
+            for recipe_id in recipe_ids if recipe_id in names
+        }
+
+    def revision(self):
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT revision FROM recipe_revision WHERE id = 1')
+            revision = cursor.fetchone()[0]
+            cursor.close()
+        return revision
+
+    def changes(self, since, limit):
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT id, revision FROM recipe_revision')
+            revisions = dict(cursor.fetchall())
+            revision = revisions[1]
+            if revision <= since:
+                cursor.close()
+                return {'revision': revision, 'recipes': [], 'deleted': []}
+            if since < revisions.get(2, 0):
+                # Some deletions after since are no longer known
+                cursor.close()
+                return {'revision': revision}
+            cursor.execute('SELECT id, name FROM recipes WHERE revision > %s ORDER BY id LIMIT %s', (since, limit + 1))
+            names = dict(cursor.fetchall())
+            cursor.execute(
+                'SELECT recipe_id FROM recipe_tombstones WHERE revision > %s ORDER BY recipe_id LIMIT %s',
+                (since, limit + 1)
+            )
+            deleted = [row[0] for row in cursor.fetchall()]
+            if len(names) > limit or len(deleted) > limit:
+                cursor.close()
+                return {'revision': revision}
+            ingredients_by_recipe = self._fetch_ingredients(cursor, list(names))
+            cursor.close()
+        return {
+            'revision': revision,
+            'recipes': [
+                {'id': recipe_id, 'name': name, 'ingredients': ingredients_by_recipe[recipe_id]}
+                for recipe_id, name in names.items()
+            ],
+            'deleted': deleted
+        }
+
+    def create_menu(self, name, recipe_ids, shopping_list):
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                'INSERT INTO menus (name, recipe_ids, shopping_list) VALUES (%s, %s, %s)',
+                (name, json.dumps(recipe_ids), json.dumps(shopping_list))
+            )
+            menu_id = cursor.lastrowid
+            cursor.executemany(
+                'INSERT INTO menu_recipes (menu_id, recipe_id) VALUES (%s, %s)',
+                [(menu_id, recipe_id) for recipe_id in dict.fromkeys(recipe_ids)]
+            )
+            conn.commit()
+            cursor.close()
+        return menu_id
+
+    def list_menus(self):
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT id, name, recipe_ids FROM menus ORDER BY name, id')
+            rows = cursor.fetchall()
+            cursor.close()
+        return [{'id': menu_id, 'name': name, 'recipe_ids': json.loads(recipe_ids)} for menu_id, name, recipe_ids in rows]
+
+    def get_menu(self, menu_id):
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT id, name, recipe_ids, shopping_list FROM menus WHERE id = %s', (menu_id,))
+            row = cursor.fetchone()
+            cursor.close()
+        return self._menu(row) if row else None
+
+    def delete_menu(self, menu_id):
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            # Its menu_recipes rows cascade
+            cursor.execute('DELETE FROM menus WHERE id = %s', (menu_id,))
+            deleted = cursor.rowcount > 0
+            conn.commit()
+            cursor.close()
+        return deleted
+
+    def update_menus(self, update, recipe_ids=(), ingredient_names=()):
+        recipe_ids = list(dict.fromkeys(recipe_ids))
+        ingredient_names = list(dict.fromkeys(ingredient_names))
+        updated = 0
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            menu_ids = set()
+            if recipe_ids:
+                cursor.execute(
+                    'SELECT DISTINCT menu_id FROM menu_recipes WHERE recipe_id IN (%s)'
+                    % ','.join(['%s'] * len(recipe_ids)),
+                    recipe_ids
+                )
+                menu_ids.update(row[0] for row in cursor.fetchall())
+            if ingredient_names:
+                # Driven from menu_recipes, so the cost follows the size of the
+                # menus rather than the number of recipes using common ingredients
+                cursor.execute(
+                    'SELECT DISTINCT mr.menu_id FROM menu_recipes mr WHERE EXISTS ('
+                    'SELECT 1 FROM recipe_ingredients ri JOIN ingredients i ON i.id = ri.ingredient_id '
+                    'WHERE ri.recipe_id = mr.recipe_id AND i.name IN (%s))' % ','.join(['%s'] * len(ingredient_names)),
+                    ingredient_names
+                )
+                menu_ids.update(row[0] for row in cursor.fetchall())
+
+            if menu_ids:
+                menu_ids = sorted(menu_ids)
+                cursor.execute(
+                    'SELECT id, name, recipe_ids, shopping_list FROM menus WHERE id IN (%s) ORDER BY id%s'
+                    % (','.join(['%s'] * len(menu_ids)), self.LOCK_ROWS),
+                    menu_ids
+                )
+                for menu in [self._menu(row) for row in cursor.fetchall()]:
+                    result = update(menu)
+                    if result is None:
+                        continue
+                    new_ids, shopping_list = result
+                    cursor.execute(
+                        'UPDATE menus SET recipe_ids = %s, shopping_list = %s WHERE id = %s',
+                        (json.dumps(new_ids), json.dumps(shopping_list), menu['id'])
+                    )
+                    dropped = set(menu['recipe_ids']) - set(new_ids)
+                    if dropped:
+                        cursor.execute(
+                            'DELETE FROM menu_recipes WHERE menu_id = %%s AND recipe_id IN (%s)'
+                            % ','.join(['%s'] * len(dropped)),
+                            [menu['id']] + sorted(dropped)
+                        )
+                    updated += 1
+            conn.commit()
+            cursor.close()
+        return updated
+
+    @staticmethod
+    def _menu(row):
+        menu_id, name, recipe_ids, shopping_list = row
+        return {
+            'id': menu_id,
+            'name': name,
+            'recipe_ids': json.loads(recipe_ids),
+            'shopping_list': json.loads(shopping_list)
+        }
+
+    def stats(self):
+        return self.pool.stats()
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close_all()
+
+    @staticmethod
+    def _lock_revision(cursor):
+        """Wait for other writers before reading what the transaction is about to change.
+
+        Rewriting the revision row unchanged locks it until the transaction
+        ends, like _next_revision() does, so a check made after this call
+        cannot be overtaken by a concurrent writer.
+        """
+        cursor.execute('UPDATE recipe_revision SET revision = revision WHERE id = 1')
+
+    def _prune_tombstones(self, cursor, revision):
+        """Forget deletions more than TOMBSTONE_REVISIONS revisions old.
+
+        The newest pruned revision is kept in recipe_revision row 2, so that
+        changes() since an earlier revision can tell the client to reload.
+        """
+        horizon = revision - self.TOMBSTONE_REVISIONS
+        if horizon <= 0:
+            return
+        cursor.execute('DELETE FROM recipe_tombstones WHERE revision <= %s', (horizon,))
+        if cursor.rowcount > 0:
+            cursor.execute('UPDATE recipe_revision SET revision = %s WHERE id = 2', (horizon,))
+
+    @staticmethod
+    def _next_revision(cursor):
+        """Take the next revision for the current transaction.
+
+        The updated row stays locked until the transaction ends, so writers
+        commit in revision order and a reader never sees revision n before
+        the changes of every revision below it.
+        """
+        cursor.execute('UPDATE recipe_revision SET revision = revision + 1 WHERE id = 1')
+        cursor.execute('SELECT revision FROM recipe_revision WHERE id = 1')
+        return cursor.fetchone()[0]
+
+    def _insert_recipes(self, cursor, chunk):
+        """Insert staged recipes with a fixed number of statements"""
+        if not chunk:
+            return []
+        keys = [key for key, _ in chunk]
+        placeholders = ','.join(['%s'] * len(keys))
+
+        # Two saves of the same chunk, e.g. a background job and a retry, must
+        # not both find the keys missing
+        self._lock_revision(cursor)
+        cursor.execute(f'SELECT idempotency_key FROM recipes WHERE idempotency_key IN ({placeholders})', keys)
+        existing = {row[0] for row in cursor.fetchall()}
+        new = [(key, recipe) for key, recipe in chunk if key not in existing]
+        if not new:
+            return []
+
+        revision = self._next_revision(cursor)
+        # mysql.connector turns this executemany into a single multi-row INSERT
+        cursor.executemany(
+            'INSERT INTO recipes (name, idempotency_key, revision) VALUES (%s, %s, %s)',
+            [(recipe['name'], key, revision) for key, recipe in new]
+        )
+        new_keys = [key for key, _ in new]
+        cursor.execute(
+            'SELECT id, idempotency_key FROM recipes WHERE idempotency_key IN (%s)' % ','.join(['%s'] * len(new_keys)),
+            new_keys
+        )
+        recipe_ids = {key: recipe_id for recipe_id, key in cursor.fetchall()}
+        # Older MySQL versions can hand out the id of a deleted recipe again after a restart
+        cursor.execute(
+            'DELETE FROM recipe_tombstones WHERE recipe_id IN (%s)' % ','.join(['%s'] * len(recipe_ids)),
+            list(recipe_ids.values())
+        )
+
+        stored = self._store_ingredients(
+            cursor, [(recipe_ids[key], recipe['ingredients']) for key, recipe in new], revision
+        )
+        return [
+            {'id': recipe_ids[key], 'name': recipe['name'], 'ingredients': stored.get(recipe_ids[key], [])}
+            for key, recipe in new
+        ]
+
+    def _store_ingredients(self, cursor, recipe_ingredients, revision=None):
+        """Write the ingredients of several recipes to the normalized tables.
+
+        recipe_ingredients is a list of (recipe_id, ingredients) pairs. The
+        catalog is read and upserted once for all distinct names, so the
+        number of statements does not grow with the number of recipes.
+        Recipes already using an ingredient whose category changes move to
+        revision, if one is given. Returns {recipe_id: [{'name',
+        'category'}, ...]} as stored.
+        """
+        parsed = [(recipe_id, parse_ingredients(ingredients)) for recipe_id, ingredients in recipe_ingredients]
+        names = list(dict.fromkeys(name for _, items in parsed for name, _ in items))
+        if not names:
+            return {}
+
+        placeholders = ','.join(['%s'] * len(names))
+        cursor.execute(f'SELECT name, category FROM ingredients WHERE name IN ({placeholders})', names)
+        existing = dict(cursor.fetchall())
+        catalog = resolve_categories([item for _, items in parsed for item in items], existing)
+        cursor.executemany(self.UPSERT_INGREDIENTS, list(catalog.items()))
+
+        cursor.execute(f'SELECT id, name FROM ingredients WHERE name IN ({placeholders})', names)
+        ingredient_ids = {name: ingredient_id for ingredient_id, name in cursor.fetchall()}
+        recategorized = [ingredient_ids[name] for name, category in existing.items() if category != catalog[name]]
+        if recategorized and revision is not None:
+            self._touch_recipes_using(cursor, recategorized, revision)
+
+        cursor.executemany(
+            self.INSERT_IGNORE_RECIPE_INGREDIENTS,
+            [
+                (recipe_id, position, ingredient_ids[name])
+                for recipe_id, items in parsed
+                for position, (name, _) in enumerate(items)
+            ]
+        )
+        return {
+            recipe_id: [{'name': name, 'category': catalog[name]} for name, _ in items]
+            for recipe_id, items in parsed
+        }
+
+    def reclassify_ingredients(self, batch_size=500):
+        """Normalize and categorize the ingredients catalog in place.
+
+        Reads the catalog (one row per distinct ingredient, not per recipe)
+        once, then merges, renames and recategorizes rows in transactions
+        of batch_size entries. Merged rows have their recipe_ingredients
+        pointed at the row that is kept before they are deleted.
+        """
+        summary = {'ingredients': 0, 'changed': 0, 'merged': 0}
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT id, name, category FROM ingredients ORDER BY id')
+            rows = cursor.fetchall()
+            summary['ingredients'] = len(rows)
+            pending = []
+            for keep_id, merged_ids, name, category in reclassified_catalog(rows):
+                if merged_ids:
+                    placeholders = ','.join(['%s'] * len(merged_ids))
+                    cursor.execute(
+                        f'UPDATE recipe_ingredients SET ingredient_id = %s WHERE ingredient_id IN ({placeholders})',
+                        [keep_id] + merged_ids
+                    )
+                    cursor.execute(f'DELETE FROM ingredients WHERE id IN ({placeholders})', merged_ids)
+                cursor.execute('UPDATE ingredients SET name = %s, category = %s WHERE id = %s', (name, category, keep_id))
+                summary['changed'] += 1
+                summary['merged'] += len(merged_ids)
+                pending.append(keep_id)
+                if len(pending) >= batch_size:
+                    self._touch_recipes_using(cursor, pending)
+                    conn.commit()
+                    pending = []
+            if pending:
+                self._touch_recipes_using(cursor, pending)
+            conn.commit()
+            cursor.close()
+        return summary
+
+    def _touch_recipes_using(self, cursor, ingredient_ids, revision=None):
+        """Move the recipes using the given ingredients to revision, or a new one, for changes()"""
+        if revision is None:
+            revision = self._next_revision(cursor)
+        cursor.execute(
+            'UPDATE recipes SET revision = %%s WHERE id IN ('
+            'SELECT recipe_id FROM recipe_ingredients WHERE ingredient_id IN (%s))'
+            % ','.join(['%s'] * len(ingredient_ids)),
+            [revision] + list(ingredient_ids)
+        )
+
+    @staticmethod
+    def _fetch_ingredients(cursor, recipe_ids):
+        """Fetch ingredients for many recipes with one indexed query"""
+        ingredients_by_recipe = {recipe_id: [] for recipe_id in recipe_ids}
+        if not recipe_ids:
+            return ingredients_by_recipe
+
+        cursor.execute(
+            'SELECT ri.recipe_id, i.name, i.category '
+            'FROM recipe_ingredients ri JOIN ingredients i ON i.id = ri.ingredient_id '
+            'WHERE ri.recipe_id IN (%s) ORDER BY ri.recipe_id, ri.position'
+            % ','.join(['%s'] * len(recipe_ids)),
+            list(recipe_ids)
+        )
+        for recipe_id, name, category in cursor.fetchall():
+            ingredients_by_recipe.setdefault(recipe_id, []).append({'name': name, 'category': category})
+        return ingredients_by_recipe
+
+
+class MySQLBackend(SQLBackend):
+    """Recipes in MySQL, the production backend (e.g. on PythonAnywhere)"""
+
+    name = 'mysql'
+
+    UPSERT_INGREDIENTS = (
+        'INSERT INTO ingredients (name, category) VALUES (%s, %s) '
+        'ON DUPLICATE KEY UPDATE category = VALUES(category)'
+    )
+    INSERT_IGNORE_RECIPE_INGREDIENTS = (
+        'INSERT IGNORE INTO recipe_ingredients (recipe_id, position, ingredient_id) VALUES (%s, %s, %s)'
+    )
+    LOCK_ROWS = ' FOR UPDATE'
+
+    def __init__(self, db_config, pool_config=None, observe=None):
+        super().__init__(pool_config, observe)
+        self.db_config = db_config
+        # Imported here so that processes using another backend never load the driver
+        import mysql.connector
+        self._mysql = mysql.connector
+        self.errors = (mysql.connector.Error,)
+
+    def connect(self):
+        return self._mysql.connect(**self.db_config)
+
+    def init_schema(self):
+        with self._connection() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS recipes (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                name VARCHAR(255) NOT NULL,
+                idempotency_key CHAR(32) NULL,
+                revision BIGINT NOT NULL DEFAULT 0,
+                UNIQUE KEY uq_recipes_idempotency_key (idempotency_key),
+                KEY idx_recipes_name (name),
+                KEY idx_recipes_revision (revision)
+            ) ENGINE=InnoDB
+            ''')
+
+            # Change tracking for /changes: the current revision in row 1 and the
+            # newest pruned tombstone revision in row 2, and a tombstone for
+            # every deleted recipe
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS recipe_revision (
+                id TINYINT PRIMARY KEY,
+                revision BIGINT NOT NULL
+            ) ENGINE=InnoDB
+            ''')
+            cursor.execute('INSERT IGNORE INTO recipe_revision (id, revision) VALUES (1, 0), (2, 0)')
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS recipe_tombstones (
+                recipe_id INT PRIMARY KEY,
+                revision BIGINT NOT NULL,
+                KEY idx_recipe_tombstones_revision (revision)
+            ) ENGINE=InnoDB
+            ''')
+
+            # Ingredient catalog, one row per distinct ingredient name
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS ingredients (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                name VARCHAR(255) COLLATE utf8mb4_bin NOT NULL,
+                category VARCHAR(50) NULL,
+                UNIQUE KEY uq_ingredients_name (name)
+            ) ENGINE=InnoDB
+            ''')
+
+            # Join table; the primary key doubles as the recipe_id index
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS recipe_ingredients (
+                recipe_id INT NOT NULL,
+                position SMALLINT NOT NULL,
+                ingredient_id INT NOT NULL,
+                PRIMARY KEY (recipe_id, position),
+                KEY idx_recipe_ingredients_ingredient (ingredient_id),
+                FOREIGN KEY (recipe_id) REFERENCES recipes (id) ON DELETE CASCADE,
+                FOREIGN KEY (ingredient_id) REFERENCES ingredients (id)
+            ) ENGINE=InnoDB
+            ''')
+
+            # Saved menus with their materialized shopping list (JSON). menu_recipes
+            # finds the menus a recipe belongs to; deleted recipes are taken out of
+            # menus by the app, so it has no foreign key to recipes.
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS menus (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                name VARCHAR(255) NOT NULL,
+                recipe_ids TEXT NOT NULL,
+                shopping_list MEDIUMTEXT NOT NULL,
+                KEY idx_menus_name (name)
+            ) ENGINE=InnoDB
+            ''')
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS menu_recipes (
+                menu_id INT NOT NULL,
+                recipe_id INT NOT NULL,
+                PRIMARY KEY (menu_id, recipe_id),
+                KEY idx_menu_recipes_recipe (recipe_id),
+                FOREIGN KEY (menu_id) REFERENCES menus (id) ON DELETE CASCADE
+            ) ENGINE=InnoDB
+            ''')
+
+            conn.commit()
+            self._add_idempotency_key_column(cursor)
+            self._add_recipe_name_index(cursor)
+            self._add_revision_column(cursor)
+            migrated = self._migrate_json_ingredients(conn, cursor)
+            if migrated:
+                print(f"Migrated ingredients of {migrated} recipes to the normalized tables")
+            cursor.close()
+
+    @staticmethod
+    def _column_exists(cursor, column):
+        cursor.execute(
+            "SELECT COUNT(*) FROM information_schema.COLUMNS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'recipes' AND COLUMN_NAME = %s",
+            (column,)
+        )
+        return cursor.fetchone()[0] > 0
+
+    def _add_idempotency_key_column(self, cursor):
+        """Add recipes.idempotency_key to tables created before save_to_db was idempotent"""
+        if not self._column_exists(cursor, 'idempotency_key'):
+            cursor.execute(
+                'ALTER TABLE recipes ADD COLUMN idempotency_key CHAR(32) NULL, '
+                'ADD UNIQUE KEY uq_recipes_idempotency_key (idempotency_key)'
+            )
+
+    @staticmethod
+    def _add_recipe_name_index(cursor):
+        """Index recipes.name on older tables; used for name ordering and keyset pages"""
+        cursor.execute(
+            "SELECT COUNT(*) FROM information_schema.STATISTICS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'recipes' AND INDEX_NAME = 'idx_recipes_name'"
+        )
+        if not cursor.fetchone()[0]:
+            cursor.execute('ALTER TABLE recipes ADD KEY idx_recipes_name (name)')
+
+    def _add_revision_column(self, cursor):
+        """Add recipes.revision to tables created before change tracking; existing rows get 0"""
+        if not self._column_exists(cursor, 'revision'):
+            cursor.execute(
+                'ALTER TABLE recipes ADD COLUMN revision BIGINT NOT NULL DEFAULT 0, '
+                'ADD KEY idx_recipes_revision (revision)'
+            )
+
+    def _migrate_json_ingredients(self, conn, cursor):
+        """Move the legacy recipes.ingredients JSON column into the normalized tables.
+
+        Safe to run repeatedly: rows are inserted with INSERT IGNORE and the legacy
+        column is only dropped once every recipe has been converted.
+        """
+        if not self._column_exists(cursor, 'ingredients'):
+            return 0
+
+        cursor.execute('SELECT id, ingredients FROM recipes')
+        rows = cursor.fetchall()
+        recipe_ingredients = []
+        for recipe_id, ingredients_json in rows:
+            try:
+                ingredients = json.loads(ingredients_json or '[]')
+            except json.JSONDecodeError:
+                print(f"Skipping unreadable ingredients for recipe {recipe_id}")
+                ingredients = []
+            recipe_ingredients.append((recipe_id, ingredients))
+
+        self._store_ingredients(cursor, recipe_ingredients)
+        conn.commit()
+
+        # DDL commits implicitly, so this only runs after the data is safely copied
+        cursor.execute('ALTER TABLE recipes DROP COLUMN ingredients')
+        return len(rows)
+
+
+class _SQLiteCursor(sqlite3.Cursor):
+    """Cursor that accepts the %s placeholders the shared statements use"""
+
+    def execute(self, sql, params=()):
+        return super().execute(sql.replace('%s', '?'), params)
+
+    def executemany(self, sql, rows):
+        return super().executemany(sql.replace('%s', '?'), rows)
+
+
+class _SQLiteConnection(sqlite3.Connection):
+    def cursor(self, factory=_SQLiteCursor):
+        return super().cursor(factory)
+
+    def is_connected(self):
+        return True
+
+
+class SQLiteBackend(SQLBackend):
+    """Recipes in a local SQLite file, for single-machine installs and tests.
+
+    The schema is created on the first connection.
+    """
+
+    name = 'sqlite'
+
+    UPSERT_INGREDIENTS = (
+        'INSERT INTO ingredients (name, category) VALUES (%s, %s) '
+        'ON CONFLICT (name) DO UPDATE SET category = excluded.category'
+    )
+    INSERT_IGNORE_RECIPE_INGREDIENTS = (
+        'INSERT OR IGNORE INTO recipe_ingredients (recipe_id, position, ingredient_id) VALUES (%s, %s, %s)'
+    )
+    errors = (sqlite3.Error,)
+
+    def __init__(self, path, pool_config=None, timeout=10.0, observe=None):
+        super().__init__(pool_config, observe)
+        self.path = path
+        self.timeout = timeout
+        self._initialized = False
+        self._init_lock = threading.Lock()
+
+    def connect(self):
+        conn = sqlite3.connect(
+            self.path, timeout=self.timeout, factory=_SQLiteConnection, check_same_thread=False
+        )
+        conn.execute('PRAGMA foreign_keys = ON')
+        if not self._initialized:
+            with self._init_lock:
+                if not self._initialized:
+                    self._create_schema(conn)
+                    self._initialized = True
+        return conn
+
+    def init_schema(self):
+        with self._connection():
+            pass
+
+    @staticmethod
+    def _create_schema(conn):
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.executescript('''
+        CREATE TABLE IF NOT EXISTS recipes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            idempotency_key TEXT UNIQUE,
+            revision INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS idx_recipes_name ON recipes (name);
+        CREATE TABLE IF NOT EXISTS recipe_revision (
+            id INTEGER PRIMARY KEY,
+            revision INTEGER NOT NULL
+        );
+        INSERT OR IGNORE INTO recipe_revision (id, revision) VALUES (1, 0), (2, 0);
+        CREATE TABLE IF NOT EXISTS recipe_tombstones (
+            recipe_id INTEGER PRIMARY KEY,
+            revision INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_recipe_tombstones_revision ON recipe_tombstones (revision);
+        CREATE TABLE IF NOT EXISTS ingredients (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            category TEXT
+        );
+        CREATE TABLE IF NOT EXISTS recipe_ingredients (
+            recipe_id INTEGER NOT NULL REFERENCES recipes (id) ON DELETE CASCADE,
+            position INTEGER NOT NULL,
+            ingredient_id INTEGER NOT NULL REFERENCES ingredients (id),
+            PRIMARY KEY (recipe_id, position)
+        );
+        CREATE INDEX IF NOT EXISTS idx_recipe_ingredients_ingredient ON recipe_ingredients (ingredient_id);
+        CREATE TABLE IF NOT EXISTS menus (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            recipe_ids TEXT NOT NULL,
+            shopping_list TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_menus_name ON menus (name);
+        CREATE TABLE IF NOT EXISTS menu_recipes (
+            menu_id INTEGER NOT NULL REFERENCES menus (id) ON DELETE CASCADE,
+            recipe_id INTEGER NOT NULL,
+            PRIMARY KEY (menu_id, recipe_id)
+        );
+        CREATE INDEX IF NOT EXISTS idx_menu_recipes_recipe ON menu_recipes (recipe_id);
+        ''')
+        # Files created before change tracking have no recipes.revision yet
+        if 'revision' not in [row[1] for row in conn.execute('PRAGMA table_info(recipes)')]:
+            conn.execute('ALTER TABLE recipes ADD COLUMN revision INTEGER NOT NULL DEFAULT 0')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_recipes_revision ON recipes (revision)')
+
+
+class MemoryBackend(StorageBackend):
+    """Recipes in process memory, for development, tests and benchmarks.
+
+    Behaves like the SQL backends (shared ingredient catalog, idempotent
+    saves, keyset pages) but nothing survives a restart and every worker
+    process has its own copy.
+    """
+
+    name = 'memory'
+    # Every boot starts again at revision 0
+    durable = False
+
+    def __init__(self, recipes=()):
+        self._lock = threading.Lock()
+        self._recipes = {}  # id -> (name, [ingredient name, ...]), in id order
+        self._ids = []  # sorted ids, for keyset pages by id
+        self._categories = {}  # ingredient name -> category, like the ingredients table
+        self._keys = set()
+        self._next_id = 1
+        self._revision = 0
+        self._revisions = {}  # recipe id -> revision it was last changed at
+        self._tombstones = {}  # deleted recipe id -> revision it was deleted at
+        self._pruned = 0  # newest revision whose tombstones were pruned
+        self._menus = {}  # id -> {'id', 'name', 'recipe_ids', 'shopping_list'}
+        self._next_menu_id = 1
+        for recipe in recipes:
+            self._insert(recipe)
+
+    def _insert(self, recipe, recategorized=None):
+        # Called with the lock held (or from __init__); adds names whose category changes to recategorized
+        items = parse_ingredients(recipe['ingredients'])
+        resolved = resolve_categories(items, self._categories)
+        if recategorized is not None:
+            recategorized.update(
+                name for name, category in resolved.items() if self._categories.get(name, category) != category
+            )
+        self._categories.update(resolved)
+        recipe_id = self._next_id
+        self._next_id += 1
+        self._recipes[recipe_id] = (recipe['name'], [name for name, _ in items])
+        self._revisions[recipe_id] = self._revision
+        self._ids.append(recipe_id)
+        return recipe_id
+
+    def _ingredients(self, recipe_id):
+        return [
+            {'name': name, 'category': self._categories[name]}
+            for name in self._recipes[recipe_id][1]
+        ]
+
+    def _ordered_ids(self, order, after_id, after_name):
+        if order == 'name':
+            ids = sorted(self._recipes, key=lambda recipe_id: (self._recipes[recipe_id][0], recipe_id))
+            if after_id is None:
+                return ids
+            return [
+                recipe_id for recipe_id in ids
+                if (self._recipes[recipe_id][0], recipe_id) > (after_name, after_id)
+            ]
+        if after_id is None:
+            return list(self._ids)
+        return self._ids[bisect.bisect_right(self._ids, after_id):]
+
+    def list_recipes(self):
+        with self._lock:
+            recipes = [{'id': recipe_id, 'name': name} for recipe_id, (name, _) in self._recipes.items()]
+        recipes.sort(key=lambda recipe: recipe['name'])
+        return recipes
+
+    def recipe_ingredients(self, recipe_ids):
+        with self._lock:
+            return {
+                recipe_id: self._ingredients(recipe_id) if recipe_id in self._recipes else []
+                for recipe_id in recipe_ids
+            }
+
+    def recipe_page(self, order, after_id, after_name, limit):
+        with self._lock:
+            return [
+                {'id': recipe_id, 'name': self._recipes[recipe_id][0], 'ingredients': self._ingredients(recipe_id)}
+                for recipe_id in self._ordered_ids(order, after_id, after_name)[:limit]
+            ]
+
+    def iter_recipes(self, order='id', after_id=None, after_name=''):
+        # Served from a snapshot taken when iteration starts
+        with self._lock:
+            recipes = [
+                {'id': recipe_id, 'name': self._recipes[recipe_id][0], 'ingredients': self._ingredients(recipe_id)}
+                for recipe_id in self._ordered_ids(order, after_id, after_name)
+            ]
+        yield from recipes
+
+    def save_recipes(self, chunk):
+        inserted = []
+        with self._lock:
+            if any(key not in self._keys for key, _ in chunk):
+                self._revision += 1
+            recategorized = set()
+            for key, recipe in chunk:
+                if key in self._keys:
+                    continue
+                self._keys.add(key)
+                recipe_id = self._insert(recipe, recategorized)
+                inserted.append({'id': recipe_id, 'name': recipe['name'], 'ingredients': self._ingredients(recipe_id)})
+            if recategorized:
+                for recipe_id, (_, names) in self._recipes.items():
+                    if not recategorized.isdisjoint(names):
+                        self._revisions[recipe_id] = self._revision
+        return inserted
+
+    def reclassify_ingredients(self, batch_size=500):
+        with self._lock:
+            rows = [(name, name, category) for name, category in self._categories.items()]
+            changes = list(reclassified_catalog(rows))
+            renamed = {}
+            for keep, merged, name, category in changes:
+                for old in [keep] + merged:
+                    del self._categories[old]
+                    renamed[old] = name
+            for keep, merged, name, category in changes:
+                self._categories[name] = category
+            if changes:
+                self._revision += 1
+            for recipe_id, (recipe_name, names) in self._recipes.items():
+                if any(old in renamed for old in names):
+                    self._recipes[recipe_id] = (recipe_name, [renamed.get(old, old) for old in names])
+                    self._revisions[recipe_id] = self._revision
+        return {
+            'ingredients': len(rows),
+            'changed': len(changes),
+            'merged': sum(len(merged) for _, merged, _, _ in changes)
+        }
+
+    def pop_recipes(self, recipe_ids):
+        popped = {}
+        with self._lock:
+            for recipe_id in recipe_ids:
+                if recipe_id not in self._recipes or recipe_id in popped:
+                    continue
+                if not popped:
+                    self._revision += 1
+                popped[recipe_id] = {
+                    'id': recipe_id, 'name': self._recipes[recipe_id][0], 'ingredients': self._ingredients(recipe_id)
+                }
+                del self._recipes[recipe_id]
+                del self._revisions[recipe_id]
+                self._tombstones[recipe_id] = self._revision
+                self._ids.pop(bisect.bisect_left(self._ids, recipe_id))
+            horizon = self._revision - self.TOMBSTONE_REVISIONS
+            if popped and horizon > self._pruned:
+                kept = {recipe_id: revision for recipe_id, revision in self._tombstones.items() if revision > horizon}
+                if len(kept) < len(self._tombstones):
+                    self._tombstones = kept
+                    self._pruned = horizon
+        return popped
+
+    def revision(self):
+        with self._lock:
+            return self._revision
+
+    def changes(self, since, limit):
+        with self._lock:
+            changed = [recipe_id for recipe_id in self._ids if self._revisions[recipe_id] > since]
+            deleted = sorted(recipe_id for recipe_id, revision in self._tombstones.items() if revision > since)
+            if len(changed) > limit or len(deleted) > limit or since < self._pruned:
+                return {'revision': self._revision}
+            return {
+                'revision': self._revision,
+                'recipes': [
+                    {'id': recipe_id, 'name': self._recipes[recipe_id][0], 'ingredients': self._ingredients(recipe_id)}
+                    for recipe_id in changed
+                ],
+                'deleted': deleted
+            }
+
+    def create_menu(self, name, recipe_ids, shopping_list):
+        with self._lock:
+            menu_id = self._next_menu_id
+            self._next_menu_id += 1
+            # Stored as JSON would be, so callers never share the dicts
+            self._menus[menu_id] = json.loads(json.dumps({
+                'id': menu_id, 'name': name, 'recipe_ids': recipe_ids, 'shopping_list': shopping_list
+            }))
+        return menu_id
+
+    def list_menus(self):
+        with self._lock:
+            menus = [
+                {'id': menu['id'], 'name': menu['name'], 'recipe_ids': list(menu['recipe_ids'])}
+                for menu in self._menus.values()
+            ]
+        menus.sort(key=lambda menu: (menu['name'], menu['id']))
+        return menus
+
+    def get_menu(self, menu_id):
+        with self._lock:
+            menu = self._menus.get(menu_id)
+            return json.loads(json.dumps(menu)) if menu else None
+
+    def delete_menu(self, menu_id):
+        with self._lock:
+            return self._menus.pop(menu_id, None) is not None
+
+    def update_menus(self, update, recipe_ids=(), ingredient_names=()):
+        recipe_ids = set(recipe_ids)
+        ingredient_names = set(ingredient_names)
+        updated = 0
+        with self._lock:
+            for menu_id, menu in self._menus.items():
+                affected = any(
+                    recipe_id in recipe_ids
+                    or (recipe_id in self._recipes and not ingredient_names.isdisjoint(self._recipes[recipe_id][1]))
+                    for recipe_id in menu['recipe_ids']
+                )
+                if not affected:
+                    continue
+                result = update(json.loads(json.dumps(menu)))
+                if result is None:
+                    continue
+                new_ids, shopping_list = result
+                self._menus[menu_id] = json.loads(json.dumps({
+                    'id': menu_id, 'name': menu['name'], 'recipe_ids': new_ids, 'shopping_list': shopping_list
+                }))
+                updated += 1
+        return updated
+
+    def stats(self):
+        with self._lock:
+            return {'recipes': len(self._recipes), 'ingredients': len(self._categories)}
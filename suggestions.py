@@ -0,0 +1,144 @@
+import bisect
+from collections import Counter
+
+
+def normalize_name(name):
+    """Case-fold and collapse whitespace so lookups ignore formatting"""
+    return ' '.join(str(name).casefold().split())
+
+
+def trigrams(text):
+    padded = f'  {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def bounded_edit_distance(a, b, max_distance):
+    """Levenshtein distance between a and b, or None if it exceeds max_distance.
+
+    Only the diagonal band of width 2 * max_distance + 1 is computed; cells
+    outside it can never lead to a distance within the bound.
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return None
+    too_far = max_distance + 1
+    previous = [j if j <= max_distance else too_far for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        char_a = a[i - 1]
+        low = max(1, i - max_distance)
+        high = min(len(b), i + max_distance)
+        current = [too_far] * (len(b) + 1)
+        current[0] = i if i <= max_distance else too_far
+        best = current[0] if low == 1 else too_far
+        for j in range(low, high + 1):
+            cost = previous[j - 1] + (char_a != b[j - 1])
+            if previous[j] + 1 < cost:
+                cost = previous[j] + 1
+            if current[j - 1] + 1 < cost:
+                cost = current[j - 1] + 1
+            current[j] = cost
+            if cost < best:
+                best = cost
+        # Every path through this row already costs too much
+        if best > max_distance:
+            return None
+        previous = current
+    return previous[-1] if previous[-1] <= max_distance else None
+
+
+class SuggestionIndex:
+    """In-memory index of recipe names for suggest-as-you-type.
+
+    Built once from (name, ingredients) pairs. Prefix matches come from a
+    sorted key list (binary search, like walking a trie); typo-tolerant
+    matches are found by gathering the names that share the most trigrams
+    with the query and checking only those with a bounded edit distance.
+    Trigram postings are bucketed by name length, so only names that are
+    short or long enough to be within the typo budget are ever counted.
+    """
+
+    # Names sharing the most trigrams with the query that get an edit-distance check
+    MAX_FUZZY_CANDIDATES = 32
+
+    def __init__(self, recipes):
+        self._ingredients = {}
+        for name, ingredients in recipes:
+            key = normalize_name(name)
+            if key and key not in self._ingredients:
+                self._ingredients[key] = (name, ingredients)
+        self._keys = sorted(self._ingredients)
+
+        self._trigrams = {}  # (name length, trigram) -> positions in self._keys
+        for position, key in enumerate(self._keys):
+            for gram in trigrams(key):
+                self._trigrams.setdefault((len(key), gram), []).append(position)
+
+    def __len__(self):
+        return len(self._keys)
+
+    @staticmethod
+    def max_typos(key):
+        """Typos tolerated for a name of this length"""
+        return 1 if len(key) < 8 else 2
+
+    def lookup(self, name):
+        """Ingredients for an exact (case-insensitive) name or a close typo, else None"""
+        key = normalize_name(name)
+        if key in self._ingredients:
+            return self._ingredients[key][1]
+        matches = self._fuzzy(key, limit=1)
+        if matches:
+            return self._ingredients[matches[0][1]][1]
+        return None
+
+    def suggest(self, query, limit=5):
+        """Up to limit suggestions: exact match, then prefix matches, then typo matches"""
+        key = normalize_name(query)
+        if not key:
+            return []
+
+        found = []
+        start = bisect.bisect_left(self._keys, key)
+        for candidate in self._keys[start:start + limit]:
+            if not candidate.startswith(key):
+                break
+            found.append((candidate, 'exact' if candidate == key else 'prefix'))
+
+        if len(found) < limit:
+            seen = {candidate for candidate, _ in found}
+            for _, candidate in self._fuzzy(key, limit):
+                if candidate not in seen and len(found) < limit:
+                    found.append((candidate, 'fuzzy'))
+
+        return [
+            {'name': self._ingredients[candidate][0], 'match': match}
+            for candidate, match in found
+        ]
+
+    def _fuzzy(self, key, limit):
+        """[(distance, key)] of names within the typo budget, best first"""
+        if len(key) < 3:
+            return []
+        max_distance = self.max_typos(key)
+        lengths = range(len(key) - max_distance, len(key) + max_distance + 1)
+        postings = {
+            gram: [self._trigrams.get((length, gram), ()) for length in lengths]
+            for gram in trigrams(key)
+        }
+
+        # One edit destroys at most three trigrams, so a match shares all but
+        # 3 * max_distance of the query's trigrams and must therefore contain
+        # at least one of any 3 * max_distance + 1 of them: count only the rarest.
+        rarest = sorted(postings, key=lambda gram: sum(map(len, postings[gram])))
+        shared = Counter()
+        for gram in rarest[:3 * max_distance + 1]:
+            for positions in postings[gram]:
+                shared.update(positions)
+
+        matches = []
+        for position, _ in shared.most_common(self.MAX_FUZZY_CANDIDATES):
+            candidate = self._keys[position]
+            distance = bounded_edit_distance(key, candidate, max_distance)
+            if distance is not None:
+                matches.append((distance, candidate))
+        matches.sort()
+        return matches[:limit]
@@ -0,0 +1,114 @@
+import time
+import threading
+import pytest
+
+from admission import AdmissionControl, Overloaded
+
+
+class TestAdmissionControl:
+    def test_rejects_when_the_queue_is_full(self):
+        control = AdmissionControl(1, queue_size=0)
+        assert control.acquire() == 0.0
+        with pytest.raises(Overloaded) as excinfo:
+            control.acquire()
+        assert excinfo.value.reason == 'queue_full'
+
+        control.release()
+        control.acquire()
+        assert control.stats()['rejected'] == {'queue_full': 1, 'timeout': 0}
+
+    def test_waiters_get_a_released_slot(self):
+        control = AdmissionControl(1, queue_size=1, timeout=5)
+        control.acquire()
+        waited = []
+        waiter = threading.Thread(target=lambda: waited.append(control.acquire()))
+        waiter.start()
+        while control.stats()['waiting'] == 0:
+            time.sleep(0.001)
+
+        # The queue holds one waiter; the next caller is turned away at once
+        with pytest.raises(Overloaded):
+            control.acquire()
+        control.release()
+        waiter.join()
+
+        assert waited[0] > 0
+        stats = control.stats()
+        assert (stats['active'], stats['waiting'], stats['admitted'], stats['waits']) == (1, 0, 2, 1)
+
+    def test_waiters_time_out(self):
+        control = AdmissionControl(1, queue_size=1, timeout=0.01)
+        control.acquire()
+        with pytest.raises(Overloaded) as excinfo:
+            control.acquire()
+        assert excinfo.value.reason == 'timeout'
+        assert control.stats()['waiting'] == 0
+
+    def test_waiter_after_a_timed_out_one_gets_the_slot(self):
+        control = AdmissionControl(1, queue_size=2, timeout=0.5)
+        control.acquire()
+        outcomes = []
+
+        def wait():
+            try:
+                outcomes.append(control.acquire())
+            except Overloaded as e:
+                outcomes.append(e.reason)
+
+        first = threading.Thread(target=wait)
+        first.start()
+        while control.stats()['waiting'] < 1:
+            time.sleep(0.001)
+        time.sleep(0.25)
+        second = threading.Thread(target=wait)
+        second.start()
+        first.join()
+        assert outcomes == ['timeout']
+
+        control.release()
+        second.join()
+        assert outcomes[1] > 0
+        assert control.stats()['active'] == 1
+
+    def test_a_waiter_leaving_after_its_wakeup_passes_the_slot_on(self):
+        control = AdmissionControl(1, queue_size=2, timeout=5)
+        control.acquire()
+        real_wait = control._cond.wait
+        interrupted = []
+
+        def wait(timeout):
+            woken = real_wait(timeout)
+            if not interrupted:
+                interrupted.append(threading.current_thread().name)
+                raise RuntimeError('interrupted')
+            return woken
+
+        control._cond.wait = wait
+        outcomes = []
+
+        def acquire():
+            try:
+                outcomes.append(control.acquire())
+            except RuntimeError as e:
+                outcomes.append(str(e))
+
+        first, second = threading.Thread(target=acquire), threading.Thread(target=acquire)
+        first.start()
+        while control.stats()['waiting'] < 1:
+            time.sleep(0.001)
+        second.start()
+        while control.stats()['waiting'] < 2:
+            time.sleep(0.001)
+
+        control.release()
+        first.join()
+        second.join(timeout=1)
+        assert not second.is_alive()
+        assert outcomes[0] == 'interrupted' and outcomes[1] > 0
+
+    def test_zero_limit_admits_everyone(self):
+        control = AdmissionControl(0)
+        for _ in range(100):
+            control.acquire()
+        control.release()
+        assert control.stats()['active'] == 0
@@ -1,15 +1,22 @@
 import requests
+import gzip
 import json
+import re
+import shutil
 import time
 import os
 import subprocess
 import pytest
 
+from app import create_app, SAMPLE_RECIPES
+from staging import StagingStore
+from storage import MemoryBackend, StorageError
+
 # Define paths relative to this script to avoid CWD issues with pytest
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 CONFIG_PATH = os.path.join(SCRIPT_DIR, "config.ini")
 CONFIG_TEST_PATH = os.path.join(SCRIPT_DIR, "config.ini.test")
-RECIPES_JSON_PATH = os.path.join(SCRIPT_DIR, "recipes.json")
+STAGING_PATH = os.path.join(SCRIPT_DIR, "staging.db")
 
 def setup_test_env():
     """Set up test environment with mock config"""
@@ -54,9 +61,9 @@ class TestFlaskApp:
 
     def setup_method(self, method):
         """Setup that runs before each test"""
-        # Clean up recipes.json before each test
-        with open(RECIPES_JSON_PATH, "w") as f:
-            json.dump([], f)
+        # Clean up the staging store before each test
+        self.staging = StagingStore(STAGING_PATH)
+        self.staging.remove([entry_id for entry_id, _, _ in self.staging.entries()])
 
     def test_01_index_page(self):
         """Test the main page (recipe selector) loads"""
@@ -82,9 +89,8 @@ class TestFlaskApp:
         assert response.status_code == 200
         assert response.json()["success"] is True
 
-        # Verify it was saved to JSON
-        with open(RECIPES_JSON_PATH, "r") as f:
-            recipes = json.load(f)
+        # Verify it was saved to the staging store
+        recipes = self.staging.all()
         assert len(recipes) == 1
         assert recipes[0]["name"] == "Test Recipe"
         assert len(recipes[0]["ingredients"]) == 3
@@ -104,9 +110,8 @@ class TestFlaskApp:
         assert response.status_code == 200
         assert response.json()["success"] is True
 
-        # Verify it was deleted from JSON
-        with open(RECIPES_JSON_PATH, "r") as f:
-            recipes = json.load(f)
+        # Verify it was deleted from the staging store
+        recipes = self.staging.all()
         assert len(recipes) == 0
 
     def test_05_default_ingredients(self):
@@ -118,11 +123,12 @@ class TestFlaskApp:
         assert response.status_code == 200
         ingredients = response.json()["ingredients"]
         assert isinstance(ingredients, list)
-        assert "bloem" in ingredients
-        assert "eieren" in ingredients
+        names = [ingredient["name"] if isinstance(ingredient, dict) else ingredient for ingredient in ingredients]
+        assert "bloem" in names
+        assert "eieren" in names
 
     def test_06_save_to_db(self):
-        """Test saving to database (should work in dev mode)"""
+        """Test saving to the development server's in-memory database"""
         # First add a recipe
         recipe_data = {
             "name": "Test Recipe",
@@ -133,7 +139,10 @@ class TestFlaskApp:
         # Try to save to database
         response = requests.post(f"{self.base_url}/save_to_db")
         assert response.status_code == 200
-        assert "Development mode" in response.json()["message"]
+        data = response.json()
+        assert data["success"] is True
+        assert data["inserted"] == 1
+        assert self.staging.all() == []
 
     def test_07_get_ingredients(self):
         """Test getting ingredients for selected recipes"""
@@ -215,5 +224,665 @@ class TestFlaskApp:
         
         print("Bootstrap navbar functionality test passed successfully")
 
+    def test_09_pool_stats(self):
+        """Test the storage statistics endpoint"""
+        response = requests.get(f"{self.base_url}/pool_stats")
+        assert response.status_code == 200
+        stats = response.json()
+        # The development server uses the in-memory backend, which has no pool
+        assert stats["backend"] == "memory"
+        assert stats["recipes"] >= 9
+
+    def test_10_shopping_list(self):
+        """Test the aggregated shopping list for a selection of recipes"""
+        response = requests.post(
+            f"{self.base_url}/shopping_list",
+            json={"recipe_ids": [1, 6]}
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert data["success"] is True
+
+        items = {
+            item["name"]: item
+            for category in data["categories"]
+            for item in category["items"]
+        }
+        # Shared ingredients appear once, with both recipes as contributors
+        assert items["bloem"]["count"] == 2
+        assert items["bloem"]["recipe_ids"] == [1, 6]
+        assert items["zout"]["count"] == 1
+
+        # Categories follow INGREDIENT_CATEGORIES order
+        keys = [category["key"] for category in data["categories"]]
+        assert keys == ["droge-waren", "zuivel", "kruiden"]
+        assert data["text"].startswith("Droge waren\n- bloem\n- gist")
+
+    def test_11_index_conditional_get(self):
+        """Test that the recipe selector answers revalidation with 304"""
+        response = requests.get(self.base_url)
+        assert response.status_code == 200
+        etag = response.headers["ETag"]
+        assert "Last-Modified" not in response.headers
+
+        response = requests.get(self.base_url, headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.headers["ETag"] == etag
+
+        stats = requests.get(f"{self.base_url}/cache_stats").json()
+        for key in ("hits", "misses", "recipe_set_version"):
+            assert key in stats
+        assert "coalesced" in stats["single_flight"]
+
+    def test_12_view_db_pagination(self):
+        """Test keyset pages and the streaming mode of the database view"""
+        response = requests.get(f"{self.base_url}/view_db", params={"page_size": 1})
+        assert response.status_code == 200
+        assert "Recept #1:" in response.text
+        assert "Recept #2:" not in response.text
+        assert "after_id=1" in response.text
+
+        response = requests.get(
+            f"{self.base_url}/view_db",
+            params={"page_size": 1, "after_id": 1}
+        )
+        assert "Recept #2:" in response.text
+        assert "Recept #3:" not in response.text
+        assert "Eerste pagina" in response.text
+
+        response = requests.get(
+            f"{self.base_url}/view_db",
+            params={"page_size": 500, "after_id": 1}
+        )
+        assert "Recept #1:" not in response.text
+        assert "Recept #9:" in response.text
+        assert "Volgende pagina" not in response.text
+
+        response = requests.get(f"{self.base_url}/view_db", params={"stream": 1})
+        assert response.status_code == 200
+        assert "Recept #1:" in response.text
+        assert "Recept #2:" in response.text
+
+    def test_13_default_ingredients_suggestions(self):
+        """Test typo-tolerant default ingredients and name suggestions"""
+        response = requests.post(
+            f"{self.base_url}/get_default_ingredients",
+            json={"recipe_name": "Pannekoeken"}
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert "bloem" in [ingredient["name"] for ingredient in data["ingredients"]]
+
+        response = requests.post(
+            f"{self.base_url}/get_default_ingredients",
+            json={"recipe_name": "ap"}
+        )
+        data = response.json()
+        assert data["ingredients"] is None
+        assert data["suggestions"][0]["name"].lower() == "appeltaart"
+
+    def test_14_metrics(self):
+        """Test the Prometheus metrics endpoint"""
+        requests.get(self.base_url)
+        requests.post(f"{self.base_url}/add_recipe", json={"name": "Metrics", "ingredients": ["zout"]})
+
+        response = requests.get(f"{self.base_url}/metrics")
+        assert response.status_code == 200
+        assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+        assert "# TYPE recipes_http_request_duration_seconds histogram" in response.text
+        assert 'recipes_http_requests_total{endpoint="recipes.index",method="GET",status="200"}' in response.text
+        assert 'recipes_http_response_size_bytes_count{endpoint="recipes.index"}' in response.text
+        assert 'recipes_staging_operation_duration_seconds_count{operation="write"}' in response.text
+
+    def test_15_search_by_ingredients(self):
+        """Test ranking saved recipes by the ingredients they use"""
+        response = requests.get(f"{self.base_url}/search", params={"ingredients": "bloem,boter,melk"})
+        assert response.status_code == 200
+        data = response.json()
+        assert data["success"] is True
+        assert data["total"] == 5
+        assert [r["name"] for r in data["results"]] == [
+            "Poffertjes", "Appeltaart", "Pannenkoeken", "Chocolate Cake", "Bitterballen"
+        ]
+        assert data["next_offset"] is None
+
+        response = requests.get(f"{self.base_url}/search", params={"ingredient": ["bloem", "gist"], "match": "all"})
+        assert [r["name"] for r in response.json()["results"]] == ["Poffertjes"]
+
+        response = requests.get(f"{self.base_url}/search")
+        assert response.status_code == 400
+
+class TestInProcessApp:
+    """Tests against create_app() with the in-memory backend, no server process needed"""
+
+    @pytest.fixture
+    def client(self, tmp_path):
+        config_path = tmp_path / "config.ini"
+        config_path.write_text(f"[STAGING]\nPATH = {tmp_path / 'staging.db'}\n\n[SAVE]\nCHUNK_SIZE = 500\n")
+        self.app = create_app(str(config_path), storage=MemoryBackend())
+        return self.app.test_client()
+
+    def test_save_and_browse_many_recipes(self, client):
+        """Stage, save and page through a larger batch of recipes"""
+        staging = self.app.extensions["recipes"].staging
+        staging.extend([
+            {"name": f"Recept {n:04d}", "ingredients": [f"ingredient {n % 50}", "zout"]}
+            for n in range(1200)
+        ])
+
+        data = client.post("/save_to_db").get_json()
+        assert data["success"] is True
+        assert data["inserted"] == 1200
+        assert [chunk["rows"] for chunk in data["chunks"]] == [500, 500, 200]
+        assert staging.all() == []
+
+        response = client.get("/view_db", query_string={"page_size": 500, "after_id": 1000})
+        assert "Recept #1001:" in response.text
+        assert "Recept #1200:" in response.text
+        assert "Volgende pagina" not in response.text
+
+        data = client.post("/shopping_list", json={"recipe_ids": [2, 52, 3]}).get_json()
+        items = {item["name"]: item for category in data["categories"] for item in category["items"]}
+        assert items["ingredient 1"]["recipe_ids"] == [2, 52]
+        assert items["zout"]["count"] == 3
+
+    def test_background_save(self, client):
+        state = self.app.extensions["recipes"]
+        state.staging.extend([{"name": f"Recept {n}", "ingredients": ["zout"]} for n in range(1200)])
+
+        response = client.post("/save_to_db", query_string={"background": "1"})
+        assert response.status_code == 202
+        data = response.get_json()
+        assert data["rows"] == 1200
+        assert response.headers["Location"] == data["status_url"] == f"/jobs/{data['job_id']}"
+        # Recipes staged after the save was queued wait for the next one
+        state.staging.append({"name": "Later", "ingredients": []})
+
+        state.jobs.join()
+        job = client.get(data["status_url"]).get_json()["job"]
+        assert job["status"] == "done"
+        assert job["error"] is None
+        assert job["progress"]["rows"] == job["progress"]["rows_written"] == job["progress"]["inserted"] == 1200
+        assert [chunk["rows"] for chunk in job["progress"]["chunks"]] == [500, 500, 200]
+        assert len(state.storage.list_recipes()) == 1200
+        assert state.staging.all() == [{"name": "Later", "ingredients": []}]
+        assert "Recept 1199" in client.get("/").text
+
+        assert client.get("/jobs/unknown").status_code == 404
+
+    def test_unfinished_jobs_resume_on_the_first_request(self, client, tmp_path):
+        state = self.app.extensions["recipes"]
+        state.staging.append({"name": "Hutspot", "ingredients": ["uien"]})
+        job_id = state.job_store.create("save_to_db", {"entry_ids": [entry_id for entry_id, _, _ in state.staging.entries()]})
+
+        # After a restart, creating the app leaves the job alone and starts no workers
+        app = create_app(str(tmp_path / "config.ini"), storage=state.storage)
+        restarted = app.extensions["recipes"]
+        assert restarted.job_store.get(job_id)["status"] == "queued"
+        assert restarted.jobs._threads == []
+
+        client = app.test_client()
+        client.get("/jobs/unknown")
+        restarted.jobs.join()
+        assert client.get(f"/jobs/{job_id}").get_json()["job"]["status"] == "done"
+        assert [recipe["name"] for recipe in state.storage.list_recipes()] == ["Hutspot"]
+
+        client.get("/jobs/unknown")
+        state.jobs.join()
+        assert client.get(f"/jobs/{job_id}").get_json()["job"]["status"] == "done"
+        assert [recipe["name"] for recipe in state.storage.list_recipes()] == ["Hutspot"]
+
+    def test_delete_and_export_invalidates_reads(self, client):
+        storage = self.app.extensions["recipes"].storage
+        storage.save_recipes([("key", {"name": "Hutspot", "ingredients": ["uien"]})])
+        assert "Hutspot" in client.get("/").text
+
+        data = client.post("/delete_and_export_recipe/1").get_json()
+        assert data["success"] is True
+        assert data["recipe"]["ingredients"] == [{"name": "uien", "category": "verse-groenten-fruit"}]
+        assert "Hutspot" not in client.get("/").text
+        assert self.app.extensions["recipes"].staging.all()[0]["name"] == "Hutspot"
+
+        data = client.post("/delete_and_export_recipe/1").get_json()
+        assert data == {"success": False, "error": "Recipe not found"}
+
+    def test_batch_delete_and_export(self, client):
+        state = self.app.extensions["recipes"]
+        state.storage.save_recipes([
+            (f"key-{n}", {"name": f"Recept {n}", "ingredients": ["uien"]}) for n in range(4)
+        ])
+        assert client.post("/delete_and_export_recipes", json={"recipe_ids": "1,2"}).status_code == 400
+
+        data = client.post("/delete_and_export_recipes", json={"recipe_ids": [3, 1, 99, 1]}).get_json()
+        assert data["success"] is True
+        assert data["deleted"] == 2
+        assert [(result["id"], result["success"]) for result in data["results"]] == [(3, True), (1, True), (99, False)]
+        assert data["results"][0]["recipe"]["name"] == "Recept 2"
+        assert [recipe["name"] for recipe in state.staging.all()] == ["Recept 2", "Recept 0"]
+        assert [recipe["id"] for recipe in state.storage.list_recipes()] == [2, 4]
+
+        page = client.get("/view_db").text
+        assert 'class="form-check-input me-2 select-recipe" value="4"' in page
+
+    def test_batch_add_recipes(self, client):
+        staging = self.app.extensions["recipes"].staging
+        assert client.post("/add_recipes", json={"recipes": []}).status_code == 400
+        assert client.post("/add_recipe", json={"ingredients": ["zout"]}).status_code == 400
+
+        response = client.post("/add_recipes", json={"recipes": [
+            {"name": " Hutspot ", "ingredients": [{"name": "Uien", "category": "Verse groenten en fruit"}, "wortelen"]},
+            {"name": "", "ingredients": ["zout"]},
+            {"name": "Stamppot", "ingredients": [{"name": "kool", "category": "groente"}]},
+            {"name": "Poffertjes", "ingredients": ["bloem", {"name": "melk", "category": ""}]},
+        ]})
+        data = response.get_json()
+        assert response.status_code == 200
+        assert data["success"] is False
+        assert data["added"] == 2
+        assert [result["success"] for result in data["results"]] == [True, False, False, True]
+        assert data["results"][2]["error"] == "Unknown category 'groente' for ingredient 'kool'"
+        assert staging.all() == [
+            {"name": "Hutspot", "ingredients": [
+                {"name": "uien", "category": "verse-groenten-fruit"}, {"name": "wortelen", "category": None}
+            ]},
+            {"name": "Poffertjes", "ingredients": [
+                {"name": "bloem", "category": None}, {"name": "melk", "category": None}
+            ]},
+        ]
+
+        # A bare array works too; nothing valid means nothing is staged
+        response = client.post("/add_recipes", json=[{"name": "Leeg", "ingredients": "zout"}])
+        assert response.status_code == 400
+        assert response.get_json()["added"] == 0
+        assert len(staging.all()) == 2
+
+    def test_saved_menus_follow_saves_and_deletes(self, client):
+        state = self.app.extensions["recipes"]
+        state.storage.save_recipes([
+            ("key-1", {"name": "Stamppot", "ingredients": ["aardappelen", "truffel"]}),
+            ("key-2", {"name": "Pannenkoeken", "ingredients": ["bloem", "melk"]}),
+            ("key-3", {"name": "Appeltaart", "ingredients": ["appels", "bloem"]}),
+        ])
+        assert client.post("/menus", json={"name": "Week", "recipe_ids": [1, 99]}).status_code == 400
+
+        response = client.post("/menus", json={"name": "Week", "recipe_ids": [1, 2, 3]})
+        assert response.status_code == 201
+        menu_id = response.get_json()["id"]
+        selection = client.post("/shopping_list", json={"recipe_ids": [1, 2, 3]}).get_json()
+        data = client.get(f"/menus/{menu_id}").get_json()
+        assert (data["categories"], data["text"]) == (selection["categories"], selection["text"])
+        assert client.get("/menus").get_json()["menus"] == [{"id": menu_id, "name": "Week", "recipe_ids": [1, 2, 3]}]
+
+        # A new recipe picks a category for truffel; deleting Pannenkoeken drops melk
+        state.staging.append({"name": "Risotto", "ingredients": [{"name": "truffel", "category": "conserven"}]})
+        client.post("/save_to_db")
+        client.post("/delete_and_export_recipe/2")
+        data = client.get(f"/menus/{menu_id}").get_json()
+        assert data["recipe_ids"] == [1, 3]
+        items = {item["name"]: (category["key"], item["recipe_ids"]) for category in data["categories"] for item in category["items"]}
+        assert items == {
+            "aardappelen": ("verse-groenten-fruit", [1]),
+            "truffel": ("conserven", [1]),
+            "appels": ("verse-groenten-fruit", [3]),
+            "bloem": ("droge-waren", [3]),
+        }
+        selection = client.post("/shopping_list", json={"recipe_ids": [1, 3]}).get_json()
+        assert data["categories"] == selection["categories"]
+
+        assert client.delete(f"/menus/{menu_id}").get_json() == {"success": True}
+        assert client.get(f"/menus/{menu_id}").status_code == 404
+        # create, get, list, update on save, update on delete, get, delete, get
+        assert 'recipes_db_query_duration_seconds_count{query="menus"} 8' in client.get("/metrics").text
+
+    def test_profiling_and_slow_requests(self, tmp_path):
+        config_path = tmp_path / "profiling.ini"
+        config_path.write_text(
+            f"[STAGING]\nPATH = {tmp_path / 'staging.db'}\n\n"
+            "[PROFILING]\nTOKEN = secret\nSLOW_THRESHOLD_MS = 60000\nTOP_N = 5\n"
+        )
+        app = create_app(str(config_path), storage=MemoryBackend(SAMPLE_RECIPES))
+        client = app.test_client()
+        admin = {"X-Admin-Token": "secret"}
+
+        # Fast requests are not kept; profiling needs the token
+        client.get("/view_db")
+        assert "X-Profile-Id" not in client.get("/view_db?profile=1").headers
+        assert client.get("/debug/slow").status_code == 404
+        assert client.get("/debug/slow", headers={"X-Admin-Token": "wrong"}).status_code == 404
+        assert client.get("/debug/slow?format=json", headers=admin).get_json()["requests"] == []
+
+        response = client.get("/view_db?profile=1", headers=admin)
+        assert response.headers["X-Profile-Id"] == "1"
+        client.post("/get_ingredients", json={"recipe_ids": [1, 2]}, headers={**admin, "X-Profile": "1"})
+
+        data = client.get("/debug/slow?format=json", headers=admin).get_json()
+        ingredients, view_db = data["requests"]
+        assert (view_db["path"], view_db["trigger"], view_db["status"]) == ("/view_db?profile=1", "admin", 200)
+        assert view_db["db_calls"] >= 1
+        assert view_db["template_calls"] == 1
+        assert 0 < len(view_db["functions"]) <= 5
+        assert ingredients["endpoint"] == "recipes.get_ingredients"
+        assert ingredients["json_calls"] >= 1
+
+        page = client.get("/debug/slow", headers=admin)
+        assert "GET /view_db?profile=1" in page.text
+        # The token is only accepted as a header, so it never ends up in a logged path
+        assert client.get("/debug/slow?admin_token=secret").status_code == 404
+
+        # Streamed responses are recorded once their body has been sent
+        response = client.get("/view_db?stream=1&profile=1", headers=admin)
+        assert "Stamppot" in response.get_data(as_text=True)
+        response.close()
+        streamed = client.get("/debug/slow?format=json", headers=admin).get_json()["requests"][0]
+        assert (streamed["path"], streamed["trigger"], streamed["status"]) == ("/view_db?stream=1&profile=1", "admin", 200)
+        assert any("view_db.html" in entry["function"] for entry in streamed["functions"])
+
+    def test_profiling_is_off_without_a_token(self, tmp_path):
+        config_path = tmp_path / "no_token.ini"
+        config_path.write_text(
+            f"[STAGING]\nPATH = {tmp_path / 'staging.db'}\n\n[PROFILING]\nTOKEN =\nSLOW_THRESHOLD_MS = 0\n"
+        )
+        app = create_app(str(config_path), storage=MemoryBackend(SAMPLE_RECIPES), development=True)
+        client = app.test_client()
+        assert "X-Profile-Id" not in client.get("/view_db?profile=1", headers={"X-Admin-Token": ""}).headers
+        assert client.get("/debug/slow", headers={"X-Admin-Token": ""}).status_code == 404
+        assert app.extensions["recipes"].slow_requests.recent() == []
+
+    def test_admission_control_sheds_load(self, tmp_path):
+        config_path = tmp_path / "admission.ini"
+        config_path.write_text(
+            f"[STAGING]\nPATH = {tmp_path / 'staging.db'}\n\n"
+            "[ADMISSION]\nMAX_CONCURRENT = 1\nQUEUE_SIZE = 0\nRETRY_AFTER = 2\n"
+        )
+        app = create_app(str(config_path), storage=MemoryBackend(SAMPLE_RECIPES))
+        client = app.test_client()
+        admission = app.extensions["recipes"].admission
+
+        assert client.get("/view_db").status_code == 200
+        assert admission.stats()["active"] == 0
+
+        # Another request holds the only slot
+        admission.acquire()
+        response = client.get("/view_db")
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "2"
+        assert response.get_json()["success"] is False
+        # Endpoints that do not use the database are let through
+        assert client.post("/add_recipe", json={"name": "Soep", "ingredients": ["prei"]}).status_code == 200
+        assert client.get("/recipe_manager").status_code == 200
+        assert client.delete("/delete_recipe/0").get_json() == {"success": True}
+        assert client.get("/pool_stats").get_json()["admission"]["rejected"]["queue_full"] == 1
+        admission.release()
+
+        assert client.get("/view_db").status_code == 200
+        text = client.get("/metrics").text
+        assert 'recipes_admission_rejections_total{endpoint="recipes.view_db",reason="queue_full"} 1' in text
+        assert "recipes_admission_wait_seconds_count 2" in text
+
+        # By default the job workers and a background index rebuild keep a pool connection each
+        config_path.write_text(
+            f"[STAGING]\nPATH = {tmp_path / 'staging.db'}\n\n[POOL]\nSIZE = 3\nMAX_OVERFLOW = 2\n\n[JOBS]\nWORKERS = 2\n"
+        )
+        assert create_app(str(config_path), storage=MemoryBackend()).extensions["recipes"].admission.limit == 2
+
+    def test_search_follows_saves_and_deletes(self, client):
+        staging = self.app.extensions["recipes"].staging
+        staging.extend([
+            {"name": f"Recept {n:02d}", "ingredients": ["zout"] + (["bloem"] if n % 2 else [])}
+            for n in range(30)
+        ])
+        client.post("/save_to_db")
+
+        data = client.get("/search", query_string={"ingredients": "bloem,zout", "limit": 10}).get_json()
+        assert data["total"] == 30
+        assert data["results"][0] == {"id": 2, "name": "Recept 01", "matched": ["bloem", "zout"], "ingredient_count": 2}
+        assert data["next_offset"] == 10
+
+        # Index is built now; later writes update it in place
+        staging.append({"name": "Pannenkoeken", "ingredients": ["bloem", "melk"]})
+        client.post("/save_to_db")
+        client.post("/delete_and_export_recipe/2")
+        data = client.get("/search", query_string={"ingredient": "bloem", "limit": 100}).get_json()
+        assert data["total"] == 15
+        assert data["results"][0]["name"] == "Pannenkoeken"
+        assert "Recept 01" not in [result["name"] for result in data["results"]]
+
+    def test_validators_follow_the_storage_revision(self, tmp_path):
+        """Workers sharing a database agree on ETags; a write by one invalidates the others"""
+        config_path = tmp_path / "workers.ini"
+        config_path.write_text(
+            f"[STAGING]\nPATH = {tmp_path / 'staging.db'}\n\n"
+            f"[STORAGE]\nBACKEND = sqlite\nPATH = {tmp_path / 'recipes.db'}\n\n"
+            "[CACHE]\nREVISION_CHECK_SECONDS = 0\n"
+        )
+        worker_a = create_app(str(config_path)).test_client()
+        worker_b = create_app(str(config_path)).test_client()
+        etag = worker_a.get("/").headers["ETag"]
+        assert worker_b.get("/", headers={"If-None-Match": etag}).status_code == 304
+
+        worker_a.post("/add_recipe", json={"name": "Stamppot", "ingredients": ["rookworst"]})
+        worker_a.post("/save_to_db")
+        response = worker_b.get("/", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert "Stamppot" in response.text
+        assert response.headers["ETag"] != etag
+
+        # Only the ETag validates: If-Modified-Since would compare against one worker's clock
+        assert worker_b.get("/", headers={"If-Modified-Since": "Fri, 01 Jan 2100 00:00:00 GMT"}).status_code == 200
+
+        # The in-memory backend starts again at revision 0 after a restart
+        memory_etags = {
+            create_app(str(config_path), storage=MemoryBackend()).test_client().get("/").headers["ETag"]
+            for _ in range(2)
+        }
+        assert len(memory_etags) == 2
+
+    def test_search_follows_writes_by_other_workers(self, tmp_path):
+        """Each worker's ingredient index catches up with the storage revision"""
+        config_path = tmp_path / "workers.ini"
+        config_path.write_text(
+            f"[STAGING]\nPATH = {tmp_path / 'staging.db'}\n\n"
+            f"[STORAGE]\nBACKEND = sqlite\nPATH = {tmp_path / 'recipes.db'}\n\n"
+            "[CACHE]\nREVISION_CHECK_SECONDS = 0\n"
+        )
+        app_a = create_app(str(config_path))
+        worker_b = create_app(str(config_path)).test_client()
+        assert worker_b.get("/search?ingredient=rookworst").get_json()["total"] == 0
+
+        source = tmp_path / "recipes.ndjson"
+        source.write_text(
+            '{"name": "Stamppot", "ingredients": [{"name": "rookworst", "category": "vlees-vis"}]}\n'
+            '{"name": "Erwtensoep", "ingredients": [{"name": "rookworst", "category": "vlees-vis"}]}\n'
+        )
+        assert app_a.test_cli_runner().invoke(args=["import-recipes", str(source)]).exit_code == 0
+        data = worker_b.get("/search?ingredient=rookworst").get_json()
+        assert sorted(result["name"] for result in data["results"]) == ["Erwtensoep", "Stamppot"]
+
+        app_a.test_client().post("/delete_and_export_recipe/1")
+        data = worker_b.get("/search?ingredient=rookworst").get_json()
+        assert [result["name"] for result in data["results"]] == ["Erwtensoep"]
+
+    def test_no_validators_without_a_revision(self, tmp_path):
+        class UnreadableRevision(MemoryBackend):
+            def revision(self):
+                raise StorageError("database unavailable")
+
+        config_path = tmp_path / "config.ini"
+        config_path.write_text(f"[STAGING]\nPATH = {tmp_path / 'staging.db'}\n")
+        client = create_app(str(config_path), storage=UnreadableRevision(SAMPLE_RECIPES)).test_client()
+        response = client.post("/shopping_list", json={"recipe_ids": [1]}, headers={"If-None-Match": 'W/"recipes-None-0"'})
+        assert response.status_code == 200
+        assert "ETag" not in response.headers
+
+    def test_invalid_suggestion_input(self, client):
+        response = client.post("/get_default_ingredients", json={"recipe_name": "ap", "limit": "veel"})
+        assert response.status_code == 400
+        assert response.get_json() == {"success": False, "error": "limit must be a positive integer"}
+        assert client.post("/get_default_ingredients", json={"recipe_name": "ap", "limit": 2}).status_code == 200
+
+    def test_invalid_get_ingredients_input(self, client):
+        for body in (None, [1], {"recipe_ids": [[1]]}, {"recipe_ids": "1,2"}, {"recipe_ids": [1.5]}):
+            response = client.post("/get_ingredients", json=body)
+            assert response.status_code == 400
+            assert response.get_json() == {"success": False, "error": "recipe_ids must be a list of ids"}
+
+        # Repeated ids are answered once
+        self.app.extensions["recipes"].storage.save_recipes([("key-1", {"name": "Stamppot", "ingredients": ["rookworst"]})])
+        data = client.post("/get_ingredients", json={"recipe_ids": [1, 1]}).get_json()
+        assert [ingredient["name"] for ingredient in data["ingredients"]] == ["rookworst"]
+
+    def test_invalid_shopping_list_input(self, client):
+        response = client.post("/shopping_list", json={"recipe_ids": [[1]]})
+        assert response.status_code == 400
+        assert response.get_json() == {"success": False, "error": "recipe_ids must be a list of ids"}
+        assert client.post("/shopping_list", json={"recipe_ids": "1,2"}).status_code == 400
+        assert client.post("/shopping_list", json={"recipe_ids": []}).get_json()["categories"] == []
+
+    def test_changes_since_revision(self, client):
+        assert client.get("/changes").status_code == 400
+        assert 'data-revision="0"' in client.get("/").text
+        assert client.get("/changes?since=0").get_json() == {"success": True, "revision": 0, "recipes": [], "deleted": []}
+
+        staging = self.app.extensions["recipes"].staging
+        staging.extend([{"name": "Stamppot", "ingredients": ["rookworst"]}, {"name": "Hutspot", "ingredients": ["uien"]}])
+        client.post("/save_to_db")
+        assert 'data-revision="1"' in client.get("/").text
+
+        data = client.get("/changes?since=0").get_json()
+        assert data["revision"] == 1
+        assert [(recipe["id"], recipe["name"]) for recipe in data["recipes"]] == [(1, "Stamppot"), (2, "Hutspot")]
+        assert data["recipes"][0]["ingredients"] == [{"name": "rookworst", "category": "vlees-vis"}]
+
+        client.post("/delete_and_export_recipes", json={"recipe_ids": [1]})
+        data = client.get("/changes?since=1").get_json()
+        assert (data["revision"], data["recipes"], data["deleted"]) == (2, [], [1])
+
+        # A revision the server never handed out, e.g. after the database was replaced
+        assert client.get("/changes?since=7").get_json() == {"success": True, "reset": True, "revision": 2}
+
+    def test_ingredient_map(self, client, tmp_path):
+        staging = self.app.extensions["recipes"].staging
+        staging.extend([
+            {"name": "Stamppot", "ingredients": ["aardappelen", "rookworst"]},
+            {"name": "Hutspot", "ingredients": ["aardappelen", "uien", "</script>"]},
+        ])
+        client.post("/save_to_db")
+
+        page = client.get("/").text
+        embedded = page.split('<script type="application/json" id="ingredient-map">')[1].split("</script>")[0]
+        ingredient_map = json.loads(embedded)
+        assert ingredient_map["ingredients"] == ["aardappelen", "rookworst", "uien", "</script>"]
+        assert ingredient_map["recipes"] == {"1": [0, 1], "2": [0, 2, 3]}
+
+        # Larger catalogs load the same map in chunks
+        data = client.get("/ingredient_map").get_json()
+        assert data["recipes"] == ingredient_map["recipes"]
+        assert data["next_after_id"] is None
+        assert client.get("/ingredient_map?after_id=1").get_json()["recipes"] == {"2": [0, 1, 2]}
+
+        config_path = tmp_path / "no_embed.ini"
+        config_path.write_text(f"[STAGING]\nPATH = {tmp_path / 'staging.db'}\n\n[INDEX]\nEMBED_MAX_RECIPES = 5\n")
+        app = create_app(str(config_path), storage=MemoryBackend(SAMPLE_RECIPES))
+        page = app.test_client().get("/").text
+        assert 'id="ingredient-map"' not in page
+        assert 'data-recipe-name="Stamppot"' in page
+
+    def test_export_and_import_ndjson(self, client, tmp_path):
+        storage = self.app.extensions["recipes"].storage
+        storage.save_recipes([
+            (f"key-{n}", {"name": f"Recept {n}", "ingredients": [{"name": "melk", "category": "zuivel"}]})
+            for n in range(3)
+        ])
+        response = client.get("/export", query_string={"after_id": 1})
+        assert response.mimetype == "application/x-ndjson"
+        lines = response.get_data(as_text=True).splitlines()
+        assert [json.loads(line)["name"] for line in lines] == ["Recept 1", "Recept 2"]
+
+        body = "\n".join(lines + ['{"name": "Pap", "ingredients": [{"name": "melk", "category": "Zuivel"}]}'])
+        response = client.post("/import", data=body, query_string={"batch_size": 1})
+        assert response.status_code == 400
+        assert response.get_json()["imported"] == 2
+        assert response.get_json()["resume_line"] == 3
+        assert "Recept 1" in client.get("/").text
+
+        source = tmp_path / "recipes.ndjson"
+        source.write_text("\n".join(lines))
+        runner = self.app.test_cli_runner()
+        result = runner.invoke(args=["import-recipes", str(source)])
+        assert result.exit_code == 0
+        assert "skipped 2 already imported" in result.output
+        result = runner.invoke(args=["export-recipes"])
+        assert len(result.stdout.splitlines()) == 5
+
+    def test_compressed_responses(self, client):
+        storage = self.app.extensions["recipes"].storage
+        storage.save_recipes([
+            (f"key-{n}", {"name": f"Recept {n}", "ingredients": [f"ingredient {n} {m}" for m in range(10)]})
+            for n in range(100)
+        ])
+        recipe_ids = list(range(1, 101))
+
+        plain = client.post("/get_ingredients", json={"recipe_ids": recipe_ids})
+        assert "Content-Encoding" not in plain.headers
+        assert len(plain.get_json()["ingredients"]) == 1000
+        assert plain.get_json()["ingredients"][0] == {"name": "ingredient 0 0", "category": "overig"}
+
+        response = client.post("/get_ingredients", json={"recipe_ids": recipe_ids}, headers={"Accept-Encoding": "gzip"})
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert "Accept-Encoding" in response.headers["Vary"]
+        assert gzip.decompress(response.data) == plain.data
+        assert int(response.headers["Content-Length"]) < len(plain.data) // 4
+
+        # Small bodies are sent as they are
+        response = client.get("/pool_stats", headers={"Accept-Encoding": "gzip"})
+        assert "Content-Encoding" not in response.headers
+
+        response = client.get("/view_db", query_string={"stream": 1}, headers={"Accept-Encoding": "gzip"})
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert "Recept #100:" in gzip.decompress(response.data).decode()
+
+        # A client that goes away mid-stream still ends the request and frees its slot
+        state = self.app.extensions["recipes"]
+        response = client.get("/view_db", query_string={"stream": 1}, headers={"Accept-Encoding": "gzip"}, buffered=False)
+        next(iter(response.response))
+        assert state.admission.stats()["active"] == 1
+        response.close()
+        assert state.admission.stats()["active"] == 0
+
+    def test_fingerprinted_assets(self, client, tmp_path):
+        # Without a build the sources are linked with a version query
+        page = client.get("/").text
+        assert "/static/js/index.js?v=" in page
+        assert "/static/css/styles.css?v=" in page
+        assert "<script>" not in page
+
+        static_dir = tmp_path / "static"
+        shutil.copytree(self.app.static_folder, static_dir, ignore=shutil.ignore_patterns("dist"))
+        self.app.static_folder = str(static_dir)
+        result = self.app.test_cli_runner().invoke(args=["build-assets"])
+        assert result.exit_code == 0
+
+        page = client.get("/").text
+        built = re.search(r'src="(/static/dist/js/index\.[0-9a-f]{12}\.min\.js)"', page).group(1)
+        response = client.get(built)
+        assert response.status_code == 200
+        assert response.headers["Cache-Control"] == "public, max-age=31536000, immutable"
+
+        response = client.get("/static/js/index.js")
+        assert "immutable" not in response.headers.get("Cache-Control", "")
+
+    def test_module_level_app_for_older_wsgi_files(self, tmp_path, monkeypatch):
+        import app as app_module
+        config_path = tmp_path / "wsgi.ini"
+        config_path.write_text(f"[STAGING]\nPATH = {tmp_path / 'staging.db'}\n\n[STORAGE]\nBACKEND = memory\n")
+        monkeypatch.setenv("RECIPES_CONFIG", str(config_path))
+        monkeypatch.setattr(app_module, "_default_app", None)
+
+        from app import app as application
+        assert application is app_module.app
+        assert application.test_client().get("/view_db").status_code == 200
+        with pytest.raises(AttributeError):
+            app_module.application
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
@@ -0,0 +1,84 @@
+import os
+import json
+import subprocess
+import shutil
+
+import pytest
+
+from assets import ASSETS, AssetManifest, build, is_fingerprinted, minify_css, minify_js
+
+
+def test_minify_js_keeps_strings_and_templates():
+    source = """
+    // comment
+    const greeting = 'a  //  b';   /* block */
+    const html = `<li>
+        ${items.map(item => `<b>${item.name}</b>`).join(', ')}  x
+    </li>`;
+    if (a - -b > 1) {
+        return "  spaced  ";
+    }
+    """
+    assert minify_js(source) == (
+        "const greeting='a  //  b';\n"
+        "const html=`<li>\n"
+        "        ${items.map(item=>`<b>${item.name}</b>`).join(', ')}  x\n"
+        "    </li>`;\n"
+        "if(a - -b>1){\n"
+        "return \"  spaced  \";\n"
+        "}\n"
+    )
+
+
+def test_minify_js_keeps_regex_literals():
+    source = """
+    const url = text.replace(/https?:\\/\\/[^ ]+/g, '');  // strip links
+    if (/["']/.test(s)) { x = a / b / c; }
+    return /a  b/i.test(main / 2)
+    """
+    assert minify_js(source) == (
+        "const url=text.replace(/https?:\\/\\/[^ ]+/g,'');\n"
+        "if(/[\"']/.test(s)){x=a / b / c;}\n"
+        "return /a  b/i.test(main / 2)\n"
+    )
+
+
+def test_minify_css():
+    source = "/* Base */\n.a > .b :hover {\n    color: red;\n    margin: 0 auto;\n}\n"
+    assert minify_css(source) == ".a>.b :hover{color:red;margin:0 auto}\n"
+
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='node is not installed')
+def test_minified_scripts_still_parse(tmp_path):
+    static_dir = os.path.join(os.path.dirname(__file__), 'static')
+    for name in (name for name in ASSETS if name.endswith('.js')):
+        with open(os.path.join(static_dir, name)) as f:
+            path = tmp_path / os.path.basename(name)
+            path.write_text(minify_js(f.read()))
+        subprocess.run(['node', '--check', str(path)], check=True)
+
+
+def test_build_writes_fingerprinted_files_and_a_manifest(tmp_path):
+    (tmp_path / 'js').mkdir()
+    (tmp_path / 'js' / 'app.js').write_text('let a = 1;   // one\n')
+
+    manifest = build(str(tmp_path), ['js/app.js'])
+    built = manifest['js/app.js']
+    assert built.startswith('dist/js/app.') and built.endswith('.min.js')
+    assert is_fingerprinted(built)
+    assert (tmp_path / built).read_text() == 'let a=1;\n'
+    assert json.loads((tmp_path / 'dist' / 'manifest.json').read_text()) == manifest
+    assert AssetManifest(str(tmp_path)).path('js/app.js') == (built, {})
+
+    # A change gets a new name; the old file stays for pages that still link it
+    (tmp_path / 'js' / 'app.js').write_text('let a = 2;\n')
+    assert build(str(tmp_path), ['js/app.js'])['js/app.js'] != built
+    assert (tmp_path / built).exists()
+
+
+def test_manifest_falls_back_to_versioned_sources(tmp_path):
+    (tmp_path / 'styles.css').write_text('a {}')
+    name, args = AssetManifest(str(tmp_path)).path('styles.css')
+    assert name == 'styles.css'
+    assert len(args['v']) == 12
+    assert not is_fingerprinted('dist/manifest.json')
@@ -0,0 +1,36 @@
+import os
+import sys
+import json
+import subprocess
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def test_benchmark_reports_every_route(tmp_path):
+    """A tiny run completes without errors and writes comparable JSON"""
+    output = tmp_path / 'results.json'
+    result = subprocess.run(
+        [sys.executable, os.path.join(SCRIPT_DIR, 'benchmark.py'),
+         '--recipes', '20', '--ingredients', '3', '--requests', '6', '--concurrency', '2',
+         '--save-batch', '2', '--output', str(output)],
+        capture_output=True, text=True, timeout=120
+    )
+    assert result.returncode == 0, result.stderr
+
+    report = json.loads(output.read_text())
+    assert set(report['routes']) == {'index', 'get_ingredients', 'view_db', 'add_recipe', 'save_to_db'}
+    for route in report['routes'].values():
+        assert route['requests'] == 6
+        assert route['errors'] == 0
+        assert route['p50_ms'] <= route['p95_ms'] <= route['p99_ms']
+    assert report['routes']['save_to_db']['storage_calls_per_request'] > 0
+
+    # Comparing a run with itself never reports a regression
+    result = subprocess.run(
+        [sys.executable, os.path.join(SCRIPT_DIR, 'benchmark.py'),
+         '--recipes', '20', '--ingredients', '3', '--requests', '6', '--concurrency', '2',
+         '--routes', 'get_ingredients', '--output', str(tmp_path / 'again.json'),
+         '--compare', str(output), '--tolerance', '1000'],
+        capture_output=True, text=True, timeout=120
+    )
+    assert result.returncode == 0, result.stderr
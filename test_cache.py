@@ -0,0 +1,109 @@
+import time
+import threading
+
+from cache import TTLCache, SingleFlight, SingleFlightTimeout
+
+
+class TestTTLCache:
+    def test_hit_and_miss_counters(self):
+        """Lookups are counted as hits or misses"""
+        cache = TTLCache(maxsize=10, ttl=60)
+        assert cache.get('a') is None
+        cache.set('a', [1, 2])
+        assert cache.get('a') == [1, 2]
+
+        stats = cache.stats()
+        assert stats['hits'] == 1
+        assert stats['misses'] == 1
+        assert stats['hit_ratio'] == 0.5
+
+    def test_least_recently_used_entry_is_evicted(self):
+        """A full cache drops the entry that was used longest ago"""
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')  # 'b' is now the least recently used
+        cache.set('c', 3)
+
+        assert cache.get('b') is None
+        assert cache.get('a') == 1
+        assert cache.get('c') == 3
+        assert cache.stats()['evictions'] == 1
+
+    def test_entries_expire_after_ttl(self):
+        """Entries older than the TTL are treated as misses"""
+        cache = TTLCache(maxsize=10, ttl=0.01)
+        cache.set('a', 1)
+        time.sleep(0.02)
+
+        assert cache.get('a', 'gone') == 'gone'
+        stats = cache.stats()
+        assert stats['expired'] == 1
+        assert stats['entries'] == 0
+
+
+class TestSingleFlight:
+    def _run_concurrently(self, flight, fn, callers=5):
+        results, errors = [], []
+
+        def call():
+            try:
+                results.append(flight.do('key', fn))
+            except Exception as err:
+                errors.append(err)
+
+        threads = [threading.Thread(target=call) for _ in range(callers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results, errors
+
+    def test_concurrent_calls_share_one_execution(self):
+        flight = SingleFlight()
+        executions = []
+
+        def slow_read():
+            executions.append(1)
+            # Stay in flight until the other four callers have joined this call
+            deadline = time.monotonic() + 5
+            while flight.stats()['coalesced'] < 4 and time.monotonic() < deadline:
+                time.sleep(0.001)
+            return ['recipe']
+
+        results, errors = self._run_concurrently(flight, slow_read)
+
+        assert errors == []
+        assert results == [['recipe']] * 5
+        assert len(executions) == 1
+        stats = flight.stats()
+        assert stats['executed'] == 1
+        assert stats['coalesced'] == 4
+        assert stats['in_flight'] == 0
+
+    def test_error_reaches_every_waiter(self):
+        flight = SingleFlight()
+
+        def failing_read():
+            time.sleep(0.1)
+            raise RuntimeError('database down')
+
+        results, errors = self._run_concurrently(flight, failing_read)
+
+        assert results == []
+        assert len(errors) == 5
+        assert all(str(err) == 'database down' for err in errors)
+
+    def test_waiter_times_out(self):
+        flight = SingleFlight(timeout=0.05)
+
+        def slow_read():
+            time.sleep(0.3)
+            return 'late'
+
+        results, errors = self._run_concurrently(flight, slow_read, callers=2)
+
+        assert results == ['late']
+        assert len(errors) == 1
+        assert isinstance(errors[0], SingleFlightTimeout)
+        assert flight.stats()['timeouts'] == 1
@@ -0,0 +1,21 @@
+from catalog import category_key, chosen_category, resolve_categories
+
+
+def test_category_key_accepts_keys_and_labels():
+    assert category_key('zuivel') == 'zuivel'
+    assert category_key(' Verse groenten en fruit ') == 'verse-groenten-fruit'
+    assert category_key('Droge Waren') == 'droge-waren'
+    assert category_key('snoep') is None
+    assert category_key(None) is None
+    assert chosen_category('Overig') is None
+
+
+def test_resolve_categories_order():
+    items = [('melk', None), ('bloem', 'overig'), ('truffel', None), ('kaas', 'kruiden'), ('kaas', None)]
+    stored = {'bloem': 'brood-bakkerij', 'truffel': 'overig'}
+    assert resolve_categories(items, stored) == {
+        'melk': 'zuivel',
+        'bloem': 'brood-bakkerij',
+        'truffel': 'overig',
+        'kaas': 'kruiden',
+    }
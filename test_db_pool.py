@@ -0,0 +1,113 @@
+import time
+import threading
+import pytest
+
+from db_pool import ConnectionPool, PoolTimeoutError
+
+
+class FakeConnection:
+    """Minimal stand-in for a mysql.connector connection"""
+    def __init__(self):
+        self.alive = True
+        self.closed = False
+        self.rollbacks = 0
+
+    def is_connected(self):
+        return self.alive
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = True
+
+
+class FakeConnector:
+    def __init__(self):
+        self.created = []
+
+    def __call__(self):
+        conn = FakeConnection()
+        self.created.append(conn)
+        return conn
+
+
+class TestConnectionPool:
+    def test_connection_is_reused(self):
+        """Closing a pooled connection returns it for the next borrower"""
+        connector = FakeConnector()
+        pool = ConnectionPool(connector, size=2, max_overflow=0)
+
+        conn = pool.acquire()
+        conn.close()
+        conn.close()  # Double close must not return it twice
+        pool.acquire().close()
+
+        assert len(connector.created) == 1
+        assert connector.created[0].rollbacks == 2
+        stats = pool.stats()
+        assert stats['open'] == 1
+        assert stats['idle'] == 1
+        assert stats['in_use'] == 0
+        assert stats['acquired'] == 2
+
+    def test_overflow_connections_are_closed_on_release(self):
+        """Connections beyond the pool size are discarded when returned"""
+        connector = FakeConnector()
+        pool = ConnectionPool(connector, size=1, max_overflow=1)
+
+        first, second = pool.acquire(), pool.acquire()
+        assert pool.stats()['in_use'] == 2
+        first.close()
+        second.close()
+
+        assert connector.created[1].closed
+        assert pool.stats()['open'] == 1
+
+    def test_exhausted_pool_times_out(self):
+        """Borrowing from a full pool waits up to the timeout and then fails"""
+        pool = ConnectionPool(FakeConnector(), size=1, max_overflow=0, timeout=0.05)
+        conn = pool.acquire()
+
+        with pytest.raises(PoolTimeoutError):
+            pool.acquire()
+
+        stats = pool.stats()
+        assert stats['timeouts'] == 1
+        assert stats['waits'] == 1
+        assert stats['wait_time'] > 0
+        conn.close()
+
+    def test_waiter_gets_released_connection(self):
+        """A blocked borrower is woken up when a connection is returned"""
+        pool = ConnectionPool(FakeConnector(), size=1, max_overflow=0, timeout=2)
+        conn = pool.acquire()
+        threading.Timer(0.05, conn.close).start()
+
+        pool.acquire().close()
+        assert pool.stats()['waits'] == 1
+
+    def test_dead_connection_is_replaced_on_borrow(self):
+        """Validate-on-borrow discards connections that lost their server"""
+        connector = FakeConnector()
+        pool = ConnectionPool(connector, size=1, validate_on_borrow=True)
+        pool.acquire().close()
+        connector.created[0].alive = False
+
+        pool.acquire().close()
+
+        assert len(connector.created) == 2
+        assert connector.created[0].closed
+        assert pool.stats()['invalidated'] == 1
+
+    def test_old_connection_is_recycled(self):
+        """Connections older than the recycle age are replaced"""
+        connector = FakeConnector()
+        pool = ConnectionPool(connector, size=1, recycle=0.01)
+        pool.acquire().close()
+        time.sleep(0.02)
+
+        pool.acquire().close()
+
+        assert len(connector.created) == 2
+        assert pool.stats()['recycled'] == 1
@@ -0,0 +1,69 @@
+import gzip
+import zlib
+from datetime import datetime, timezone
+
+from flask import Flask
+from werkzeug.datastructures import Accept
+from werkzeug.http import parse_accept_header
+
+import encoding
+
+
+def accept(header):
+    return parse_accept_header(header, Accept)
+
+
+def test_fast_provider_matches_the_default(monkeypatch):
+    app = Flask(__name__)
+    app.json = encoding.FastJSONProvider(app)
+    data = {'b': [1, 2.5, None], 'a': 'ë', 'when': datetime(2024, 1, 2, tzinfo=timezone.utc)}
+    fast = app.json.loads(app.json.dumps(data))
+    assert fast['when'] == 'Tue, 02 Jan 2024 00:00:00 GMT'
+
+    monkeypatch.setattr(encoding, 'orjson', None)
+    assert app.json.loads(app.json.dumps(data)) == fast
+    with app.app_context():
+        assert app.json.response(data).get_json() == fast
+
+
+def test_dumps_bytes_is_compact():
+    assert encoding.dumps_bytes([{'name': 'melk', 'category': None}]) == b'[{"category":null,"name":"melk"}]'
+
+
+def test_negotiate_encoding(monkeypatch):
+    monkeypatch.setattr(encoding, 'brotli', None)
+    assert encoding.negotiate_encoding(accept('gzip, deflate, br')) == 'gzip'
+    assert encoding.negotiate_encoding(accept('gzip;q=0, identity')) is None
+    assert encoding.negotiate_encoding(accept('*')) == 'gzip'
+    assert encoding.negotiate_encoding(accept('')) is None
+
+    monkeypatch.setattr(encoding, 'brotli', object())
+    assert encoding.negotiate_encoding(accept('gzip, br')) == 'br'
+    assert encoding.negotiate_encoding(accept('gzip, br'), streamed=True) == 'gzip'
+
+
+def test_gzip_stream_round_trips():
+    chunks = [f'<tr><td>{n}</td></tr>\n' for n in range(5000)]
+    compressed = list(encoding.gzip_stream(iter(chunks), level=1))
+    # Flushed while streaming, not only at the end
+    assert len(compressed) > 2
+    assert gzip.decompress(b''.join(compressed)).decode() == ''.join(chunks)
+    # Every flushed prefix can already be decoded
+    assert zlib.decompressobj(31).decompress(compressed[0]).startswith(b'<tr><td>0</td></tr>')
+
+
+def test_closing_the_gzip_stream_closes_its_source():
+    closed = []
+
+    def rows():
+        try:
+            while True:
+                yield 'x' * encoding.STREAM_FLUSH_SIZE
+        finally:
+            closed.append(True)
+
+    source = rows()
+    stream = encoding.gzip_stream(source)
+    next(stream)
+    stream.close()
+    assert closed == [True]
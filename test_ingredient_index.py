@@ -0,0 +1,52 @@
+from ingredient_index import IngredientIndex
+
+
+RECIPES = [
+    (1, 'Pannenkoeken', ['bloem', 'melk', 'eieren', 'zout']),
+    (2, 'Poffertjes', ['bloem', 'gist', 'melk', 'boter']),
+    (3, 'Appeltaart', ['appels', 'bloem', 'boter', 'kaneel']),
+    (4, 'Chocolate Cake', ['bloem', 'suiker', 'cacao', 'eieren', 'boter']),
+    (5, 'Stamppot', ['aardappelen', 'boerenkool', 'rookworst', 'spekjes']),
+]
+
+
+def names(results):
+    return [result['name'] for result in results]
+
+
+class TestIngredientIndex:
+    def test_ranked_by_matches_then_coverage_then_name(self):
+        index = IngredientIndex(RECIPES)
+        total, results = index.search(['Bloem', 'boter', 'melk'])
+        assert total == 4
+        assert names(results) == ['Poffertjes', 'Appeltaart', 'Pannenkoeken', 'Chocolate Cake']
+        assert results[0] == {
+            'id': 2, 'name': 'Poffertjes', 'matched': ['bloem', 'boter', 'melk'], 'ingredient_count': 4
+        }
+
+    def test_two_ingredients(self):
+        index = IngredientIndex(RECIPES)
+        total, results = index.search(['eieren', 'boter'])
+        assert total == 4
+        assert names(results) == ['Chocolate Cake', 'Appeltaart', 'Pannenkoeken', 'Poffertjes']
+
+    def test_match_all_and_pages(self):
+        index = IngredientIndex(RECIPES)
+        assert index.search(['bloem', 'boter'], match_all=True) == (3, index.search(['bloem', 'boter'], limit=3)[1])
+        total, results = index.search(['bloem'], limit=2, offset=2)
+        assert total == 4
+        assert names(results) == ['Poffertjes', 'Chocolate Cake']
+        assert index.search(['truffel']) == (0, [])
+        assert index.search([' ']) == (0, [])
+
+    def test_incremental_updates_match_a_rebuild(self):
+        index = IngredientIndex()
+        for recipe in RECIPES:
+            index.add(*recipe)
+        index.remove(3)
+        index.remove(99)
+        index.add(2, 'Poffertjes', ['bloem', 'melk'])
+        rebuilt = IngredientIndex([RECIPES[0], (2, 'Poffertjes', ['bloem', 'melk']), RECIPES[3], RECIPES[4]])
+        assert len(index) == 4
+        for query in (['bloem'], ['boter', 'melk'], ['bloem', 'boter', 'eieren', 'gist']):
+            assert index.search(query) == rebuilt.search(query)
@@ -0,0 +1,79 @@
+import os
+import time
+import threading
+
+import pytest
+
+from jobs import JobStore, JobQueue, JobQueueFull
+
+
+class TestJobQueue:
+    def test_runs_jobs_and_records_progress(self, tmp_path):
+        store = JobStore(str(tmp_path / 'jobs.db'))
+
+        def run(job, progress):
+            progress({'rows_written': 1})
+            if job['payload']['fail']:
+                raise RuntimeError('database is gone')
+            return {'inserted': 2}
+
+        jobs = JobQueue(store, run)
+        done = jobs.submit('save', {'fail': False})
+        failed = jobs.submit('save', {'fail': True})
+        jobs.join()
+
+        job = store.get(done)
+        assert job['status'] == 'done'
+        assert job['progress'] == {'rows_written': 1, 'inserted': 2}
+        assert job['finished_at'] >= job['started_at'] >= job['created_at']
+        job = store.get(failed)
+        assert job['status'] == 'failed'
+        assert job['error'] == 'database is gone'
+        assert job['progress'] == {'rows_written': 1}
+        assert store.get('missing') is None
+
+    def test_bounded_queue(self, tmp_path):
+        store = JobStore(str(tmp_path / 'jobs.db'))
+        release = threading.Event()
+
+        def run(job, progress):
+            release.wait(5)
+
+        jobs = JobQueue(store, run, max_pending=1)
+
+        first = jobs.submit('save', {})
+        # Once the worker has taken the first job there is room for one more
+        while store.get(first)['status'] != 'running':
+            time.sleep(0.01)
+        jobs.submit('save', {})
+        with pytest.raises(JobQueueFull):
+            jobs.submit('save', {})
+        release.set()
+        jobs.join()
+        assert store.get(first)['status'] == 'done'
+
+    def test_resume_jobs_of_a_dead_process(self, tmp_path):
+        store = JobStore(str(tmp_path / 'jobs.db'))
+        queued = store.create('save', {'n': 1})
+        running = store.create('save', {'n': 2})
+        assert store.claim(running) is True
+        assert store.claim(running) is False
+
+        # The claim belongs to this process, which has not resumed anything yet:
+        # to a new queue it looks like the process before a restart
+        ran = []
+        jobs = JobQueue(JobStore(store.path), lambda job, progress: ran.append(job['payload']['n']))
+        assert jobs.resume() == 2
+        jobs.join()
+        assert sorted(ran) == [1, 2]
+        assert store.get(queued)['status'] == store.get(running)['status'] == 'done'
+
+    def test_running_jobs_of_live_processes_are_left_alone(self, tmp_path):
+        store = JobStore(str(tmp_path / 'jobs.db'))
+        job_id = store.create('save', {})
+        store.claim(job_id)
+        with store._transaction() as conn:
+            conn.execute('UPDATE jobs SET owner = ? WHERE id = ?', (os.getppid(), job_id))
+
+        assert store.requeue_orphans() == []
+        assert store.get(job_id)['status'] == 'running'
@@ -0,0 +1,51 @@
+from menus import build_shopping_list, compact_ingredient_map, updated_menu
+
+
+INGREDIENTS = {
+    1: [{'name': 'aardappelen', 'category': 'verse-groenten-fruit'}, {'name': 'rookworst', 'category': 'vlees-vis'}],
+    2: [{'name': 'bloem', 'category': 'droge-waren'}, {'name': 'melk', 'category': 'zuivel'}],
+    3: [{'name': 'appels', 'category': 'verse-groenten-fruit'}, {'name': 'bloem', 'category': 'droge-waren'}],
+}
+
+
+def menu(recipe_ids):
+    categories, text = build_shopping_list(recipe_ids, INGREDIENTS)
+    return {'id': 1, 'name': 'Week', 'recipe_ids': recipe_ids, 'shopping_list': {'categories': categories, 'text': text}}
+
+
+class TestBuildShoppingList:
+    def test_groups_and_deduplicates(self):
+        categories, text = build_shopping_list([2, 3], INGREDIENTS)
+        assert [category['key'] for category in categories] == ['droge-waren', 'verse-groenten-fruit', 'zuivel']
+        bloem = categories[0]['items'][0]
+        assert (bloem['name'], bloem['recipe_ids'], bloem['count']) == ('bloem', [2, 3], 2)
+        assert text == 'Droge waren\n- bloem\n\nVerse groenten en fruit\n- appels\n\nZuivel\n- melk'
+
+
+class TestUpdatedMenu:
+    def test_unaffected_menu(self):
+        assert updated_menu(menu([1, 2]), removed=[3], categories={'bloem': 'droge-waren'}) is None
+
+    def test_removed_recipes_leave_the_list(self):
+        recipe_ids, shopping_list = updated_menu(menu([1, 2, 3]), removed=[3, 1])
+        assert recipe_ids == [2]
+        assert shopping_list == menu([2])['shopping_list']
+
+    def test_changed_categories_move_items(self):
+        recipe_ids, shopping_list = updated_menu(menu([2, 3]), categories={'bloem': 'brood-bakkerij', 'kaas': 'zuivel'})
+        assert recipe_ids == [2, 3]
+        changed = {**INGREDIENTS, 2: [{'name': 'bloem', 'category': 'brood-bakkerij'}, INGREDIENTS[2][1]]}
+        categories, text = build_shopping_list([2, 3], changed)
+        assert shopping_list == {'categories': categories, 'text': text}
+
+
+class TestCompactIngredientMap:
+    def test_interns_ingredients(self):
+        recipes = [{'id': recipe_id, 'ingredients': INGREDIENTS[recipe_id]} for recipe_id in (2, 3)]
+        recipes.append({'id': 4, 'ingredients': ['Bloem', {'name': 'kaas', 'category': 'onbekend'}, '']})
+        ingredient_map = compact_ingredient_map(recipes)
+
+        assert ingredient_map['ingredients'] == ['bloem', 'melk', 'appels', 'kaas']
+        assert ingredient_map['recipes'] == {'2': [0, 1], '3': [2, 0], '4': [0, 3]}
+        categories = [ingredient_map['categories'][code] for code in ingredient_map['category_codes']]
+        assert categories == ['droge-waren', 'zuivel', 'verse-groenten-fruit', 'overig']
@@ -0,0 +1,53 @@
+import threading
+
+from metrics import Counter, Histogram, Registry
+
+
+class TestMetrics:
+    def test_histogram_buckets_are_cumulative(self):
+        """Each bucket counts every observation at or below its bound"""
+        registry = Registry()
+        histogram = Histogram('latency_seconds', 'Latency', ['route'], buckets=(0.1, 1.0), registry=registry)
+        for value in (0.05, 0.1, 0.5, 3.0):
+            histogram.labels('index').observe(value)
+
+        text = registry.render()
+        assert '# TYPE latency_seconds histogram' in text
+        assert 'latency_seconds_bucket{route="index",le="0.1"} 2' in text
+        assert 'latency_seconds_bucket{route="index",le="1"} 3' in text
+        assert 'latency_seconds_bucket{route="index",le="+Inf"} 4' in text
+        assert 'latency_seconds_count{route="index"} 4' in text
+        assert 'latency_seconds_sum{route="index"} 3.65' in text
+
+        histogram.labels('menus').observe(0.2)
+        assert sorted((values, child.count) for values, child in histogram.children()) == [(('index',), 4), (('menus',), 1)]
+
+    def test_counter_labels_are_escaped(self):
+        registry = Registry()
+        counter = Counter('requests_total', 'Requests', ['path'], registry=registry)
+        counter.labels('a"b').inc()
+        counter.labels('a"b').inc(2)
+        assert 'requests_total{path="a\\"b"} 3' in registry.render()
+
+    def test_wrong_label_count_is_rejected(self):
+        counter = Counter('requests_total', 'Requests', ['path'])
+        try:
+            counter.labels('a', 'b')
+        except ValueError:
+            pass
+        else:
+            raise AssertionError('expected ValueError')
+
+    def test_concurrent_observations_are_not_lost(self):
+        histogram = Histogram('latency_seconds', 'Latency')
+
+        def observe():
+            for _ in range(10000):
+                histogram.observe(0.01)
+
+        threads = [threading.Thread(target=observe) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert histogram.labels().count == 80000
@@ -0,0 +1,82 @@
+import json
+
+import pytest
+
+from ndjson_io import export_lines, import_lines, parse_recipe_line
+
+CATEGORIES = {'zuivel': 'Zuivel', 'kruiden': 'Kruiden'}
+
+
+def line(name, *ingredients):
+    return json.dumps({'name': name, 'ingredients': list(ingredients)}) + '\n'
+
+
+class FakeStorage:
+    """Keeps saved chunks; fails on the chunk numbers in fail_on"""
+
+    def __init__(self, fail_on=()):
+        self.keys = set()
+        self.chunks = []
+        self.fail_on = set(fail_on)
+
+    def save(self, chunk):
+        if len(self.chunks) in self.fail_on:
+            self.fail_on.discard(len(self.chunks))
+            raise RuntimeError('database went away')
+        self.chunks.append(chunk)
+        new = [recipe for key, recipe in chunk if key not in self.keys]
+        self.keys.update(key for key, _ in chunk)
+        return new
+
+
+def test_parse_recipe_line_validates_categories():
+    recipe = parse_recipe_line(line(' Pap ', 'melk', {'name': 'zout', 'category': 'kruiden'}, ' '), CATEGORIES)
+    assert recipe == {'name': 'Pap', 'ingredients': [
+        {'name': 'melk', 'category': None}, {'name': 'zout', 'category': 'kruiden'}
+    ]}
+    for bad in ('[1]', '{"ingredients": []}', 'not json', line('Pap', {'name': 'melk', 'category': 'Zuivel'})):
+        with pytest.raises(ValueError):
+            parse_recipe_line(bad, CATEGORIES)
+
+
+def test_export_round_trips():
+    recipes = [{'id': 1, 'name': 'Pap', 'ingredients': [{'name': 'melk', 'category': 'zuivel'}]}]
+    lines = list(export_lines(iter(recipes)))
+    assert len(lines) == 1 and lines[0].endswith('\n')
+    assert parse_recipe_line(lines[0], CATEGORIES) == {'name': 'Pap', 'ingredients': recipes[0]['ingredients']}
+
+
+def test_import_batches_and_skips_repeats():
+    storage = FakeStorage()
+    progress = []
+    lines = [line(f'Recept {n}', 'melk') for n in range(5)] + ['\n']
+    summary = import_lines(lines, storage.save, CATEGORIES, batch_size=2, progress=lambda s: progress.append(dict(s)))
+    assert summary == {'lines': 6, 'imported': 5, 'skipped': 0, 'batches': 3}
+    assert [len(chunk) for chunk in storage.chunks] == [2, 2, 1]
+    assert [entry['imported'] for entry in progress] == [2, 4, 5]
+
+    assert import_lines(lines, storage.save, CATEGORIES)['skipped'] == 5
+
+
+def test_import_stops_on_a_bad_line_and_resumes():
+    storage = FakeStorage()
+    lines = [line('A', 'melk'), line('B', 'melk'), line('C', {'name': 'melk', 'category': 'nope'}), line('D')]
+    summary = import_lines(lines, storage.save, CATEGORIES, batch_size=10)
+    assert summary['imported'] == 2
+    assert summary['resume_line'] == summary['bad_line'] == 3
+    assert 'unknown category' in summary['error']
+
+    summary = import_lines(lines, storage.save, CATEGORIES, start_line=4)
+    assert summary == {'lines': 4, 'imported': 1, 'skipped': 0, 'batches': 1}
+
+
+def test_failed_batch_resumes_from_its_first_line():
+    storage = FakeStorage(fail_on={1})
+    lines = [line(f'Recept {n}') for n in range(6)]
+    summary = import_lines(lines, storage.save, CATEGORIES, batch_size=2)
+    assert summary['imported'] == 2
+    assert summary['resume_line'] == 3
+    assert 'bad_line' not in summary
+
+    summary = import_lines(lines, storage.save, CATEGORIES, batch_size=2, start_line=summary['resume_line'])
+    assert summary['imported'] == 4
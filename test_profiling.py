@@ -0,0 +1,68 @@
+import json
+import time
+
+from flask import Flask, g, render_template_string
+
+import profiling
+from profiling import RequestProfile, SlowRequestLog, phase, request_record
+
+
+def busy(n):
+    return sum(i * i for i in range(n))
+
+
+class TestRequestProfile:
+    def test_phases_count_once_when_nested(self):
+        app = Flask(__name__)
+        profiling.connect_template_timing(app)
+        with app.test_request_context('/'):
+            profile = g.request_profile = RequestProfile()
+            with phase('db'):
+                time.sleep(0.01)
+            with phase('json'):
+                with phase('json'):
+                    json.dumps({'a': 1})
+            render_template_string('{{ 1 + 1 }}')
+
+            assert profile.seconds['db'] >= 0.01
+            assert profile.calls == {'db': 1, 'json': 1, 'template': 1}
+
+        # Outside a request phase() does nothing
+        with phase('db'):
+            pass
+
+    def test_profiling_collects_hot_functions(self):
+        profile = RequestProfile()
+        assert profile.start_profiling('admin', trace_memory=True) is True
+        # One request per process is profiled at a time
+        assert RequestProfile().start_profiling('sampled') is False
+        busy(20000)
+        data = [bytearray(1024) for _ in range(100)]
+        functions, allocations = profile.stop_profiling(5)
+
+        assert len(functions) <= 5
+        assert any('(busy)' in function['function'] or '(<genexpr>)' in function['function'] for function in functions)
+        assert allocations and allocations[0]['size_bytes'] > 0
+        assert data
+
+        other = RequestProfile()
+        assert other.start_profiling('sampled') is True
+        other.discard()
+
+    def test_request_record(self):
+        profile = RequestProfile()
+        profile.seconds['db'] = 0.5
+        profile.calls['db'] = 3
+        record = request_record(profile, 'GET', '/view_db', 'recipes.view_db', 200)
+        assert record['db_seconds'] == 0.5
+        assert record['db_calls'] == 3
+        assert record['trigger'] is None
+        assert record['other_seconds'] == 0.0
+
+
+class TestSlowRequestLog:
+    def test_keeps_most_recent_first(self):
+        log = SlowRequestLog(maxlen=2)
+        for path in ['/a', '/b', '/c']:
+            log.add({'path': path})
+        assert [(record['id'], record['path']) for record in log.recent()] == [(3, '/c'), (2, '/b')]
@@ -0,0 +1,77 @@
+import json
+import threading
+import multiprocessing
+
+from staging import StagingStore
+
+
+def _append_many(path, worker, count):
+    store = StagingStore(path)
+    for i in range(count):
+        store.append({'name': f'{worker}-{i}', 'ingredients': []})
+
+
+class TestStagingStore:
+    def test_append_and_delete(self, tmp_path):
+        """Basic list operations keep insertion order"""
+        store = StagingStore(str(tmp_path / 'staging.db'))
+        store.append({'name': 'A', 'ingredients': ['x']})
+        store.extend([
+            {'name': 'B', 'ingredients': [{'name': 'y', 'category': 'zuivel'}]},
+            {'name': 'C', 'ingredients': []}
+        ])
+
+        assert store.delete_at(1) is True
+        assert store.delete_at(5) is False
+        assert [r['name'] for r in store.all()] == ['A', 'C']
+
+    def test_remove_only_touches_given_entries(self, tmp_path):
+        """Removing committed entries keeps recipes staged in the meantime"""
+        store = StagingStore(str(tmp_path / 'staging.db'))
+        store.append({'name': 'A', 'ingredients': []})
+        committed = [entry_id for entry_id, _, _ in store.entries()]
+        store.append({'name': 'B', 'ingredients': []})
+
+        store.remove(committed)
+        assert [r['name'] for r in store.all()] == ['B']
+
+    def test_entries_have_unique_idempotency_keys(self, tmp_path):
+        """Each staged entry carries its own stable idempotency key"""
+        store = StagingStore(str(tmp_path / 'staging.db'))
+        store.extend([{'name': 'A', 'ingredients': []}, {'name': 'B', 'ingredients': []}])
+
+        keys = [key for _, key, _ in store.entries()]
+        assert len(set(keys)) == 2
+        assert all(len(key) == 32 for key in keys)
+        assert keys == [key for _, key, _ in store.entries()]
+
+    def test_legacy_json_is_imported_once(self, tmp_path):
+        """An existing recipes.json is imported on first open and renamed"""
+        legacy = tmp_path / 'recipes.json'
+        legacy.write_text(json.dumps([{'name': 'Oud', 'ingredients': ['bloem']}]))
+
+        store = StagingStore(str(tmp_path / 'staging.db'), legacy_json_path=str(legacy))
+        assert store.all() == [{'name': 'Oud', 'ingredients': ['bloem']}]
+        assert not legacy.exists()
+        assert (tmp_path / 'recipes.json.imported').exists()
+
+        # A recreated legacy file is not imported a second time
+        legacy.write_text(json.dumps([{'name': 'Oud', 'ingredients': ['bloem']}]))
+        store = StagingStore(str(tmp_path / 'staging.db'), legacy_json_path=str(legacy))
+        assert len(store.all()) == 1
+
+    def test_concurrent_appends_are_not_lost(self, tmp_path):
+        """Appends from several threads and processes all survive"""
+        path = str(tmp_path / 'staging.db')
+        StagingStore(path)
+
+        # Spawn rather than fork: SQLite connections must not be carried across fork()
+        context = multiprocessing.get_context('spawn')
+        processes = [context.Process(target=_append_many, args=(path, f'p{n}', 20)) for n in range(2)]
+        threads = [threading.Thread(target=_append_many, args=(path, f't{n}', 20)) for n in range(4)]
+        for worker in processes + threads:
+            worker.start()
+        for worker in processes + threads:
+            worker.join()
+
+        assert len(StagingStore(path).all()) == 6 * 20
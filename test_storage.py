@@ -0,0 +1,267 @@
+import os
+import sqlite3
+import threading
+
+import pytest
+
+from storage import MemoryBackend, SQLiteBackend
+
+
+RECIPES = [
+    {'name': 'Stamppot', 'ingredients': [{'name': 'aardappelen', 'category': 'verse-groenten-fruit'}, 'rookworst']},
+    {'name': 'Pannenkoeken', 'ingredients': ['bloem', {'name': 'melk', 'category': 'zuivel'}]},
+    {'name': 'Appeltaart', 'ingredients': ['appels', 'bloem']},
+]
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def storage(request, tmp_path):
+    if request.param == 'memory':
+        backend = MemoryBackend()
+    else:
+        backend = SQLiteBackend(os.path.join(tmp_path, 'recipes.db'), {'size': 2, 'max_overflow': 2})
+    backend.save_recipes([(f'key-{n}', recipe) for n, recipe in enumerate(RECIPES)])
+    yield backend
+    backend.close()
+
+
+class TestStorageBackends:
+    """The same behaviour from every backend"""
+
+    def test_list_recipes_is_ordered_by_name(self, storage):
+        assert [recipe['name'] for recipe in storage.list_recipes()] == ['Appeltaart', 'Pannenkoeken', 'Stamppot']
+
+    def test_ingredients_keep_order_and_share_the_catalog(self, storage):
+        ingredients = storage.recipe_ingredients([1, 2, 99])
+        assert ingredients[1] == [
+            {'name': 'aardappelen', 'category': 'verse-groenten-fruit'},
+            {'name': 'rookworst', 'category': 'vlees-vis'},
+        ]
+        assert [ingredient['name'] for ingredient in ingredients[2]] == ['bloem', 'melk']
+        assert ingredients[99] == []
+
+    def test_saving_is_idempotent(self, storage):
+        """Keys that were saved before are skipped"""
+        inserted = storage.save_recipes([('key-0', RECIPES[0]), ('key-new', {'name': 'Hutspot', 'ingredients': []})])
+        assert [recipe["name"] for recipe in inserted] == ["Hutspot"]
+        assert len(storage.list_recipes()) == 4
+
+    def test_keyset_pages(self, storage):
+        page = storage.recipe_page('id', None, '', 2)
+        assert [recipe['id'] for recipe in page] == [1, 2]
+        assert page[1]['ingredients'][1] == {'name': 'melk', 'category': 'zuivel'}
+        assert [recipe['id'] for recipe in storage.recipe_page('id', 2, '', 2)] == [3]
+
+        page = storage.recipe_page('name', 3, 'Appeltaart', 5)
+        assert [recipe['name'] for recipe in page] == ['Pannenkoeken', 'Stamppot']
+
+    def test_iter_recipes(self, storage):
+        recipes = list(storage.iter_recipes('name'))
+        assert [recipe['name'] for recipe in recipes] == ['Appeltaart', 'Pannenkoeken', 'Stamppot']
+        assert [ingredient['name'] for ingredient in recipes[0]['ingredients']] == ['appels', 'bloem']
+
+        # Closing early releases the backend's resources
+        recipes = storage.iter_recipes()
+        next(recipes)
+        recipes.close()
+        assert storage.list_recipes()
+
+    def test_pop_recipe(self, storage):
+        recipe = storage.pop_recipe(2)
+        assert recipe['name'] == 'Pannenkoeken'
+        assert [ingredient['name'] for ingredient in recipe['ingredients']] == ['bloem', 'melk']
+        assert storage.pop_recipe(2) is None
+        assert storage.recipe_ingredients([2]) == {2: []}
+        assert [recipe['id'] for recipe in storage.recipe_page('id', None, '', 10)] == [1, 3]
+
+    def test_pop_recipes(self, storage):
+        popped = storage.pop_recipes([3, 99, 1, 3])
+        assert list(popped) == [3, 1]
+        assert popped[1]['name'] == 'Stamppot'
+        assert [ingredient['name'] for ingredient in popped[3]['ingredients']] == ['appels', 'bloem']
+        assert [recipe['id'] for recipe in storage.list_recipes()] == [2]
+        assert storage.pop_recipes([1]) == {}
+
+    def test_categories_are_resolved_when_saving(self, storage):
+        """Names are normalized; a picked category wins, then the catalog, then the defaults"""
+        saved = storage.save_recipes([
+            ('key-a', {'name': 'Pap', 'ingredients': [' Melk ', {'name': 'Kaneel', 'category': 'Overig'}, 'truffel']}),
+            ('key-b', {'name': 'Brood', 'ingredients': [{'name': 'BLOEM', 'category': 'Brood en bakkerij'}]}),
+        ])
+        assert saved[0]['ingredients'] == [
+            {'name': 'melk', 'category': 'zuivel'},
+            {'name': 'kaneel', 'category': 'kruiden'},
+            {'name': 'truffel', 'category': 'overig'},
+        ]
+        assert storage.recipe_ingredients([3])[3] == [
+            {'name': 'appels', 'category': 'verse-groenten-fruit'},
+            {'name': 'bloem', 'category': 'brood-bakkerij'},
+        ]
+
+    def test_menus(self, storage):
+        first = storage.create_menu('Week 2', [2, 3], {'categories': [], 'text': 'b'})
+        second = storage.create_menu('Week 1', [1], {'categories': [], 'text': 'a'})
+        assert storage.list_menus() == [
+            {'id': second, 'name': 'Week 1', 'recipe_ids': [1]},
+            {'id': first, 'name': 'Week 2', 'recipe_ids': [2, 3]},
+        ]
+        assert storage.get_menu(first) == {
+            'id': first, 'name': 'Week 2', 'recipe_ids': [2, 3], 'shopping_list': {'categories': [], 'text': 'b'}
+        }
+
+        assert storage.delete_menu(second) is True
+        assert storage.delete_menu(second) is False
+        assert storage.get_menu(second) is None
+
+    def test_update_menus_reads_only_affected_menus(self, storage):
+        with_appeltaart = storage.create_menu('A', [1, 3], {'categories': [], 'text': ''})
+        storage.create_menu('B', [1], {'categories': [], 'text': ''})
+        seen = []
+
+        def update(menu):
+            seen.append(menu['id'])
+            return [1], {'categories': [], 'text': 'updated'}
+
+        assert storage.update_menus(update, recipe_ids=[3]) == 1
+        assert seen == [with_appeltaart]
+        assert storage.get_menu(with_appeltaart)['recipe_ids'] == [1]
+
+        # Pannenkoeken (2) uses bloem, but no menu contains it any more
+        seen.clear()
+        assert storage.update_menus(lambda menu: seen.append(menu['id']), ingredient_names=['bloem']) == 0
+        assert seen == []
+        assert storage.update_menus(lambda menu: seen.append(menu['id']), ingredient_names=['rookworst']) == 0
+        assert sorted(seen) == sorted(menu['id'] for menu in storage.list_menus())
+
+    def test_changes_since_a_revision(self, storage):
+        # The fixture's save took revision 1
+        assert storage.revision() == 1
+        assert storage.changes(1, 100) == {'revision': 1, 'recipes': [], 'deleted': []}
+        assert [recipe['id'] for recipe in storage.changes(0, 100)['recipes']] == [1, 2, 3]
+
+        storage.save_recipes([('key-0', RECIPES[0])])
+        assert storage.revision() == 1
+        storage.save_recipes([('key-new', {'name': 'Hutspot', 'ingredients': ['uien']})])
+        storage.pop_recipes([2, 99])
+        storage.pop_recipes([99])
+
+        changes = storage.changes(1, 100)
+        assert changes == {
+            'revision': 3,
+            'recipes': [{'id': 4, 'name': 'Hutspot', 'ingredients': [{'name': 'uien', 'category': 'verse-groenten-fruit'}]}],
+            'deleted': [2]
+        }
+        assert storage.changes(2, 100)['recipes'] == []
+        # Too many changes to send: the client reloads instead
+        assert storage.changes(0, 2) == {'revision': 3}
+
+    def test_recategorized_ingredients_change_their_recipes(self, storage):
+        """Recipes already using an ingredient a save recategorizes are reported as changed"""
+        storage.save_recipes([('key-b', {'name': 'Brood', 'ingredients': [{'name': 'bloem', 'category': 'brood-bakkerij'}]})])
+        changes = storage.changes(1, 100)
+        assert [recipe['id'] for recipe in changes['recipes']] == [2, 3, 4]
+        assert changes['recipes'][0]['ingredients'][0] == {'name': 'bloem', 'category': 'brood-bakkerij'}
+
+        # Saving it with the category it already has changes nothing else
+        storage.save_recipes([('key-c', {'name': 'Koek', 'ingredients': [{'name': 'bloem', 'category': 'brood-bakkerij'}]})])
+        assert [recipe['id'] for recipe in storage.changes(2, 100)['recipes']] == [5]
+
+    def test_old_tombstones_are_pruned(self, storage):
+        storage.TOMBSTONE_REVISIONS = 2
+        storage.pop_recipes([1])
+        storage.save_recipes([('key-new', {'name': 'Hutspot', 'ingredients': ['uien']})])
+        assert storage.changes(1, 100)['deleted'] == [1]
+
+        # Revision 4 prunes the tombstone of revision 2: a client at revision 1 reloads
+        storage.pop_recipes([2])
+        assert storage.changes(1, 100) == {'revision': 4}
+        changes = storage.changes(2, 100)
+        assert (changes['deleted'], [recipe['id'] for recipe in changes['recipes']]) == ([2], [4])
+        assert storage.changes(4, 100) == {'revision': 4, 'recipes': [], 'deleted': []}
+
+
+def test_sqlite_reclassify_merges_legacy_ingredients(tmp_path):
+    backend = SQLiteBackend(os.path.join(tmp_path, 'recipes.db'))
+    backend.save_recipes([('key', RECIPES[1])])
+    # Rows as they were written before names and categories were resolved
+    with backend._connection() as conn:
+        conn.execute("INSERT INTO ingredients (name, category) VALUES ('Melk ', 'Zuivel'), ('Eieren', NULL)")
+        conn.execute(
+            "INSERT INTO recipe_ingredients (recipe_id, position, ingredient_id) "
+            "SELECT 1, 2, id FROM ingredients WHERE name = 'Melk '"
+        )
+        conn.execute(
+            "INSERT INTO recipe_ingredients (recipe_id, position, ingredient_id) "
+            "SELECT 1, 3, id FROM ingredients WHERE name = 'Eieren'"
+        )
+        conn.execute("UPDATE ingredients SET category = 'Droge waren' WHERE name = 'bloem'")
+        conn.commit()
+
+    assert backend.reclassify_ingredients(batch_size=1) == {'ingredients': 4, 'changed': 3, 'merged': 1}
+    assert backend.recipe_ingredients([1])[1] == [
+        {'name': 'bloem', 'category': 'droge-waren'},
+        {'name': 'melk', 'category': 'zuivel'},
+        {'name': 'melk', 'category': 'zuivel'},
+        {'name': 'eieren', 'category': 'zuivel'},
+    ]
+    assert backend.reclassify_ingredients()['changed'] == 0
+    # The recipe's ingredients changed, so it is reported again
+    assert backend.revision() == 4
+    assert [recipe['id'] for recipe in backend.changes(1, 100)['recipes']] == [1]
+    backend.close()
+
+
+def test_sqlite_adds_revisions_to_older_files(tmp_path):
+    path = os.path.join(tmp_path, 'recipes.db')
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE recipes (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, idempotency_key TEXT UNIQUE)')
+    conn.execute("INSERT INTO recipes (name) VALUES ('Stamppot')")
+    conn.commit()
+    conn.close()
+
+    backend = SQLiteBackend(path)
+    assert backend.changes(0, 100) == {'revision': 0, 'recipes': [], 'deleted': []}
+    backend.save_recipes([('key', RECIPES[1])])
+    assert [recipe['name'] for recipe in backend.changes(0, 100)['recipes']] == ['Pannenkoeken']
+    backend.close()
+
+
+def test_sqlite_backend_connects_lazily(tmp_path):
+    """Creating the backend touches neither the file nor the pool"""
+    path = os.path.join(tmp_path, 'recipes.db')
+    backend = SQLiteBackend(path)
+    assert not os.path.exists(path)
+    assert backend.list_recipes() == []
+    assert backend.stats()['open'] == 1
+
+
+def test_sqlite_concurrent_saves_of_the_same_chunk(tmp_path):
+    """The second of two overlapping saves skips the keys the first one saved"""
+    path = os.path.join(tmp_path, 'recipes.db')
+    barrier = threading.Barrier(2)
+
+    class RacingBackend(SQLiteBackend):
+        def _insert_recipes(self, cursor, chunk):
+            barrier.wait()
+            return super()._insert_recipes(cursor, chunk)
+
+    backends = [RacingBackend(path), RacingBackend(path)]
+    backends[0].init_schema()
+    results = [None, None]
+
+    def save(n):
+        try:
+            results[n] = backends[n].save_recipes([(f'key-{i}', recipe) for i, recipe in enumerate(RECIPES)])
+        except Exception as err:
+            results[n] = err
+
+    threads = [threading.Thread(target=save, args=(n,)) for n in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(len(result) for result in results) == [0, 3]
+    assert len(backends[0].list_recipes()) == 3
+    for backend in backends:
+        backend.close()
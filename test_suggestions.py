@@ -0,0 +1,41 @@
+from suggestions import SuggestionIndex, bounded_edit_distance
+
+
+RECIPES = [
+    ('Pannenkoeken', ['bloem', 'melk']),
+    ('Pannenkoeken met spek', ['bloem', 'spek']),
+    ('Stamppot', ['aardappelen']),
+    ('Appeltaart', ['appels']),
+]
+
+
+class TestSuggestionIndex:
+    def test_exact_lookup_ignores_case_and_spacing(self):
+        index = SuggestionIndex(RECIPES)
+        assert index.lookup('  PANNENKOEKEN ') == ['bloem', 'melk']
+
+    def test_lookup_tolerates_typos(self):
+        """Close misspellings still find the recipe, unrelated names do not"""
+        index = SuggestionIndex(RECIPES)
+        assert index.lookup('pannekoeken') == ['bloem', 'melk']
+        assert index.lookup('stampot') == ['aardappelen']
+        assert index.lookup('lasagne') is None
+
+    def test_suggest_prefix_before_fuzzy(self):
+        index = SuggestionIndex(RECIPES)
+        suggestions = index.suggest('pannen')
+        assert [s['name'] for s in suggestions] == ['Pannenkoeken', 'Pannenkoeken met spek']
+        assert all(s['match'] == 'prefix' for s in suggestions)
+
+        assert index.suggest('apeltaart') == [{'name': 'Appeltaart', 'match': 'fuzzy'}]
+
+    def test_first_name_wins_for_duplicates(self):
+        index = SuggestionIndex([('Stamppot', ['mine']), ('stamppot', ['default'])])
+        assert len(index) == 1
+        assert index.lookup('stamppot') == ['mine']
+
+
+def test_bounded_edit_distance():
+    assert bounded_edit_distance('kitten', 'sitting', 3) == 3
+    assert bounded_edit_distance('kitten', 'sitting', 2) is None
+    assert bounded_edit_distance('abc', 'abc', 0) == 0